@@ -0,0 +1,66 @@
+"""
+Compare the "stream" render mode of a loop template without the streaming
+layout, with it and with a cell budget, which spills cells to disk.
+Items are generated while the loop runs, so they do not add to memory.
+
+    python benchmarks/bench_cell_budget.py
+"""
+
+from common import make_loop_template, measure, format_size
+
+COLUMNS = 10
+CELL_COUNTS = [500000, 2000000]
+CASES = [
+    ("buffered", False, None),
+    ("streamed", True, None),
+    ("budget", True, 100000),
+]
+
+
+def iter_items(rows):
+    for row in range(rows):
+        yield {"c{}".format(col): row * COLUMNS + col for col in range(1, COLUMNS + 1)}
+
+
+def render(stream_layout, cell_budget, cell_count):
+    from xlsx_template import Environment, Template
+    from xlsx_template.runtime.cell_store import SpillStats
+
+    template = Template(
+        make_loop_template(COLUMNS), env=Environment(stream_layout=stream_layout)
+    )
+    spill_stats = SpillStats()
+    result = template.render(
+        {"items": iter_items(cell_count // COLUMNS)},
+        mode="stream",
+        cell_budget=cell_budget,
+        spill_stats=spill_stats,
+    )
+    return len(result), spill_stats
+
+
+def main():
+    print(
+        "{:>10} {:>10} {:>10} {:>12} {:>12} {:>12}".format(
+            "cells", "case", "time, s", "peak RSS", "spilled", "spill size"
+        )
+    )
+    for cell_count in CELL_COUNTS:
+        for name, stream_layout, cell_budget in CASES:
+            elapsed, peak_rss, (size, stats) = measure(
+                render, stream_layout, cell_budget, cell_count
+            )
+            print(
+                "{:>10} {:>10} {:>10.2f} {:>12} {:>12} {:>12}".format(
+                    cell_count,
+                    name,
+                    elapsed,
+                    format_size(peak_rss),
+                    stats.cells,
+                    format_size(stats.bytes),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
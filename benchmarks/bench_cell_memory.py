@@ -0,0 +1,67 @@
+"""
+Measure memory held per rendered cell after the final layout of a loop is
+built, which is what a sheet keeps until it is written, and the peak
+memory of rendering per cell.
+
+    python benchmarks/bench_cell_memory.py
+"""
+
+import gc
+import tracemalloc
+
+from common import NullWriter, make_loop_items, make_loop_template
+from xlsx_template.runtime.context import Context
+from xlsx_template.template import Template
+
+COLUMNS = 10
+ROW_COUNTS = [10000, 50000]
+
+
+class KeepSheetWriter:
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def write_cell_group(self, cell_group):
+        cell_group.get_final_cells()
+        self.sheets.append(cell_group)
+
+
+class KeepWriter(NullWriter):
+    def __init__(self):
+        self.sheets = []
+
+    def create_sheet(self, name, sheet_state):
+        return KeepSheetWriter(self.sheets)
+
+
+def measure_cells(template, data):
+    gc.collect()
+    tracemalloc.start()
+    writer = KeepWriter()
+    template.namespace["root"](Context(data, template.env), writer, template.env)
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    cells = sum(len(sheet.get_final_cells()) for sheet in writer.sheets)
+    return size, peak, cells
+
+
+def main():
+    template = Template(make_loop_template(COLUMNS, header=False, footer=False))
+    print(
+        "{:>8} {:>10} {:>12} {:>10} {:>12}".format(
+            "rows", "cells", "memory, MB", "B/cell", "peak B/cell"
+        )
+    )
+    for rows in ROW_COUNTS:
+        data = {"items": make_loop_items(rows, COLUMNS)}
+        size, peak, cells = measure_cells(template, data)
+        print(
+            "{:>8} {:>10} {:>12.1f} {:>10.0f} {:>12.0f}".format(
+                rows, cells, size / 1024 / 1024, size / cells, peak / cells
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Measure running the code of a loop, whose cells reference many context
+variables and filters, without and with building the final layout. The
+workbook is not written.
+
+    python benchmarks/bench_context_names.py
+"""
+
+import io
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+
+from common import build_layout
+from xlsx_template.template import Template
+
+NAMES = 40
+ROW_COUNTS = [1000, 10000]
+
+
+def make_template():
+    wb = Workbook()
+    ws = wb.active
+    for col in range(1, NAMES + 1):
+        ws.cell(1, col, "{{{{ g{}|default_if_none(0) }}}}".format(col))
+    ws.cell(1, 1).comment = Comment(
+        "Loop-down, for row in rows, last_cell={}1".format(
+            ws.cell(1, NAMES).column_letter
+        ),
+        "bench",
+    )
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def main():
+    template = Template(make_template())
+    print("{:>8} {:>8} {:>10} {:>10}".format("rows", "cells", "code, s", "layout, s"))
+    for rows in ROW_COUNTS:
+        data = {"g{}".format(index): index for index in range(1, NAMES + 1)}
+        data["rows"] = range(rows)
+        code = min(build_layout(template, data, layout=False) for _ in range(5))
+        layout = min(build_layout(template, data) for _ in range(5))
+        print(
+            "{:>8} {:>8} {:>10.3f} {:>10.3f}".format(rows, rows * NAMES, code, layout)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measure building the layout of nested loops of fixed-shape rows: an outer
+`Loop-down` over groups with a title row and an inner `Loop-down` over
+rows of `COLUMNS` cells. The workbook is not written.
+
+    python benchmarks/bench_fixed_layout.py
+"""
+
+import io
+from unittest import mock
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+
+from common import build_layout
+from xlsx_template import code_generator
+from xlsx_template.template import Template
+
+COLUMNS = 10
+ROWS_PER_GROUP = 20
+ROW_COUNTS = [10000, 100000]
+
+
+def make_template():
+    wb = Workbook()
+    ws = wb.active
+    last_col = ws.cell(1, COLUMNS).column_letter
+    ws.cell(1, 1, "{{ group.title }}")
+    ws.cell(1, 1).comment = Comment(
+        "Loop-down, for group in groups, last_cell={}2".format(last_col), "bench"
+    )
+    for col in range(1, COLUMNS + 1):
+        ws.cell(2, col, "{{{{ row.c{} }}}}".format(col))
+    ws.cell(2, 1).comment = Comment(
+        "Loop-down, for row in group.rows, last_cell={}2".format(last_col), "bench"
+    )
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def make_data(row_count):
+    row = {"c{}".format(col): col for col in range(1, COLUMNS + 1)}
+    return {
+        "groups": [
+            {"title": "Group {}".format(index), "rows": [row] * ROWS_PER_GROUP}
+            for index in range(row_count // ROWS_PER_GROUP)
+        ]
+    }
+
+
+def main():
+    source = make_template()
+    fixed = Template(source)
+    with mock.patch.object(
+        code_generator.CodeGenerator, "add_fixed_layout", lambda *args: None
+    ):
+        plain = Template(source)
+    print("{:>8} {:>12} {:>12}".format("rows", "solver, s", "fixed, s"))
+    for row_count in ROW_COUNTS:
+        data = make_data(row_count)
+        print(
+            "{:>8} {:>12.3f} {:>12.3f}".format(
+                row_count, build_layout(plain, data), build_layout(fixed, data)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure building the layout of sheets with formulas over large loops:
+subtotal rows under groups of a loop and a grand total over the subtotals,
+and row formulas of one loop, which refer to the same row of a parallel
+loop (func-arg-h).
+
+    python benchmarks/bench_func_args.py
+"""
+
+import time
+
+import common  # noqa: F401, adds the package to sys.path
+from xlsx_template.consts import FuncArgDirection, LoopDirection
+from xlsx_template.runtime import cell_groups as cg
+
+ROW_COUNTS = [1000, 10000, 100000]
+ROWS_PER_GROUP = 100
+
+
+def make_subtotals(rows):
+    """
+    B: values in groups of ROWS_PER_GROUP rows with =SUM(B2) subtotals,
+    =SUM(B3) grand total over subtotals.
+    """
+    sheet = cg.SheetCellGroup(cg.Size(4, 2))
+    outer = cg.LoopCellGroup(cg.Size(3, 2), LoopDirection.DOWN)
+    for group_index in range(rows // ROWS_PER_GROUP):
+        group = cg.CellGroup(cg.Size(3, 2))
+        group.add_cell(cg.Cell(0, 0, None, group_index, None, None))
+        inner = cg.LoopCellGroup(cg.Size(1, 2), LoopDirection.DOWN)
+        for row in range(ROWS_PER_GROUP):
+            row_group = cg.CellGroup(cg.Size(1, 2))
+            row_group.add_cell(cg.Cell(0, 1, None, row, None, None))
+            inner.add_cell_group(row_group)
+        group.add_cell_group(1, 0, inner)
+        args = [cg.FuncArg(5, 7, [(-1, 0)])]
+        group.add_func_cell(cg.FuncCell(2, 1, None, "=SUM(B2)", None, None, args))
+        outer.add_cell_group(group)
+    sheet.add_cell_group(0, 0, outer)
+    args = [cg.FuncArg(5, 7, [(-1, 0)])]
+    sheet.add_func_cell(cg.FuncCell(3, 1, None, "=SUM(B3)", None, None, args))
+    return sheet
+
+
+def make_parallel_loops(rows):
+    """
+    A: a loop of values, B: a loop of =A1*2 over the same rows.
+    """
+    sheet = cg.SheetCellGroup(cg.Size(1, 2))
+    values = cg.LoopCellGroup(cg.Size(1, 1), LoopDirection.DOWN)
+    formulas = cg.LoopCellGroup(cg.Size(1, 1), LoopDirection.DOWN)
+    for row in range(rows):
+        row_group = cg.CellGroup(cg.Size(1, 1))
+        row_group.add_cell(cg.Cell(0, 0, None, row, None, None))
+        values.add_cell_group(row_group)
+        row_group = cg.CellGroup(cg.Size(1, 1))
+        args = [cg.FuncArg(1, 3, [(0, -1)], FuncArgDirection.HORIZONTAL)]
+        row_group.add_func_cell(cg.FuncCell(0, 0, None, "=A1*2", None, None, args))
+        formulas.add_cell_group(row_group)
+    sheet.add_cell_group(0, 0, values)
+    sheet.add_cell_group(0, 1, formulas)
+    return sheet
+
+
+def measure(make_sheet, rows):
+    sheet = make_sheet(rows)
+    start = time.perf_counter()
+    sheet.get_final_cells()
+    return time.perf_counter() - start
+
+
+def main():
+    print("{:>16} {:>8} {:>10}".format("case", "rows", "layout, s"))
+    for name, make_sheet in [
+        ("subtotals", make_subtotals),
+        ("parallel loops", make_parallel_loops),
+    ]:
+        for rows in ROW_COUNTS:
+            elapsed = min(measure(make_sheet, rows) for _ in range(3))
+            print("{:>16} {:>8} {:>10.3f}".format(name, rows, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measure building the final layout of a sheet with the same number of cells
+in loops nested `depth` levels deep.
+
+    python benchmarks/bench_layout_depth.py
+"""
+
+import time
+
+import common  # noqa: F401, adds the package to sys.path
+from xlsx_template.consts import LoopDirection
+from xlsx_template.runtime import cell_groups as cg
+
+COLUMNS = 4
+LEAF_ROWS = 2**16
+DEPTHS = [1, 2, 4, 8, 16]
+
+
+def make_loop(depth, fanout):
+    loop = cg.LoopCellGroup(cg.Size(1, COLUMNS), LoopDirection.DOWN)
+    for _ in range(fanout):
+        cell_group = cg.CellGroup(cg.Size(1, COLUMNS))
+        if depth == 1:
+            for col in range(COLUMNS):
+                cell_group.add_cell(cg.Cell(0, col, None, col, None, None))
+        else:
+            cell_group.add_cell_group(0, 0, make_loop(depth - 1, fanout))
+        loop.add_cell_group(cell_group)
+    return loop
+
+
+def build(depth):
+    fanout = round(LEAF_ROWS ** (1 / depth))
+    sheet = cg.SheetCellGroup(cg.Size(1, COLUMNS))
+    sheet.add_cell_group(0, 0, make_loop(depth, fanout))
+    start = time.perf_counter()
+    sheet.get_final_size()
+    sized = time.perf_counter()
+    cells = len(sheet.get_final_cells())
+    return cells, sized - start, time.perf_counter() - start
+
+
+def main():
+    print("{:>6} {:>8} {:>8} {:>10}".format("depth", "cells", "size, s", "layout, s"))
+    for depth in DEPTHS:
+        results = [build(depth) for _ in range(3)]
+        cells = results[0][0]
+        size_elapsed = min(result[1] for result in results)
+        elapsed = min(result[2] for result in results)
+        print(
+            "{:>6} {:>8} {:>8.3f} {:>10.3f}".format(depth, cells, size_elapsed, elapsed)
+        )
+
+
+if __name__ == "__main__":
+    main()
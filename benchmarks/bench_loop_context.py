@@ -0,0 +1,58 @@
+"""
+Measure time and peak memory of running the code of a loop over a
+generator of big items, when the template uses only `loop.index` and
+when it uses `loop.revindex`, which needs all items in memory. The final
+layout is not built and the workbook is not written.
+
+    python benchmarks/bench_loop_context.py
+"""
+
+import io
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+
+from common import build_layout, format_size, measure
+from xlsx_template.template import Template
+
+ROW_COUNTS = [10000, 50000]
+PAYLOAD_SIZE = 2000
+
+
+def make_template(loop_attr):
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "{{ item.name }}"
+    ws["A1"].comment = Comment("Loop-down, for item in items, last_cell=B1", "bench")
+    ws["B1"] = "{{{{ loop.{} }}}}".format(loop_attr)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def iter_items(rows):
+    for index in range(rows):
+        yield {"name": "item {}".format(index), "payload": "x" * PAYLOAD_SIZE}
+
+
+def run(loop_attr, rows):
+    template = Template(make_template(loop_attr))
+    return build_layout(template, {"items": iter_items(rows)}, layout=False)
+
+
+def main():
+    print(
+        "{:>10} {:>8} {:>10} {:>10}".format("attribute", "rows", "time, s", "peak RSS")
+    )
+    for rows in ROW_COUNTS:
+        for loop_attr in ("revindex", "index"):
+            _, peak_rss, elapsed = measure(run, loop_attr, rows)
+            print(
+                "{:>10} {:>8} {:>10.3f} {:>10}".format(
+                    loop_attr, rows, elapsed, format_size(peak_rss)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
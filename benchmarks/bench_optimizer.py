@@ -0,0 +1,80 @@
+"""
+Measure running the code of a loop, whose cells share attribute chains of
+the item and use loop-invariant chains, without and with the optimizer.
+The final layout is not built and the workbook is not written.
+
+    python benchmarks/bench_optimizer.py
+"""
+
+import io
+from types import SimpleNamespace
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+
+from common import build_layout
+from xlsx_template.environment import Environment, StrictGetAttrStrategy
+from xlsx_template.template import Template
+
+FIELDS = ["city", "zip", "street", "country"]
+ROW_COUNTS = [1000, 10000]
+
+
+def make_template():
+    wb = Workbook()
+    ws = wb.active
+    for col, field in enumerate(FIELDS, 1):
+        ws.cell(1, col, "{{{{ item.customer.address.{} }}}}".format(field))
+    ws.cell(1, len(FIELDS) + 1, "{{ report.settings.currency }}")
+    ws.cell(1, len(FIELDS) + 2, "{{ report.settings.title }}")
+    ws.cell(1, 1).comment = Comment(
+        "Loop-down, for item in items, last_cell={}1".format(
+            ws.cell(1, len(FIELDS) + 2).column_letter
+        ),
+        "bench",
+    )
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def make_data(rows):
+    address = SimpleNamespace(**{field: field for field in FIELDS})
+    item = SimpleNamespace(customer=SimpleNamespace(address=address))
+    settings = SimpleNamespace(currency="EUR", title="Report")
+    return {"items": [item] * rows, "report": SimpleNamespace(settings=settings)}
+
+
+def main():
+    source = make_template()
+    print(
+        "{:>8} {:>8} {:>10} {:>10} {:>10}".format(
+            "strategy", "rows", "off, s", "on, s", "speedup"
+        )
+    )
+    for name, get_attr_strategy in [
+        ("soft", None),
+        ("strict", StrictGetAttrStrategy()),
+    ]:
+        templates = [
+            Template(
+                source,
+                env=Environment(get_attr_strategy=get_attr_strategy, optimize=optimize),
+            )
+            for optimize in (False, True)
+        ]
+        for rows in ROW_COUNTS:
+            data = make_data(rows)
+            off, on = [
+                min(build_layout(template, data, layout=False) for _ in range(15))
+                for template in templates
+            ]
+            print(
+                "{:>8} {:>8} {:>10.3f} {:>10.3f} {:>9.2f}x".format(
+                    name, rows, off, on, off / on
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
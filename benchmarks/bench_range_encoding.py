@@ -0,0 +1,56 @@
+"""
+Measure the length of a =SUM formula over a loop, where every
+SKIP_EVERY-th row has a label instead of a value (an `if` inside the loop),
+and the time to build it.
+
+    python benchmarks/bench_range_encoding.py
+"""
+
+import time
+
+import common  # noqa: F401, adds the package to sys.path
+from xlsx_template.consts import LoopDirection
+from xlsx_template.runtime import cell_groups as cg
+
+ROW_COUNTS = [1000, 10000, 100000]
+SKIP_EVERY = 50
+
+
+def make_sheet(rows):
+    """
+    A: labels, B: values in the other rows, =SUM(B1) total under the loop.
+    """
+    sheet = cg.SheetCellGroup(cg.Size(2, 2))
+    loop = cg.LoopCellGroup(cg.Size(1, 2), LoopDirection.DOWN)
+    for row in range(rows):
+        row_group = cg.CellGroup(cg.Size(1, 2))
+        if row % SKIP_EVERY:
+            row_group.add_cell(cg.Cell(0, 1, None, row, None, None))
+        else:
+            row_group.add_cell(cg.Cell(0, 0, None, "label", None, None))
+        loop.add_cell_group(row_group)
+    sheet.add_cell_group(0, 0, loop)
+    args = [cg.FuncArg(5, 7, [(-1, 0)])]
+    sheet.add_func_cell(cg.FuncCell(1, 1, None, "=SUM(B1)", None, None, args))
+    return sheet
+
+
+def measure(rows):
+    sheet = make_sheet(rows)
+    start = time.perf_counter()
+    cells = sheet.get_final_cells()
+    elapsed = time.perf_counter() - start
+    formula = max(cells, key=lambda cell: cell.row).value
+    return elapsed, len(formula)
+
+
+def main():
+    print("{:>8} {:>14} {:>10}".format("rows", "formula, chars", "layout, s"))
+    for rows in ROW_COUNTS:
+        results = [measure(rows) for _ in range(3)]
+        elapsed = min(result[0] for result in results)
+        print("{:>8} {:>14} {:>10.3f}".format(rows, results[0][1], elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measure template parsing time on wide, sparse templates. Parse time should
+depend on the number of populated cells, not on the bounding box of the
+sheet.
+
+    python benchmarks/bench_sparse_parse.py
+"""
+
+import io
+import time
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+import common  # noqa: F401, adds the project root to sys.path
+from xlsx_template.parser import Parser
+
+CELL_COUNTS = [100, 1000, 10000]
+# (max row, max column) of the single styled cell, which stretches the
+# bounding box of the sheet
+CORNERS = [None, (100, 100), (1000, 16384)]
+COLUMNS = 10
+
+
+def make_template(cell_count, corner):
+    wb = Workbook()
+    ws = wb.active
+    for index in range(cell_count):
+        row, col = divmod(index, COLUMNS)
+        ws.cell(row + 1, col + 1, "{{{{ value_{} }}}}".format(index))
+    if corner is not None:
+        ws.cell(*corner).font = Font(bold=True)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def main():
+    print(
+        "{:>8} {:>14} {:>14} {:>10}".format(
+            "cells", "bounding box", "nodes", "parse, s"
+        )
+    )
+    for cell_count in CELL_COUNTS:
+        for corner in CORNERS:
+            source = make_template(cell_count, corner)
+            parser = Parser(source)
+            start = time.perf_counter()
+            template, styles = parser.parse()
+            elapsed = time.perf_counter() - start
+            sheet = template.body[0]
+            print(
+                "{:>8} {:>14} {:>14} {:>10.3f}".format(
+                    cell_count,
+                    "{}x{}".format(sheet.height, sheet.width),
+                    len(sheet.body),
+                    elapsed,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
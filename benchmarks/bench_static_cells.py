@@ -0,0 +1,69 @@
+"""
+Measure building the layout of a loop, whose body is mostly static cells:
+labels, styled blanks and a static group. The workbook itself is not
+written, so the numbers show the cost of the generated code and of the
+cell group layout only.
+
+    python benchmarks/bench_static_cells.py
+"""
+
+import io
+from unittest import mock
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+from openpyxl.styles import Font
+
+from common import build_layout
+from xlsx_template import code_generator
+from xlsx_template.template import Template
+
+ROW_COUNTS = [1000, 10000, 50000]
+COLUMNS = 20
+
+
+def make_template():
+    wb = Workbook()
+    ws = wb.active
+    ws.cell(1, 1, "{{ item }}")
+    ws.cell(1, 1).comment = Comment(
+        "Loop-down, for item in items, last_cell={}2".format(
+            ws.cell(1, COLUMNS).column_letter
+        ),
+        "bench",
+    )
+    for col in range(2, COLUMNS - 1):
+        ws.cell(1, col, "Label {}".format(col)).font = Font(bold=True)
+        ws.cell(2, col).font = Font(italic=True)
+    ws.cell(1, COLUMNS - 1, "Group")
+    ws.cell(1, COLUMNS - 1).comment = Comment(
+        "Group, last_cell={}2".format(ws.cell(1, COLUMNS).column_letter), "bench"
+    )
+    ws.cell(2, COLUMNS, "Static")
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def build(template, rows):
+    return build_layout(template, {"items": list(range(rows))})
+
+
+def main():
+    source = make_template()
+    folded = Template(source)
+    with mock.patch.object(
+        code_generator, "get_static_cell", lambda node: None
+    ), mock.patch.object(code_generator, "is_static_cell_group", lambda node: False):
+        plain = Template(source)
+    print("{:>8} {:>12} {:>12}".format("rows", "plain, s", "folded, s"))
+    for rows in ROW_COUNTS:
+        print(
+            "{:>8} {:>12.3f} {:>12.3f}".format(
+                rows, build(plain, rows), build(folded, rows)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Micro-benchmarks of attribute and item access for every strategy.
+
+The first table times single strategy calls. "uncached" is the soft
+strategy without its accessor cache, which raises AttributeError before
+falling back to items for dicts.
+
+The second table builds the layout of a loop of `{{ row.cells[0].c1 }}`
+cells with compiled inline access and with strategy calls. The workbook is
+not written.
+
+    python benchmarks/bench_strategies.py
+"""
+
+import io
+import timeit
+from unittest import mock
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+
+from common import build_layout
+from xlsx_template.environment import (
+    Environment,
+    SoftGetAttrStrategy,
+    StrictGetAttrStrategy,
+    StrictGetItemStrategy,
+)
+from xlsx_template.template import Template
+
+CALLS = 1000000
+ROWS = 20000
+COLUMNS = 10
+
+
+class Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class NoCache(set):
+    def add(self, item):
+        pass
+
+
+def time_calls(func, *args):
+    return timeit.timeit(lambda: func(*args), number=CALLS)
+
+
+def strategy_calls():
+    soft = SoftGetAttrStrategy()
+    uncached = SoftGetAttrStrategy()
+    uncached.item_accessors = NoCache()
+    strict = StrictGetAttrStrategy()
+    item = StrictGetItemStrategy()
+    obj = Obj(a=1)
+    data = {"a": 1}
+    return [
+        ("soft get_attr, object", time_calls(soft.get_attr, obj, "a")),
+        ("soft get_attr, dict", time_calls(soft.get_attr, data, "a")),
+        ("uncached get_attr, dict", time_calls(uncached.get_attr, data, "a")),
+        ("strict get_attr, object", time_calls(strict.get_attr, obj, "a")),
+        ("strict get_item, dict", time_calls(item.get_item, data, "a")),
+    ]
+
+
+def make_template():
+    wb = Workbook()
+    ws = wb.active
+    for col in range(1, COLUMNS + 1):
+        ws.cell(1, col, "{{{{ row.cells[0].c{} }}}}".format(col))
+    ws.cell(1, 1).comment = Comment(
+        "Loop-down, for row in rows, last_cell={}1".format(
+            ws.cell(1, COLUMNS).column_letter
+        ),
+        "bench",
+    )
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def layout_builds():
+    source = make_template()
+    values = {"c{}".format(col): col for col in range(1, COLUMNS + 1)}
+    objects = {"rows": [Obj(cells=[Obj(**values)])] * ROWS}
+    dicts = {"rows": [{"cells": [values]}] * ROWS}
+    no_inline = {"inline_get_attr": False, "inline_get_item": False}
+    results = []
+    for name, env, data in [
+        ("soft, dicts", Environment(), dicts),
+        ("soft, objects", Environment(), objects),
+        (
+            "strict, objects",
+            Environment(get_attr_strategy=StrictGetAttrStrategy()),
+            objects,
+        ),
+    ]:
+        inline = Template(source, env=env)
+        with mock.patch.object(env, "get_compile_options", lambda: no_inline):
+            calls = Template(source, env=env)
+        results.append((name, build_layout(calls, data), build_layout(inline, data)))
+    return results
+
+
+def main():
+    print("{:>26} {:>12}".format("{} calls".format(CALLS), "time, s"))
+    for name, elapsed in strategy_calls():
+        print("{:>26} {:>12.3f}".format(name, elapsed))
+    print()
+    print(
+        "{:>26} {:>12} {:>12}".format(
+            "{} cells".format(ROWS * COLUMNS), "calls, s", "inline, s"
+        )
+    )
+    for name, calls, inline in layout_builds():
+        print("{:>26} {:>12.3f} {:>12.3f}".format(name, calls, inline))
+
+
+if __name__ == "__main__":
+    main()
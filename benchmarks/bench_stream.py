@@ -0,0 +1,38 @@
+"""
+Compare the default and the "stream" render modes on a loop template.
+
+    python benchmarks/bench_stream.py
+"""
+
+from common import make_loop_items, make_loop_template, measure, format_size
+
+COLUMNS = 10
+CELL_COUNTS = [100000, 500000, 1000000]
+
+
+def render(mode, cell_count):
+    from xlsx_template import Template
+
+    template = Template(make_loop_template(COLUMNS))
+    items = make_loop_items(cell_count // COLUMNS, COLUMNS)
+    return len(template.render({"items": items}, mode=mode))
+
+
+def main():
+    print(
+        "{:>10} {:>8} {:>10} {:>12} {:>12}".format(
+            "cells", "mode", "time, s", "peak RSS", "result size"
+        )
+    )
+    for cell_count in CELL_COUNTS:
+        for mode in ("default", "stream"):
+            elapsed, peak_rss, size = measure(render, mode, cell_count)
+            print(
+                "{:>10} {:>8} {:>10.2f} {:>12} {:>12}".format(
+                    cell_count, mode, elapsed, format_size(peak_rss), format_size(size)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
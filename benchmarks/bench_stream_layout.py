@@ -0,0 +1,45 @@
+"""
+Compare the "native" render mode with and without the row-streaming layout
+of the top-level loop of a sheet.
+
+    python benchmarks/bench_stream_layout.py
+"""
+
+from common import make_loop_items, make_loop_template, measure, format_size
+
+COLUMNS = 10
+CELL_COUNTS = [100000, 500000, 1000000]
+
+
+def render(stream_layout, cell_count):
+    from xlsx_template import Environment, Template
+
+    template = Template(
+        make_loop_template(COLUMNS), env=Environment(stream_layout=stream_layout)
+    )
+    items = make_loop_items(cell_count // COLUMNS, COLUMNS)
+    return len(template.render({"items": items}, mode="native"))
+
+
+def main():
+    print(
+        "{:>10} {:>14} {:>10} {:>12} {:>12}".format(
+            "cells", "stream layout", "time, s", "peak RSS", "result size"
+        )
+    )
+    for cell_count in CELL_COUNTS:
+        for stream_layout in (False, True):
+            elapsed, peak_rss, size = measure(render, stream_layout, cell_count)
+            print(
+                "{:>10} {:>14} {:>10.2f} {:>12} {:>12}".format(
+                    cell_count,
+                    str(stream_layout),
+                    elapsed,
+                    format_size(peak_rss),
+                    format_size(size),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure building the layout of a loop over wide rows, whose groups have a
+conditional cell, so the offsets of every row group are solved.
+
+    python benchmarks/bench_wide_rows.py
+"""
+
+import time
+
+import common  # noqa: F401, adds the package to sys.path
+from xlsx_template.consts import LoopDirection
+from xlsx_template.runtime import cell_groups as cg
+
+COLUMNS = 60
+ROW_COUNTS = [1000, 10000]
+
+
+def build(rows):
+    sheet = cg.SheetCellGroup(cg.Size(1, COLUMNS))
+    loop = cg.LoopCellGroup(cg.Size(1, COLUMNS), LoopDirection.DOWN)
+    for row in range(rows):
+        cell_group = cg.CellGroup(cg.Size(1, COLUMNS))
+        for col in range(COLUMNS - 1):
+            cell_group.add_cell(cg.Cell(0, col, None, row, None, None))
+        condition = cg.CellGroup(cg.Size(1, 1))
+        if row % 2:
+            condition.add_cell(cg.Cell(0, 0, None, row, None, None))
+        cell_group.add_cell_group(0, COLUMNS - 1, condition)
+        loop.add_cell_group(cell_group)
+    sheet.add_cell_group(0, 0, loop)
+    start = time.perf_counter()
+    for cell_group in loop.cell_groups:
+        cell_group.get_offsets()
+    solver = time.perf_counter() - start
+    start = time.perf_counter()
+    sheet.get_final_cells()
+    return solver, time.perf_counter() - start
+
+
+def main():
+    print("{:>8} {:>8} {:>10} {:>10}".format("rows", "cells", "solver, s", "layout, s"))
+    for rows in ROW_COUNTS:
+        results = [build(rows) for _ in range(5)]
+        solver = min(solver for solver, layout in results)
+        layout = min(layout for solver, layout in results)
+        print(
+            "{:>8} {:>8} {:>10.3f} {:>10.3f}".format(
+                rows, rows * COLUMNS, solver, layout
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Throughput of the output backends on a loop template.
+
+    python benchmarks/bench_writers.py
+"""
+
+from common import make_loop_items, make_loop_template, measure, format_size
+
+COLUMNS = 10
+CELL_COUNTS = [100000, 500000]
+MODES = ["default", "stream", "native"]
+
+
+def render(mode, cell_count):
+    import time
+
+    from xlsx_template import Template
+
+    template = Template(make_loop_template(COLUMNS))
+    items = make_loop_items(cell_count // COLUMNS, COLUMNS)
+    start = time.perf_counter()
+    template.render({"items": items}, mode=mode)
+    return time.perf_counter() - start
+
+
+def main():
+    print(
+        "{:>10} {:>8} {:>10} {:>14} {:>12}".format(
+            "cells", "mode", "time, s", "cells/s", "peak RSS"
+        )
+    )
+    for cell_count in CELL_COUNTS:
+        for mode in MODES:
+            _, peak_rss, elapsed = measure(render, mode, cell_count)
+            print(
+                "{:>10} {:>8} {:>10.2f} {:>14.0f} {:>12}".format(
+                    cell_count,
+                    mode,
+                    elapsed,
+                    cell_count / elapsed,
+                    format_size(peak_rss),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Every measurement runs in a fresh process, so peak RSS of one case is not
+affected by the allocations of the previous one.
+"""
+
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+from openpyxl import Workbook
+from openpyxl.comments import Comment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_loop_template(columns, header=True, footer=True):
+    """
+    Build a template with an optional header row, one `Loop-down` row with
+    `columns` cells and an optional footer row.
+    """
+    wb = Workbook()
+    ws = wb.active
+    row = 1
+    if header:
+        for col in range(1, columns + 1):
+            ws.cell(row, col, "Header {}".format(col))
+        row += 1
+    for col in range(1, columns + 1):
+        ws.cell(row, col, "{{{{ item.c{} }}}}".format(col))
+    ws.cell(row, 1).comment = Comment(
+        "Loop-down, for item in items, last_cell={}{}".format(
+            ws.cell(row, columns).column_letter, row
+        ),
+        "bench",
+    )
+    row += 1
+    if footer:
+        ws.cell(row, 1, "Footer")
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def make_loop_items(rows, columns):
+    return [
+        {"c{}".format(col): row * columns + col for col in range(1, columns + 1)}
+        for row in range(rows)
+    ]
+
+
+class NullSheetWriter:
+    def __init__(self, layout):
+        self.layout = layout
+
+    def write_cell_group(self, cell_group):
+        if self.layout:
+            cell_group.get_final_cells()
+
+
+class NullWriter:
+    def __init__(self, layout=True):
+        self.layout = layout
+
+    def create_sheet(self, name, sheet_state):
+        return NullSheetWriter(self.layout)
+
+
+def build_layout(template, data, layout=True):
+    """
+    Run the template code and, with `layout`, compute the final layout of
+    every sheet without writing the workbook. Return wall time in seconds.
+    """
+    from xlsx_template.runtime.context import Context
+
+    start = time.perf_counter()
+    writer = NullWriter(layout)
+    template.namespace["root"](Context(data, template.env), writer, template.env)
+    return time.perf_counter() - start
+
+
+def _run_case(queue, func, args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    queue.put((elapsed, peak_rss, result))
+
+
+def measure(func, *args):
+    """
+    Run `func(*args)` in a separate process and return a tuple
+    (wall time in seconds, peak RSS in bytes, func result).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(queue, func, args))
+    process.start()
+    res = queue.get()
+    process.join()
+    return res
+
+
+def format_size(size):
+    return "{:.1f} MB".format(size / 1024 / 1024)
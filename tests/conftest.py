@@ -22,9 +22,9 @@ def get_template(template_dir):
 
 @pytest.fixture(scope="session")
 def render_template(get_template):
-    def inner(template_name, context):
+    def inner(template_name, context, mode="default"):
         template = Template(get_template(template_name), debug=True)
-        res = template.render(context)
+        res = template.render(context, mode=mode)
         wb = load_workbook(io.BytesIO(res))
         return wb
 
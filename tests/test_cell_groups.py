@@ -1,13 +1,23 @@
+import gc
+import itertools
+import random
+import tracemalloc
+
 from xlsx_template.runtime.cell_groups import (
     CellGroup,
     Cell,
+    FixedCellGroup,
+    FixedLayout,
     LoopCellGroup,
     FuncArg,
     FuncCell,
     Size,
     SheetCellGroup,
+    StaticCellGroup,
+    StaticLayout,
+    StreamingSheetCellGroup,
 )
-from xlsx_template.consts import LoopDirection
+from xlsx_template.consts import FuncArgDirection, LoopDirection
 
 
 def test_cell_group_with_cells():
@@ -204,3 +214,387 @@ def test_offsets():
         ],
     }
     assert cell_group0.get_final_cells() == valid_result
+
+
+def test_static_cell_group():
+    cells = ((0, 0, "s1", "Label", 0, 0), (0, 1, "s1", 1.5, 0, 0))
+    inner = StaticLayout(Size(2, 1), cells=((0, 0, "s1", "Inner", 0, 0),))
+    layout = StaticLayout(
+        Size(4, 3), cells=cells, merges=((0, 0, 1, 2),), cell_groups=((1, 2, inner),)
+    )
+
+    def make_cell_group(make_inner):
+        cell_group = CellGroup(initial_size=Size(5, 3))
+        cell_group.add_cell_group(0, 0, make_inner())
+        cell_group.add_cell(Cell(4, 0, "s1", "Footer", 0, 0))
+        return cell_group
+
+    def make_dynamic():
+        cell_group = CellGroup(initial_size=Size(4, 3))
+        for args in cells:
+            cell_group.add_cell(Cell(*args))
+        cell_group.add_merge(0, 0, 1, 2)
+        inner_group = CellGroup(initial_size=Size(2, 1))
+        inner_group.add_cell(Cell(0, 0, "s1", "Inner", 0, 0))
+        cell_group.add_cell_group(1, 2, inner_group)
+        return cell_group
+
+    valid_cell_group = make_cell_group(make_dynamic)
+    for _ in range(2):
+        cell_group = make_cell_group(lambda: StaticCellGroup(layout))
+        assert cell_group.get_final_cells() == valid_cell_group.get_final_cells()
+        assert cell_group.get_final_size() == valid_cell_group.get_final_size()
+        assert [
+            (m.row, m.col, m.rows, m.cols) for m in cell_group.get_final_merges()
+        ] == [(0, 0, 1, 2)]
+    # Empty rows at the end of the static group are removed
+    assert cell_group.get_final_cells()[(4, 0)] == [Cell(2, 0, "s1", "Footer", 0, 0)]
+    # Every group gets its own cells
+    assert StaticCellGroup(layout).get_final_cells()[(0, 0)][0] is not (
+        StaticCellGroup(layout).get_final_cells()[(0, 0)][0]
+    )
+
+
+def test_fixed_cell_group():
+    static_layout = StaticLayout(Size(2, 2), cells=((0, 0, "s1", "Static", 0, 0),))
+    inner_layout = FixedLayout(Size(3, 1), cells=((0, 0), (1, 0)))
+    layout = FixedLayout(
+        Size(4, 4),
+        cells=((0, 0), (0, 1), (3, 3)),
+        cell_groups=((1, 0, inner_layout), (1, 2, static_layout)),
+    )
+
+    def make_cell_group(make_group):
+        cell_group = make_group(Size(4, 4), layout)
+        cell_group.add_cell(Cell(0, 0, "s1", "A", 0, 0))
+        cell_group.add_func_cell(
+            FuncCell(0, 1, "s1", "=SUM(A2)", 0, 0, [FuncArg(5, 7, [(1, -1)])])
+        )
+        cell_group.add_cell(Cell(3, 3, "s1", "D", 0, 0))
+        inner = make_group(Size(3, 1), inner_layout)
+        inner.add_cell(Cell(0, 0, "s1", 1, 0, 0))
+        inner.add_cell(Cell(1, 0, "s1", 2, 0, 0))
+        cell_group.add_cell_group(1, 0, inner)
+        cell_group.add_cell_group(1, 2, StaticCellGroup(static_layout))
+        sheet = SheetCellGroup(Size(4, 4))
+        sheet.add_cell_group(0, 0, cell_group)
+        return sheet
+
+    valid_sheet = make_cell_group(lambda size, layout: CellGroup(size))
+    valid_cells = sorted((c.row, c.col, c.value) for c in valid_sheet.get_final_cells())
+    assert (1, 2, "=SUM(A2)") in valid_cells
+    assert (2, 3, "Static") in valid_cells
+    assert (4, 4, "D") in valid_cells
+
+    assert layout.final_size == Size(4, 4)
+    for _ in range(2):
+        sheet = make_cell_group(lambda size, layout: FixedCellGroup(layout))
+        cells = sorted((c.row, c.col, c.value) for c in sheet.get_final_cells())
+        assert cells == valid_cells
+        assert sheet.get_final_size() == valid_sheet.get_final_size()
+
+
+def test_nested_loops_with_formulas():
+    sheet_cell_group = SheetCellGroup(initial_size=Size(2, 2))
+    cell_group0 = CellGroup(initial_size=Size(2, 2))
+    outer_loop = LoopCellGroup(initial_size=Size(1, 2), direction=LoopDirection.DOWN)
+    for outer_index in range(2):
+        cell_group1 = CellGroup(initial_size=Size(1, 2))
+        inner_loop = LoopCellGroup(
+            initial_size=Size(1, 2), direction=LoopDirection.DOWN
+        )
+        for inner_index in range(outer_index + 2):
+            cell_group2 = CellGroup(initial_size=Size(1, 2))
+            cell_group2.add_cell(Cell(0, 0, "s1", outer_index * 10 + inner_index, 0, 0))
+            func_args = [FuncArg(1, 3, [(0, -1)])]
+            cell_group2.add_func_cell(FuncCell(0, 1, "s1", "=A1*2", 0, 0, func_args))
+            inner_loop.add_cell_group(cell_group2)
+        cell_group1.add_cell_group(0, 0, inner_loop)
+        outer_loop.add_cell_group(cell_group1)
+    cell_group0.add_cell_group(0, 0, outer_loop)
+    func_args = [FuncArg(5, 7, [(-1, 0)])]
+    cell_group0.add_func_cell(FuncCell(1, 0, "s1", "=SUM(A1)", 0, 0, func_args))
+    func_args = [FuncArg(5, 7, [(-1, 0)])]
+    cell_group0.add_func_cell(FuncCell(1, 1, "s1", "=SUM(B1)", 0, 0, func_args))
+    sheet_cell_group.add_cell_group(0, 0, cell_group0)
+
+    valid_result = [
+        [None, None, None],
+        [None, 0, "=A1*2"],
+        [None, 1, "=A2*2"],
+        [None, 10, "=A3*2"],
+        [None, 11, "=A4*2"],
+        [None, 12, "=A5*2"],
+        [None, "=SUM(A1:A5)", "=SUM(B1:B5)"],
+    ]
+    assert sheet_cell_group.get_final_size() == Size(7, 3)
+    result = sheet_cell_group.final_result.get_simple_display()
+    assert result == valid_result
+
+
+def test_parallel_loops_with_formulas():
+    sheet_cell_group = SheetCellGroup(initial_size=Size(2, 3))
+    values = LoopCellGroup(initial_size=Size(1, 1), direction=LoopDirection.DOWN)
+    formulas = LoopCellGroup(initial_size=Size(1, 2), direction=LoopDirection.DOWN)
+    for row in range(3):
+        cell_group = CellGroup(initial_size=Size(1, 1))
+        cell_group.add_cell(Cell(0, 0, "s1", row, 0, 0))
+        values.add_cell_group(cell_group)
+        cell_group = CellGroup(initial_size=Size(1, 2))
+        func_args = [FuncArg(1, 3, [(0, -1)], FuncArgDirection.HORIZONTAL)]
+        cell_group.add_func_cell(FuncCell(0, 0, "s1", "=A1*2", 0, 0, func_args))
+        func_args = [FuncArg(5, 7, [(0, -2)], FuncArgDirection.VERTICAL)]
+        cell_group.add_func_cell(FuncCell(0, 1, "s1", "=SUM(A1)", 0, 0, func_args))
+        formulas.add_cell_group(cell_group)
+    sheet_cell_group.add_cell_group(0, 0, values)
+    sheet_cell_group.add_cell_group(0, 1, formulas)
+    # Cells of the first column are not in the column of the formulas
+    func_args = [FuncArg(5, 7, [(-1, -1)])]
+    sheet_cell_group.add_func_cell(FuncCell(1, 1, "s1", "=SUM(A1)", 0, 0, func_args))
+
+    valid_result = [
+        [None, None, None, None],
+        [None, 0, "=A1*2", ""],
+        [None, 1, "=A2*2", ""],
+        [None, 2, "=A3*2", ""],
+        [None, None, "=SUM(A1:A3)", None],
+    ]
+    result = sheet_cell_group.final_result.get_simple_display()
+    assert result == valid_result
+
+
+class RowsSheet:
+    def __init__(self):
+        self.written = []
+
+    def write_rows(self, cells):
+        self.written.append(cells)
+
+
+def build_report(sheet_cell_group, sheet, header_col=1):
+    """
+    Header with a loop at `header_col`, a loop of values and formulas, where
+    some iterations are empty, footer with sums over the loop. Return the
+    number of parts written to `sheet` after each iteration.
+    """
+    sheet_cell_group.add_cell(Cell(0, 0, None, "title", None, None))
+    sheet_cell_group.add_cell(Cell(0, 1, None, "date", None, None))
+    sheet_cell_group.add_cell(Cell(1, 1 - header_col, None, "label", None, None))
+    header_loop = LoopCellGroup(Size(1, 1), LoopDirection.DOWN)
+    for index in range(2):
+        cell_group = CellGroup(Size(1, 1))
+        cell_group.add_cell(Cell(0, 0, None, "h{}".format(index), None, None))
+        header_loop.add_cell_group(cell_group)
+    sheet_cell_group.add_cell_group(1, header_col, header_loop)
+    if isinstance(sheet_cell_group, StreamingSheetCellGroup):
+        loop = sheet_cell_group.start_loop(2, 0, Size(1, 2))
+    else:
+        loop = LoopCellGroup(Size(1, 2), LoopDirection.DOWN)
+    written = []
+    for index in range(10):
+        cell_group = CellGroup(Size(1, 2))
+        if index % 3:
+            cell_group.add_cell(Cell(0, 0, None, index, None, None))
+            args = [FuncArg(1, 3, [(0, -1)], FuncArgDirection.HORIZONTAL)]
+            cell_group.add_func_cell(FuncCell(0, 1, None, "=A1*2", None, None, args))
+            cell_group.add_merge(0, 1, 1, 2)
+        loop.add_cell_group(cell_group)
+        written.append(len(sheet.written))
+    sheet_cell_group.add_cell_group(2, 0, loop)
+    args = [FuncArg(5, 7, [(-1, 0)])]
+    sheet_cell_group.add_func_cell(FuncCell(3, 0, None, "=SUM(A1)", None, None, args))
+    args = [FuncArg(5, 7, [(-1, 0)])]
+    sheet_cell_group.add_func_cell(FuncCell(3, 1, None, "=SUM(B1)", None, None, args))
+    return written
+
+
+def dump_sheet(cells, merges):
+    return (
+        sorted(
+            ((cell.row, cell.col, cell.value) for cell in cells),
+            key=lambda item: item[:2],
+        ),
+        [(merge.row, merge.col, merge.rows, merge.cols) for merge in merges],
+    )
+
+
+def test_streaming_sheet_cell_group():
+    reference = SheetCellGroup(Size(4, 2))
+    build_report(reference, RowsSheet())
+    expected = dump_sheet(reference.get_final_cells(), reference.get_final_merges())
+
+    sheet = RowsSheet()
+    sheet_cell_group = StreamingSheetCellGroup(Size(4, 2), sheet, [(2, 0), (2, 1)])
+    # The header and every iteration are written as soon as they are placed
+    assert build_report(sheet_cell_group, sheet) == list(range(2, 12))
+    rows = [[cell.row for cell in cells] for cells in sheet.written if cells]
+    assert all(max(a) < min(b) for a, b in zip(rows, rows[1:]))
+    cells = [cell for cells in sheet.written for cell in cells]
+    cells.extend(sheet_cell_group.get_final_cells())
+    assert dump_sheet(cells, sheet_cell_group.get_final_merges()) == expected
+    assert sheet_cell_group.get_final_size() == reference.get_final_size()
+    assert "=SUM(A4:A9)" in [cell.value for cell in cells]
+
+    # Sheet writers without write_rows get the whole sheet at the end
+    sheet_cell_group = StreamingSheetCellGroup(Size(4, 2), object(), [(2, 0)])
+    assert build_report(sheet_cell_group, RowsSheet()) == [0] * 10
+    assert (
+        dump_sheet(
+            sheet_cell_group.get_final_cells(), sheet_cell_group.get_final_merges()
+        )
+        == expected
+    )
+
+    # A group right above the loop may lose its growth to the loop, so the
+    # sheet is not streamed
+    reference = SheetCellGroup(Size(4, 2))
+    build_report(reference, RowsSheet(), header_col=0)
+    expected = dump_sheet(reference.get_final_cells(), reference.get_final_merges())
+    sheet = RowsSheet()
+    sheet_cell_group = StreamingSheetCellGroup(Size(4, 2), sheet, [(2, 0)])
+    assert build_report(sheet_cell_group, sheet, header_col=0) == [0] * 10
+    assert (
+        dump_sheet(
+            sheet_cell_group.get_final_cells(), sheet_cell_group.get_final_merges()
+        )
+        == expected
+    )
+
+
+def reference_offsets(cell_group):
+    """
+    Dense offset solver, which `CellGroup.get_offsets` replaced.
+    """
+    row_offsets = [
+        [None] * cell_group.initial_size.width
+        for _ in range(cell_group.initial_size.height + 1)
+    ]
+    col_offsets = [
+        [None] * cell_group.initial_size.height
+        for _ in range(cell_group.initial_size.width + 1)
+    ]
+    for (row, col), child in cell_group.cell_groups.items():
+        final_size = child.get_final_size()
+        if final_size.width > child.initial_size.width:
+            for i in range(child.initial_size.width):
+                col_offsets[col + i][row] = 0
+            col_offsets[col + 1][row] = final_size.width - child.initial_size.width
+        else:
+            for i in range(col, col + final_size.width):
+                col_offsets[i][row] = max(col_offsets[i][row] or 0, 0)
+            for i in range(col + final_size.width, col + child.initial_size.width):
+                col_offsets[i][row] = -1
+
+        if final_size.height > child.initial_size.height:
+            for i in range(child.initial_size.height):
+                row_offsets[row + i][col] = 0
+            row_offsets[row + 1][col] = final_size.height - child.initial_size.height
+        else:
+            for i in range(row, row + final_size.height):
+                row_offsets[i][col] = max(row_offsets[i][col] or 0, 0)
+            for i in range(row + final_size.height, row + child.initial_size.height):
+                row_offsets[i][col] = -1
+
+    for cell in itertools.chain(cell_group.cells, cell_group.func_cells):
+        row_offsets[cell.row][cell.col] = max(row_offsets[cell.row][cell.col] or 0, 0)
+        col_offsets[cell.col][cell.row] = max(col_offsets[cell.col][cell.row] or 0, 0)
+
+    row_offsets = [
+        [offset for offset in row if offset is not None] for row in row_offsets
+    ]
+    row_offsets = [max(row) if row else 0 for row in row_offsets]
+    col_offsets = [
+        [offset for offset in col if offset is not None] for col in col_offsets
+    ]
+    col_offsets = [max(col) if col else 0 for col in col_offsets]
+    return (
+        list(itertools.accumulate(row_offsets)),
+        list(itertools.accumulate(col_offsets)),
+    )
+
+
+def reference_final_size(cell_group):
+    """
+    Final size of a `CellGroup`, found by scanning all its cells.
+    """
+    row_offsets, col_offsets = reference_offsets(cell_group)
+    last_row, last_col = -1, -1
+    for cell in itertools.chain(cell_group.cells, cell_group.func_cells):
+        last_row = max(last_row, cell.row + row_offsets[cell.row])
+        last_col = max(last_col, cell.col + col_offsets[cell.col])
+    for (row, col), child in cell_group.cell_groups.items():
+        size = child.get_final_size()
+        if size.height:
+            last_row = max(last_row, row + row_offsets[row] + size.height - 1)
+            last_col = max(last_col, col + col_offsets[col] + size.width - 1)
+    return Size(width=last_col + 1, height=last_row + 1)
+
+
+class ResizedCellGroup:
+    def __init__(self, initial_size, final_size):
+        self.initial_size = initial_size
+        self.final_size = final_size
+
+    def get_final_size(self):
+        return self.final_size
+
+
+def test_random_offsets():
+    rng = random.Random(0)
+    for _ in range(2000):
+        height, width = rng.randint(1, 6), rng.randint(1, 6)
+        cell_group = CellGroup(Size(height, width))
+        for _ in range(rng.randrange(4)):
+            row, col = rng.randrange(height), rng.randrange(width)
+            initial_size = Size(
+                rng.randint(1, height - row), rng.randint(1, width - col)
+            )
+            if rng.random() < 0.2:
+                final_size = Size(0, 0)
+            else:
+                final_size = Size(rng.randint(1, 5), rng.randint(1, 5))
+            cell_group.add_cell_group(
+                row, col, ResizedCellGroup(initial_size, final_size)
+            )
+        for _ in range(rng.randrange(5)):
+            cell = Cell(rng.randrange(height), rng.randrange(width), None, 0, 0, 0)
+            if rng.random() < 0.5:
+                cell_group.add_cell(cell)
+            else:
+                cell_group.add_func_cell(
+                    FuncCell(cell.row, cell.col, None, "", 0, 0, args=[])
+                )
+        assert cell_group.get_offsets() == reference_offsets(cell_group)
+        assert cell_group.get_final_size() == reference_final_size(cell_group)
+
+
+def test_placed_cell_groups_are_released():
+    def build():
+        sheet = SheetCellGroup(Size(2, 4))
+        for row in range(2):
+            loop = LoopCellGroup(Size(1, 4), LoopDirection.DOWN)
+            for index in range(5000):
+                cell_group = CellGroup(Size(1, 4))
+                for col in range(4):
+                    cell_group.add_cell(Cell(0, col, None, index, None, None))
+                loop.add_cell_group(cell_group)
+            sheet.add_cell_group(row, 0, loop)
+        return sheet
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        sheet = build()
+        cells = sheet.get_final_cells()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+        del sheet
+        gc.collect()
+        store, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(cells) == 40000
+    # Placed groups and intermediate lists of the result are freed, only
+    # the final cells are left
+    assert held < 1.1 * store
+    assert peak < 3 * store
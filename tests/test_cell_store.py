@@ -0,0 +1,75 @@
+import datetime
+import decimal
+import random
+
+import pytest
+
+from xlsx_template.runtime.cell_groups import Cell
+from xlsx_template.runtime.cell_store import CellStore, SpillStats
+
+VALUES = [
+    "text",
+    None,
+    True,
+    -12,
+    3.25,
+    decimal.Decimal("10.1"),
+    datetime.datetime(2020, 1, 2, 3, 4, 5),
+]
+
+
+def dump(cells):
+    return [
+        (cell.row, cell.col, cell.style, cell.value, cell.row_height, cell.col_width)
+        for cell in cells
+    ]
+
+
+def random_cells(rng, count):
+    return [
+        Cell(
+            rng.randrange(1, 50),
+            rng.randrange(1, 5),
+            rng.choice([None, "style0"]),
+            rng.choice(VALUES),
+            rng.choice([None, 15]),
+            rng.choice([None, 8.5]),
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("budget", [None, 1, 7, 100, 1000])
+def test_cell_store(budget):
+    rng = random.Random(0)
+    parts = [random_cells(rng, rng.randrange(20)) for _ in range(30)]
+    cells = [cell for part in parts for cell in part]
+    # Cells at the same position keep the order they were added in
+    expected = dump(sorted(cells, key=lambda cell: (cell.row, cell.col)))
+
+    stats = SpillStats()
+    store = CellStore(budget, stats)
+    for part in parts:
+        store.extend(part)
+    assert dump(store.iter_cells()) == expected
+    assert store.file is None
+    if budget is None or budget >= len(cells):
+        assert (stats.cells, stats.runs, stats.bytes) == (0, 0, 0)
+    else:
+        assert stats.runs > 1
+        assert len(cells) - budget <= stats.cells <= len(cells)
+        assert stats.bytes > 0
+
+
+def test_cell_store_shares_stats():
+    stats = SpillStats()
+    for _ in range(2):
+        store = CellStore(2, stats)
+        store.extend([Cell(1, col, None, col, None, None) for col in range(1, 4)])
+        assert [cell.value for cell in store.iter_cells()] == [1, 2, 3]
+    assert (stats.cells, stats.runs) == (6, 2)
+
+
+def test_invalid_budget():
+    with pytest.raises(ValueError):
+        CellStore(0)
@@ -0,0 +1,224 @@
+import os
+import random
+
+import pyparsing
+import pytest
+
+from xlsx_template import expr_parser, grammar, nodes
+from xlsx_template.parser import Parser
+
+
+def dump(node):
+    if isinstance(node, nodes.Node):
+        return (
+            node.__class__.__name__,
+            tuple(
+                (name, dump(getattr(node, name))) for name in sorted(node.attributes)
+            ),
+        )
+    if isinstance(node, (list, pyparsing.ParseResults)):
+        return [dump(item) for item in node]
+    if isinstance(node, tuple):
+        return tuple(dump(item) for item in node)
+    return (node.__class__.__name__, node)
+
+
+def parse_both(fast_func, pp_func, s):
+    try:
+        valid_result = pp_func(s)
+    except pyparsing.ParseBaseException:
+        valid_result = None
+    try:
+        result = fast_func(s)
+    except expr_parser.NotHandled:
+        result = None
+    return result, valid_result
+
+
+def assert_same_expr(s, handled=True):
+    result, valid_result = parse_both(
+        expr_parser._parse_expr_with_filter, grammar.parse_expr_with_filter, s
+    )
+    if result is None:
+        assert not handled or valid_result is None, s
+    else:
+        assert valid_result is not None, s
+        assert dump(result) == dump(valid_result), s
+
+
+def assert_same_func_args(s):
+    result, valid_result = parse_both(
+        expr_parser._parse_func_args, grammar.parse_func_args, s
+    )
+    if result is not None:
+        assert dump(result) == dump(valid_result), s
+
+
+def assert_same_cell(s):
+    result, valid_result = parse_both(
+        expr_parser._parse_cell, lambda s: grammar.cell.parseString(s, True)[0], s
+    )
+    if result is not None:
+        assert result == valid_result, s
+
+
+def _collect_template_strings(template_dir, monkeypatch):
+    strings = {"expr": [], "func_args": [], "cell": []}
+
+    def spy(kind, func):
+        def inner(s):
+            strings[kind].append(s)
+            return func(s)
+
+        return inner
+
+    monkeypatch.setattr(
+        expr_parser,
+        "parse_expr_with_filter",
+        spy("expr", expr_parser.parse_expr_with_filter),
+    )
+    monkeypatch.setattr(
+        expr_parser, "parse_func_args", spy("func_args", expr_parser.parse_func_args)
+    )
+    monkeypatch.setattr(expr_parser, "parse_cell", spy("cell", expr_parser.parse_cell))
+    for name in sorted(os.listdir(template_dir)):
+        with open(os.path.join(template_dir, name), "rb") as f:
+            Parser(f.read()).parse()
+    return strings
+
+
+def test_template_expressions(template_dir, monkeypatch):
+    strings = _collect_template_strings(template_dir, monkeypatch)
+    assert strings["expr"] and strings["func_args"] and strings["cell"]
+    for s in strings["expr"]:
+        assert_same_expr(s)
+    for s in strings["func_args"]:
+        assert_same_func_args(s)
+        assert expr_parser._parse_func_args(s) is not None
+    for s in strings["cell"]:
+        assert_same_cell(s)
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        "a",
+        " a.b [ 'c' ] ( 1 , x = 2.5 ) ",
+        "True",
+        "true_value",
+        "f(True=1)",
+        "0x1F + 1",
+        "0x",
+        "1.",
+        "1.foo",
+        "a.5",
+        ".5",
+        "-.5|abs",
+        '"a""b"',
+        '"a""',
+        "'\\x41'",
+        "a|f|g(1, 'x')|h()",
+        "a|True",
+        "a[b[c]]()()",
+        "f(a=)",
+        "f(a==b)",
+        "f(1,)",
+        "a ||f",
+        "",
+        "a\tb",
+        "'a\tb'",
+        "a$",
+    ],
+)
+def test_expressions(s):
+    assert_same_expr(s, handled="\t" not in s)
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        "=SUM(A1:B2)",
+        "=A1B2",
+        "=SUM(A1 ,B1)",
+        "=A1:B2 C3",
+        "=LOG10(A1)",
+        '=A1&"B2"',
+        "=A1:",
+        "=A1::B2",
+        "=A1:B2:C3",
+        "=$A$1+a1+AA100",
+        "",
+    ],
+)
+def test_func_args(s):
+    assert_same_func_args(s)
+
+
+@pytest.mark.parametrize("s", ["A1", " AB12 ", "A 1", "a1", "A", "1", "A1B"])
+def test_cell(s):
+    assert_same_cell(s)
+
+
+def _random_expr(rng, depth=0):
+    def ws():
+        return rng.choice(["", "", "", " ", "  ", "\n"])
+
+    choice = rng.randrange(8 if depth < 3 else 5)
+    if choice == 0:
+        base = rng.choice(["1", "0", "12", "1.5", ".5", "+1.", "-2.25", "0x1f"])
+    elif choice == 1:
+        base = rng.choice(["'a'", '"b c"', "''", '"x""y"', "'\\n'"])
+    elif choice == 2:
+        base = rng.choice(["True", "true", "False", "false", "TRUE"])
+    else:
+        base = rng.choice(["a", "_b", "item", "x1", "loop"])
+    parts = [base]
+    for _ in range(rng.randrange(3) if depth < 3 else 0):
+        kind = rng.randrange(3)
+        if kind == 0:
+            parts.append(ws() + "." + ws() + rng.choice(["a", "name", "True"]))
+        elif kind == 1:
+            parts.append(ws() + "[" + _random_expr(rng, depth + 1) + "]")
+        else:
+            parts.append(ws() + "(" + _random_args(rng, depth + 1) + ")")
+    return ws() + "".join(parts) + ws()
+
+
+def _random_args(rng, depth):
+    args = []
+    for _ in range(rng.randrange(3)):
+        if rng.random() < 0.3:
+            args.append(rng.choice(["k", "True"]) + " = " + _random_expr(rng, depth))
+        else:
+            args.append(_random_expr(rng, depth))
+    return ",".join(args)
+
+
+def _random_expr_with_filter(rng):
+    s = _random_expr(rng)
+    for _ in range(rng.randrange(3)):
+        s += "|" + rng.choice(["f", "yes_no", "default_if_none"])
+        if rng.random() < 0.5:
+            s += "(" + _random_args(rng, 1) + ")"
+    return s
+
+
+def test_random_expressions():
+    rng = random.Random(0)
+    for _ in range(2000):
+        s = _random_expr_with_filter(rng)
+        assert_same_expr(s)
+        # Random corruption: results must still match or fall back
+        chars = list(s)
+        for _ in range(rng.randrange(1, 3)):
+            index = rng.randrange(len(chars) + 1)
+            chars.insert(index, rng.choice(".[]()=,|'\" a1$+-:"))
+        assert_same_expr("".join(chars), handled=False)
+
+
+def test_random_func_args():
+    rng = random.Random(0)
+    alphabet = ["A", "B", "Z", "1", "2", "0", ":", ",", "(", ")", "+", "$", "a", " "]
+    for _ in range(2000):
+        s = "=" + "".join(rng.choice(alphabet) for _ in range(rng.randrange(12)))
+        assert_same_func_args(s)
@@ -0,0 +1,112 @@
+import os
+import io
+import shutil
+
+from openpyxl import load_workbook
+import pytest
+
+from xlsx_template.environment import Environment
+from xlsx_template.exceptions import TemplateNotFound
+from xlsx_template.file_system_loader import FileSystemLoader
+import data_generators
+
+
+@pytest.fixture
+def loader_dir(template_dir, tmp_path):
+    for name in ["test_variables.xlsx", "test_simple_loop.xlsx", "test_if.xlsx"]:
+        shutil.copy(os.path.join(template_dir, name), str(tmp_path / name))
+    os.mkdir(str(tmp_path / "sub"))
+    shutil.copy(
+        os.path.join(template_dir, "test_merge.xlsx"),
+        str(tmp_path / "sub" / "test_merge.xlsx"),
+    )
+    return tmp_path
+
+
+def test_get_template(loader_dir, template_dir):
+    env = Environment(loader=FileSystemLoader([str(loader_dir), template_dir]))
+    template = env.get_template("test_simple_loop.xlsx")
+    assert template.name == "test_simple_loop.xlsx"
+    assert template.filename == os.path.join(str(loader_dir), "test_simple_loop.xlsx")
+    assert env.get_template("test_simple_loop.xlsx") is template
+    assert env.get_template("sub/test_merge.xlsx").filename == os.path.join(
+        str(loader_dir), "sub", "test_merge.xlsx"
+    )
+    # Falls back to the next search path
+    template = env.get_template("loop_with_formulas.xlsx")
+    assert template.filename == os.path.join(template_dir, "loop_with_formulas.xlsx")
+    wb = load_workbook(
+        io.BytesIO(template.render(data_generators.generate_for_loop_with_formulas()))
+    )
+    assert wb.sheetnames
+
+    for name in ["missing.xlsx", "../test_if.xlsx", "sub", "", "sub/../test_if.xlsx"]:
+        with pytest.raises(TemplateNotFound):
+            env.get_template(name)
+
+    with pytest.raises(TypeError):
+        Environment().get_template("test_if.xlsx")
+
+
+def test_lru_cache(loader_dir):
+    env = Environment(loader=FileSystemLoader(str(loader_dir)), cache_size=2)
+    variables = env.get_template("test_variables.xlsx")
+    env.get_template("test_simple_loop.xlsx")
+    assert env.get_template("test_variables.xlsx") is variables
+    # test_simple_loop.xlsx is the least recently used one
+    env.get_template("test_if.xlsx")
+    assert env.get_template("test_variables.xlsx") is variables
+    env.get_template("test_simple_loop.xlsx")
+    assert env.get_cache_stats() == {
+        "size": 2,
+        "capacity": 2,
+        "hits": 2,
+        "misses": 4,
+        "evictions": 2,
+        "reloads": 0,
+    }
+
+    env = Environment(loader=FileSystemLoader(str(loader_dir)), cache_size=0)
+    template = env.get_template("test_if.xlsx")
+    assert env.get_template("test_if.xlsx") is not template
+    assert env.get_cache_stats()["size"] == 0
+
+
+def _touch(file_name, template_dir, source_name):
+    stat = os.stat(file_name)
+    shutil.copy(os.path.join(template_dir, source_name), file_name)
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_auto_reload(loader_dir, template_dir, monkeypatch):
+    file_name = str(loader_dir / "test_if.xlsx")
+    env = Environment(loader=FileSystemLoader(str(loader_dir)))
+    template = env.get_template("test_if.xlsx")
+    assert env.get_template("test_if.xlsx") is template
+    _touch(file_name, template_dir, "test_variables.xlsx")
+    new_template = env.get_template("test_if.xlsx")
+    assert new_template is not template
+    assert env.get_template("test_if.xlsx") is new_template
+    assert env.get_cache_stats()["reloads"] == 1
+
+    env = Environment(loader=FileSystemLoader(str(loader_dir)), auto_reload=False)
+    template = env.get_template("test_if.xlsx")
+    _touch(file_name, template_dir, "test_if.xlsx")
+    assert env.get_template("test_if.xlsx") is template
+
+    now = [1000.0]
+    monkeypatch.setattr("xlsx_template.environment.time.monotonic", lambda: now[0])
+    env = Environment(loader=FileSystemLoader(str(loader_dir)), auto_reload_interval=5)
+    template = env.get_template("test_if.xlsx")
+    _touch(file_name, template_dir, "test_variables.xlsx")
+    now[0] += 4
+    assert env.get_template("test_if.xlsx") is template
+    now[0] += 1
+    assert env.get_template("test_if.xlsx") is not template
+    assert env.get_cache_stats()["reloads"] == 1
+
+    template = env.get_template("test_if.xlsx")
+    os.remove(file_name)
+    now[0] += 5
+    with pytest.raises(TemplateNotFound):
+        env.get_template("test_if.xlsx")
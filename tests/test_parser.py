@@ -0,0 +1,176 @@
+import copy
+import io
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.comments import Comment
+from openpyxl.styles import Font
+from openpyxl.worksheet.dimensions import ColumnDimension
+
+from xlsx_template import nodes
+from xlsx_template.parser import Parser
+from xlsx_template.template import Template
+
+
+def _save(wb):
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _cell_positions(body):
+    return {node.base_cell for node in body if isinstance(node, nodes.CellOutput)}
+
+
+def test_sparse_template():
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "Title"
+    ws["C3"] = "{{ value }}"
+    ws.cell(200, 2000).font = Font(bold=True)
+    source = _save(wb)
+
+    template, styles = Parser(source).parse()
+    sheet = template.body[0]
+    assert (sheet.height, sheet.width) == (200, 2000)
+    assert _cell_positions(sheet.body) == {(0, 0), (2, 2), (199, 1999)}
+    assert len(styles) == 1
+
+    ws = load_workbook(io.BytesIO(Template(source).render({"value": 10}))).active
+    assert ws["A1"].value == "Title"
+    assert ws["C3"].value == 10
+    assert ws.cell(200, 2000).font.b
+
+
+def test_sparse_template_layout_cells():
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "Header"
+    ws["A2"] = "{{ item }}"
+    ws["A2"].comment = Comment("Loop-down, for item in items", "")
+    ws["B3"] = "Footer"
+    ws["A4"] = "=SUM(A2:B3)"
+    ws["D4"] = "Last"
+    ws["D4"].comment = Comment("Merge, rows=2", "")
+    source = _save(wb)
+
+    template, styles = Parser(source).parse()
+    sheet = template.body[0]
+    # B2 keeps the second row when the loop is empty, A3 is referenced by
+    # the function
+    assert _cell_positions(sheet.body) == {
+        (0, 0),
+        (1, 1),
+        (2, 0),
+        (2, 1),
+        (3, 0),
+        (3, 3),
+    }
+
+    ws = load_workbook(io.BytesIO(Template(source).render({"items": []}))).active
+    assert ws["B3"].value == "Footer"
+    assert ws["A4"].value == "=SUM(B2,A3:B3)"
+    assert [str(m) for m in ws.merged_cells] == ["D4:D5"]
+
+
+def test_style_interning(monkeypatch):
+    wb = Workbook()
+    ws = wb.active
+    for row in range(1, 21):
+        ws.cell(row, 1, "bold").font = Font(bold=True)
+        ws.cell(row, 2, "italic").font = Font(italic=True)
+        ws.cell(row, 3, "plain")
+    ws["D1"].font = Font(bold=True)
+    ws["D1"].quotePrefix = True
+    source = _save(wb)
+
+    copied = []
+    original_copy = copy.copy
+    monkeypatch.setattr(
+        "xlsx_template.parser.copy.copy",
+        lambda obj: copied.append(obj) or original_copy(obj),
+    )
+    parser = Parser(source)
+    template, styles = parser.parse()
+    assert [style.name for style in styles] == ["style0", "style1"]
+    # Style components are copied once per distinct style id
+    assert len(parser.style_names) == 3
+    assert len(copied) == 6 * 3
+    sheet = template.body[0]
+    names = {node.base_cell: node.style for node in sheet.body}
+    assert names[(0, 0)] == names[(19, 0)] == "style0"
+    assert names[(0, 1)] == names[(19, 1)] == "style1"
+    assert names[(0, 2)] is None
+    # Different style id, equal style
+    assert names[(0, 3)] == "style0"
+
+    monkeypatch.undo()
+    _, styles_again = Parser(source).parse()
+    assert [(style.name, style.font) for style in styles_again] == [
+        (style.name, style.font) for style in styles
+    ]
+
+
+def test_dimensions():
+    wb = Workbook()
+    ws = wb.active
+    for col in range(1, 6):
+        ws.cell(1, col, "{{ value }}")
+        ws.cell(2, col, "footer")
+    ws.column_dimensions["A"].width = 10
+    ws.column_dimensions["B"] = ColumnDimension(ws, index="B", min=2, max=4, width=25)
+    ws.row_dimensions[2].height = 30
+    source = _save(wb)
+
+    template, styles = Parser(source).parse()
+    sheet = template.body[0]
+    widths = {node.base_cell: node.col_width.value for node in sheet.body}
+    heights = {node.base_cell: node.row_height.value for node in sheet.body}
+    assert [widths[(0, col)] for col in range(5)] == [10, 25, 25, 25, None]
+    assert heights[(0, 0)] is None
+    assert heights[(1, 4)] == 30
+
+    ws = load_workbook(io.BytesIO(Template(source).render({"value": 1}))).active
+    assert {
+        key: dim.width for key, dim in ws.column_dimensions.items() if dim.customWidth
+    } == {"A": 10, "B": 25, "C": 25, "D": 25}
+    assert ws.row_dimensions[2].height == 30
+
+
+def test_expression_cache():
+    wb = Workbook()
+    ws = wb.active
+    for row in range(1, 4):
+        ws.cell(row, 1, "{{ item.amount|default_if_none(0) }}")
+    ws.cell(1, 2, "{{ item.name }}")
+    ws2 = wb.create_sheet("Second")
+    ws2["A1"] = "{{ item.amount|default_if_none(0) }}"
+    source = _save(wb)
+
+    parser = Parser(source)
+    template, styles = parser.parse()
+    values = [
+        node.value.body[0]
+        for sheet in template.body
+        for node in sheet.body
+        if isinstance(node, nodes.CellOutput)
+        and isinstance(node.value.body[0], nodes.Filter)
+    ]
+    assert len(values) == 4
+    # Every cell gets its own copy of the cached node
+    assert len({id(value) for value in values}) == 4
+    assert len({id(value.obj) for value in values}) == 4
+    assert len({id(value.args[0]) for value in values}) == 4
+    assert parser.get_expression_cache_stats() == {
+        "size": 2,
+        "hits": 3,
+        "misses": 2,
+        "hit_rate": 0.6,
+    }
+
+    template = Template(source, debug=True)
+    assert template.expression_cache_stats["hit_rate"] == 0.6
+    result = load_workbook(
+        io.BytesIO(template.render({"item": {"amount": None, "name": "x"}}))
+    )
+    assert result.active["A3"].value == 0
+    assert result["Second"]["A1"].value == 0
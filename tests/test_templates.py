@@ -1,15 +1,26 @@
 import os
 import io
+import re
 import decimal
 import itertools
+import stat
 import string
 
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.comments import Comment
+import pytest
 
 from xlsx_template.template import Template
+from xlsx_template.environment import (
+    Environment,
+    SoftGetAttrStrategy,
+    StrictGetAttrStrategy,
+)
+from xlsx_template.exceptions import TemplateRuntimeException, Unresolved
+from xlsx_template.runtime.cell_store import SpillStats
+from xlsx_template.template_cache import FileSystemTemplateCache
 import data_generators
 
-
 BASE_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "xlsx")
 
 
@@ -150,3 +161,532 @@ def test_sheet_loop(render_template):
     for index in range(1, 11):
         ws = wb[f"Sheet # {index}"]
         assert ws["A1"].value == f"Sheet var # {index}"
+
+
+TEMPLATES_DATA = [
+    ("test_variables.xlsx", data_generators.generate_for_test_variables),
+    ("test_simple_loop.xlsx", data_generators.generate_for_test_simple_loop),
+    ("test_two_nested_loops.xlsx", data_generators.generate_for_test_two_nested_loops),
+    ("test_loop_context.xlsx", data_generators.generate_for_test_loop_context),
+    ("test_merge.xlsx", data_generators.generate_for_test_merge),
+    ("test_if.xlsx", data_generators.generate_for_test_if),
+    ("loop_with_formulas.xlsx", data_generators.generate_for_loop_with_formulas),
+    ("test_column_width.xlsx", data_generators.generate_for_test_column_width),
+    ("test_sheet_loop.xlsx", data_generators.generate_for_sheet_loop),
+]
+
+
+def _dump_workbook(wb):
+    res = []
+    for ws in wb:
+        cells = [
+            (cell.coordinate, cell.value, cell.style)
+            for row in ws.iter_rows()
+            for cell in row
+            if cell.value is not None or cell.has_style
+        ]
+        res.append(
+            (
+                ws.title,
+                ws.sheet_state,
+                cells,
+                sorted(str(cr) for cr in ws.merged_cells),
+                {
+                    key: dim.width
+                    for key, dim in ws.column_dimensions.items()
+                    if dim.customWidth
+                },
+                {key: dim.height for key, dim in ws.row_dimensions.items()},
+            )
+        )
+    return res
+
+
+@pytest.mark.parametrize("mode", ["stream", "native"])
+@pytest.mark.parametrize("template_name,data_generator", TEMPLATES_DATA)
+def test_render_modes(render_template, template_name, data_generator, mode):
+    wb = render_template(template_name, data_generator())
+    mode_wb = render_template(template_name, data_generator(), mode=mode)
+    assert _dump_workbook(mode_wb) == _dump_workbook(wb)
+
+
+def test_invalid_mode(get_template):
+    template = Template(get_template("test_simple_loop.xlsx"))
+    with pytest.raises(ValueError):
+        template.render(data_generators.generate_for_test_simple_loop(), mode="xxx")
+
+
+class NonSeekableFile:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+@pytest.mark.parametrize("mode", ["default", "stream", "native"])
+def test_render_to(get_template, tmp_path, mode):
+    template = Template(get_template("loop_with_formulas.xlsx"))
+    data = data_generators.generate_for_loop_with_formulas()
+    valid_result = _dump_workbook(load_workbook(io.BytesIO(template.render(data))))
+
+    file_name = str(tmp_path / "result.xlsx")
+    template.render_to(data, file_name, mode=mode)
+    assert _dump_workbook(load_workbook(file_name)) == valid_result
+
+    f = NonSeekableFile()
+    template.render_to(data, f, mode=mode)
+    assert _dump_workbook(load_workbook(io.BytesIO(f.data))) == valid_result
+
+    chunks = list(template.render_iter(data, mode=mode, chunk_size=1024))
+    assert len(chunks) > 1
+    result = b"".join(chunks)
+    assert _dump_workbook(load_workbook(io.BytesIO(result))) == valid_result
+
+
+def test_render_iter_errors(get_template):
+    def simple_call():
+        raise ValueError("Error in context")
+
+    template = Template(get_template("test_variables.xlsx"))
+    data = data_generators.generate_for_test_variables()
+    data["simple_call"] = simple_call
+    with pytest.raises(ValueError, match="Error in context"):
+        list(template.render_iter(data))
+
+    template = Template(get_template("loop_with_formulas.xlsx"))
+    chunks = template.render_iter(
+        data_generators.generate_for_loop_with_formulas(), chunk_size=16
+    )
+    assert next(chunks)
+    chunks.close()
+
+
+def _render_dump(template, data):
+    return _dump_workbook(load_workbook(io.BytesIO(template.render(data))))
+
+
+@pytest.mark.parametrize("template_name,data_generator", TEMPLATES_DATA)
+def test_template_cache(
+    get_template, tmp_path, monkeypatch, template_name, data_generator
+):
+    source = get_template(template_name).read()
+    valid_result = _render_dump(Template(source), data_generator())
+
+    cache = FileSystemTemplateCache(str(tmp_path))
+    env = Environment(template_cache=cache)
+    template = Template(source, env=env)
+    assert template.root_node is not None
+    assert _render_dump(template, data_generator()) == valid_result
+
+    with monkeypatch.context() as m:
+        m.setattr("xlsx_template.template.Parser", None)
+        template = Template(source, env=env)
+    assert template.root_node is None
+    assert _render_dump(template, data_generator()) == valid_result
+
+
+def test_template_cache_invalidation(get_template, tmp_path, monkeypatch):
+    source = get_template("test_simple_loop.xlsx").read()
+    cache = FileSystemTemplateCache(str(tmp_path))
+    env = Environment(template_cache=cache)
+    Template(source, env=env)
+    options = sorted(env.get_compile_options().items())
+    key = cache.get_key(source, options)
+    assert cache.load(key) is not None
+
+    with open(cache.get_file_name(key), "r+b") as f:
+        f.seek(-10, os.SEEK_END)
+        f.truncate()
+    assert cache.load(key) is None
+    assert not os.path.exists(cache.get_file_name(key))
+    assert Template(source, env=env).root_node is not None
+    assert cache.load(key) is not None
+
+    monkeypatch.setattr("xlsx_template.__version__", "0.0.0")
+    assert cache.get_key(source, options) != key
+    assert Template(source, env=env).root_node is not None
+
+    cache.clear()
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_template_cache_default_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.gettempdir", lambda: str(tmp_path))
+    directory = str(tmp_path / "xlsx_template-cache-{}".format(os.getuid()))
+    cache = FileSystemTemplateCache()
+    assert cache.directory == directory
+    assert stat.S_IMODE(os.lstat(directory).st_mode) == 0o700
+
+    # Permissions of an own directory are restricted again
+    os.chmod(directory, 0o777)
+    FileSystemTemplateCache()
+    assert stat.S_IMODE(os.lstat(directory).st_mode) == 0o700
+
+    # Directories of other users and links are never used
+    other_uid = os.getuid() + 1
+    monkeypatch.setattr("os.getuid", lambda: other_uid)
+    other_directory = str(tmp_path / "xlsx_template-cache-{}".format(os.getuid()))
+    os.mkdir(str(tmp_path / "target"))
+    os.symlink(str(tmp_path / "target"), other_directory)
+    with pytest.raises(RuntimeError):
+        FileSystemTemplateCache()
+    os.remove(other_directory)
+    os.rename(directory, other_directory)
+    with pytest.raises(RuntimeError):
+        FileSystemTemplateCache()
+
+
+def test_static_cells(monkeypatch):
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "Title"
+    ws.merge_cells("A1:C1")
+    ws["A2"] = "{{ item }}"
+    ws["A2"].comment = Comment("Loop-down, for item in items, last_cell=C4", "")
+    ws["B2"] = "Label"
+    ws["B3"] = "{{ 'Unclosed"
+    ws["C2"] = "Static"
+    ws["C2"].comment = Comment("Group, last_cell=C4", "")
+    ws.merge_cells("C2:C3")
+    ws["A5"] = "Footer"
+    buf = io.BytesIO()
+    wb.save(buf)
+    source = buf.getvalue()
+    data = {"items": [1, 2, 3]}
+
+    template = Template(source, debug=True)
+    assert "add_static_cells(STATIC_CELLS_" in template.code_source
+    assert "cg.StaticCellGroup(STATIC_LAYOUT_" in template.code_source
+    result = _render_dump(template, data)
+
+    monkeypatch.setattr("xlsx_template.code_generator.get_static_cell", lambda n: None)
+    monkeypatch.setattr(
+        "xlsx_template.code_generator.is_static_cell_group", lambda n: False
+    )
+    template = Template(source, debug=True)
+    assert "STATIC" not in template.code_source
+    assert _render_dump(template, data) == result
+    ws = load_workbook(io.BytesIO(template.render(data))).active
+    assert [ws.cell(row, 2).value for row in range(2, 11)] == [
+        "Label",
+        "{{ 'Unclosed",
+        None,
+    ] * 3
+    assert ws["A11"].value == "Footer"
+
+
+def test_static_group_with_remove():
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "Title"
+    ws["A1"].comment = Comment("Group, last_cell=B2", "")
+    ws["B1"] = "Removed"
+    ws["B1"].comment = Comment("Remove, last_cell=B1", "")
+    ws["A2"] = "Label"
+    ws["B2"] = 1
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    template = Template(buf.getvalue(), debug=True)
+    assert "cg.StaticCellGroup(STATIC_LAYOUT_" in template.code_source
+    ws = load_workbook(io.BytesIO(template.render({}))).active
+    assert [[cell.value for cell in row] for row in ws.iter_rows()] == [
+        ["Title", None],
+        ["Label", 1],
+    ]
+
+
+@pytest.mark.parametrize("mode", ["default", "stream", "native"])
+def test_scattered_func_arg(mode):
+    wb = Workbook()
+    ws = wb.active
+    ws["A2"] = "{{ item.name }}"
+    ws["A2"].comment = Comment("Loop-down, for item in items, last_cell=C2", "")
+    ws["B2"] = "{{ item.count }}"
+    ws["B2"].comment = Comment("If, condition=item.count", "")
+    ws["C2"] = "{{ item.price }}"
+    ws["E3"] = "=SUM(C2)"
+    buf = io.BytesIO()
+    wb.save(buf)
+
+    template = Template(buf.getvalue())
+    items = [
+        {"name": "a", "count": 1, "price": 2},
+        {"name": "b", "count": None, "price": 3},
+        {"name": "c", "count": 4, "price": 5},
+    ]
+    ws = load_workbook(io.BytesIO(template.render({"items": items}, mode=mode))).active
+    # Prices are shifted left in rows without a count. There are as many of
+    # them as cells in C2:C4, but they are not a range
+    assert [ws.cell(row, 3).value for row in range(2, 5)] == [2, None, 5]
+    assert ws["B3"].value == 3
+    assert ws["E5"].value == "=SUM(C2,B3,C4)"
+
+
+class Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+@pytest.mark.parametrize("strict_get_attr", [False, True])
+def test_inline_access(strict_get_attr):
+    wb = Workbook()
+    wb.active["A1"] = "{{ obj.values[0].name }}"
+    wb.active["A2"] = "{{ obj.values[index].name }}"
+    wb.active["A3"] = "{{ obj.values[0]|yes_no('y', 'n') }}"
+    buf = io.BytesIO()
+    wb.save(buf)
+    get_attr_strategy = StrictGetAttrStrategy() if strict_get_attr else None
+    env = Environment(get_attr_strategy=get_attr_strategy)
+    template = Template(buf.getvalue(), env=env, debug=True)
+    # Item access is strict by default, filters are never inlined
+    assert 'ctx.resolve("index"))]' in template.code_source
+    assert ("getattr((ctx_obj" in template.code_source) is strict_get_attr
+    assert template.code_source.count("except Exception:") == 2
+
+    data = {"obj": Obj(values=[Obj(name="first")]), "index": 0}
+    ws = load_workbook(io.BytesIO(template.render(data))).active
+    assert ws["A2"].value == "first"
+    assert ws["A3"].value == "y"
+
+    with pytest.raises(TemplateRuntimeException) as e:
+        template.render({"obj": Obj(values=[]), "index": 1})
+    assert str(e.value) == "Can not get item 0 from obj []"
+    assert isinstance(e.value.orig_exception, IndexError)
+
+    with pytest.raises(TemplateRuntimeException) as e:
+        template.render({"obj": Obj(values=[Obj()]), "index": 0})
+    assert str(e.value).startswith("Can not get attrib name from obj")
+    assert isinstance(e.value.orig_exception, AttributeError)
+
+
+def test_soft_get_attr_accessors():
+    strategy = SoftGetAttrStrategy()
+    assert strategy.get_attr({"a": 1}, "a") == 1
+    assert strategy.get_attr({"a": 2}, "a") == 2
+    assert strategy.get_attr({"keys": 1}, "keys")() == {"keys": 1}.keys()
+    assert strategy.get_attr(Obj(a=1), "a") == 1
+    assert strategy.get_attr({"a": Obj(a=3)}, "a").a == 3
+    assert strategy.item_accessors == {(dict, "a")}
+
+    with pytest.raises(TemplateRuntimeException) as e:
+        strategy.get_attr({}, "a")
+    assert isinstance(e.value.orig_exception, AttributeError)
+
+
+def test_hoisted_names(monkeypatch):
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "{{ item|default_if_none(title) }}"
+    ws["A1"].comment = Comment("Loop-down, for item in items", "")
+    ws["A2"] = "{{ missing }}"
+    ws["A2"].comment = Comment("If, condition=show", "")
+    ws["A3"] = "{{ title|unknown }}"
+    ws["A3"].comment = Comment("If, condition=show_unknown", "")
+    buf = io.BytesIO()
+    wb.save(buf)
+    template = Template(buf.getvalue(), debug=True)
+    assert template.code_source.count('resolve_or_missing("title")') == 1
+    assert template.code_source.count('env.filters.get("default_if_none")') == 1
+
+    resolved = []
+    context = {"items": [None, 2, None], "title": "T", "show": False}
+    monkeypatch.setattr(
+        Environment,
+        "resolve",
+        lambda self, obj, name, found: resolved.append(name) or obj,
+    )
+    ws = load_workbook(io.BytesIO(template.render(context))).active
+    assert [ws.cell(row, 1).value for row in range(1, 4)] == ["T", 2, "T"]
+    assert sorted(resolved) == sorted(
+        ["items", "title", "show", "missing", "show_unknown"]
+    )
+
+    # Errors are raised only where a missing name or filter is used
+    monkeypatch.undo()
+    context = {"items": [], "title": "T", "show": False, "show_unknown": False}
+    template.render(context)
+    with pytest.raises(Unresolved, match="missing"):
+        template.render(dict(context, show=True))
+    with pytest.raises(KeyError):
+        template.render(dict(context, show_unknown=True))
+
+
+def _optimizer_template():
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "{{ item.customer.address.city }}"
+    ws["A1"].comment = Comment("Loop-down, for item in items, last_cell=D1", "")
+    ws["B1"] = "{{ item.customer.address.zip }}"
+    ws["C1"] = "{{ report.currency }}"
+    ws["D1"] = "{{ report.rates[item.currency] }}"
+    ws["D1"].comment = Comment("If, condition=item.currency", "")
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize(
+    "get_attr_strategy", [SoftGetAttrStrategy(), StrictGetAttrStrategy()]
+)
+def test_optimizer(get_attr_strategy):
+    from types import SimpleNamespace
+
+    source = _optimizer_template()
+    template = Template(
+        source, env=Environment(get_attr_strategy=get_attr_strategy), debug=True
+    )
+    not_optimized = Template(
+        source,
+        env=Environment(get_attr_strategy=get_attr_strategy, optimize=False),
+        debug=True,
+    )
+    assert "opt" not in not_optimized.code_source
+    # Invariant chains are evaluated once before the loop, the shared prefix
+    # and the repeated item.currency once per iteration
+    before, after = template.code_source.split("for item_0 in loop_0:")
+    assert len(re.findall(r"opt\d+ = [^M]", before)) == 2
+    assert len(re.findall(r"opt\d+ = [^M]", after)) == 2
+
+    def make_item(city, currency):
+        address = SimpleNamespace(city=city, zip=city.lower())
+        return SimpleNamespace(
+            customer=SimpleNamespace(address=address), currency=currency
+        )
+
+    report = SimpleNamespace(currency="EUR", rates={"USD": 1.5})
+    context = {
+        "items": [make_item("A", "USD"), make_item("B", None)],
+        "report": report,
+    }
+    assert _dump_workbook(
+        load_workbook(io.BytesIO(template.render(context)))
+    ) == _dump_workbook(load_workbook(io.BytesIO(not_optimized.render(context))))
+
+    # Bindings never raise, errors are raised where expressions are used
+    context = {"items": [make_item("A", None)], "report": SimpleNamespace()}
+    with pytest.raises(TemplateRuntimeException):
+        template.render(context)
+    context["report"].currency = "EUR"
+    template.render(context)
+    context["items"][0].currency = "USD"
+    with pytest.raises(TemplateRuntimeException):
+        template.render(context)
+
+
+@pytest.mark.parametrize(
+    "value, streaming",
+    [
+        ("{{ loop.last }}", True),
+        ("{{ loop.revindex }}", False),
+        ("{{ loop.length|default_if_none(0) }}", False),
+        ("{{ func(loop) }}", False),
+    ],
+)
+def test_streaming_loop_context(value, streaming):
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "{{ item.pulled }}"
+    ws["A1"].comment = Comment("Loop-down, for item in items, last_cell=C1", "")
+    ws["B1"] = "{{ loop.index }}"
+    ws["C1"] = value
+    buf = io.BytesIO()
+    wb.save(buf)
+    template = Template(buf.getvalue(), debug=True)
+    assert ("StreamingLoopContext(" in template.code_source) == streaming
+
+    class Item:
+        @property
+        def pulled(self):
+            return len(pulled)
+
+    def items():
+        for _ in range(3):
+            pulled.append(None)
+            yield Item()
+
+    pulled = []
+    context = {"items": items(), "func": lambda loop: loop.length}
+    ws = load_workbook(io.BytesIO(template.render(context))).active
+    values = [[ws.cell(row, col).value for col in range(1, 4)] for row in range(1, 4)]
+    if streaming:
+        # Items are pulled one ahead of the rendered one
+        assert values == [[2, 1, False], [3, 2, False], [3, 3, True]]
+    else:
+        assert [row[:2] for row in values] == [[3, 1], [3, 2], [3, 3]]
+
+
+@pytest.mark.parametrize(
+    "cells, streaming",
+    [
+        ({}, True),
+        ({"E1": "=SUM(D2)"}, False),
+        ({"D2": "=B1*C2"}, False),
+        ({"B4": "{{ total }}"}, True),
+        ({"E2": "{{ total }}"}, False),
+    ],
+)
+def test_stream_layout(cells, streaming):
+    wb = Workbook()
+    ws = wb.active
+    ws["A1"] = "Name"
+    ws["B1"] = "Count"
+    ws["C1"] = "Price"
+    ws["D1"] = "Total"
+    ws["A2"] = "{{ item.name }}"
+    ws["A2"].comment = Comment("Loop-down, for item in items, last_cell=D2", "")
+    ws["B2"] = "{{ item.count }}"
+    ws["C2"] = "{{ item.price }}"
+    ws["D2"] = "=B2*C2"
+    ws["B3"] = "=SUM(B2)"
+    ws["D3"] = "=SUM(D2)"
+    for coordinate, value in cells.items():
+        ws[coordinate] = value
+    buf = io.BytesIO()
+    wb.save(buf)
+    source = buf.getvalue()
+    template = Template(source, debug=True)
+    assert ("StreamingSheetCellGroup(" in template.code_source) == streaming
+
+    items = [
+        {"name": "item{}".format(index), "count": index, "price": index % 7}
+        for index in range(100)
+    ]
+    context = {"items": items, "total": 1}
+    not_streamed = Template(source, env=Environment(stream_layout=False), debug=True)
+    assert "StreamingSheetCellGroup(" not in not_streamed.code_source
+    expected = _render_dump(not_streamed, context)
+    wb = load_workbook(io.BytesIO(template.render(context, mode="native")))
+    assert _dump_workbook(wb) == expected
+    assert wb.active["D102"].value == "=SUM(D2:D101)"
+
+    # Cells over the budget are spilled and read back in row order
+    spill_stats = SpillStats()
+    result = template.render(
+        context, mode="stream", cell_budget=50, spill_stats=spill_stats
+    )
+    assert _dump_workbook(load_workbook(io.BytesIO(result))) == expected
+    assert spill_stats.cells > len(items) * 4 - 50
+
+    # Every render counts its own cells
+    other_stats = SpillStats()
+    chunks = template.render_iter(
+        context, mode="stream", cell_budget=1000, spill_stats=other_stats
+    )
+    assert b"".join(chunks)
+    assert other_stats.cells == 0
+    assert spill_stats.cells > len(items) * 4 - 50
+
+
+def test_cell_budget_mode(get_template):
+    template = Template(get_template("test_simple_loop.xlsx"))
+    data = data_generators.generate_for_test_simple_loop()
+    with pytest.raises(ValueError):
+        template.render(data, cell_budget=10)
+    assert template.render(data, mode="stream", cell_budget=10)
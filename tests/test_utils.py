@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from xlsx_template import utils
+
+
+def expand(ranges):
+    return {
+        (row, col)
+        for top, left, bottom, right in ranges
+        for row in range(top, bottom + 1)
+        for col in range(left, right + 1)
+    }
+
+
+def encode(cells):
+    return ",".join(
+        utils.range_int_to_str(*range_) for range_ in utils.cells_to_ranges(cells)
+    )
+
+
+@pytest.mark.parametrize(
+    "cells, expected",
+    [
+        ([], ""),
+        ([(2, 2)], "B2"),
+        ([(2, 2), (3, 2)] + [(row, 2) for row in range(5, 901)], "B2:B3,B5:B900"),
+        ([(1, 1), (1, 2), (1, 3), (1, 5)], "A1:C1,E1"),
+        ([(1, 1), (1, 2), (2, 1), (2, 2)], "A1:B2"),
+        ([(1, 1), (1, 2), (2, 1), (2, 2), (3, 1)], "A1:B2,A3"),
+        ([(1, 1), (1, 3), (2, 1), (2, 3), (4, 1), (4, 3)], "A1:A2,C1:C2,A4,C4"),
+        ([(1, 1), (2, 1), (2, 2), (3, 1), (3, 2)], "A1,A2:B3"),
+    ],
+)
+def test_cells_to_ranges(cells, expected):
+    assert encode(cells) == expected
+
+
+def test_random_cells_to_ranges():
+    rng = random.Random(0)
+    for _ in range(2000):
+        shape = rng.randrange(3)
+        rows = range(1, 1 + (1 if shape == 1 else rng.randrange(1, 12)))
+        cols = range(1, 1 + (1 if shape == 0 else rng.randrange(1, 6)))
+        density = rng.random()
+        cells = sorted(
+            (row, col) for row in rows for col in cols if rng.random() < density
+        )
+        ranges = utils.cells_to_ranges(cells)
+        assert expand(ranges) == set(cells)
+        assert sum(
+            (bottom - top + 1) * (right - left + 1)
+            for top, left, bottom, right in ranges
+        ) == len(cells)
+        assert ranges == sorted(ranges)
@@ -0,0 +1,140 @@
+import datetime
+import decimal
+import io
+
+from openpyxl import load_workbook
+from openpyxl.styles import NamedStyle, Font
+import pytest
+
+from xlsx_template.runtime.cell_groups import Cell, SheetCellGroup, Size
+from xlsx_template.runtime import writers
+
+
+VALUES = [
+    "text",
+    "  leading and trailing spaces  ",
+    "<tag> & 'quotes' \"",
+    "=SUM(A1:A2)",
+    '=IF(A1>0,"<yes>","no")',
+    "#N/A",
+    "",
+    None,
+    True,
+    False,
+    0,
+    -12,
+    3.25,
+    float("nan"),
+    float("inf"),
+    float("-inf"),
+    decimal.Decimal("10.1"),
+    datetime.datetime(2020, 1, 2, 3, 4, 5),
+    datetime.date(2020, 1, 2),
+    datetime.time(12, 30),
+]
+
+
+def _render(mode, sheet_states):
+    style = NamedStyle("style0")
+    style.font = Font(bold=True)
+    writer = writers.get_writer(mode, [style])
+    for sheet_state in sheet_states:
+        sheet = writer.create_sheet("Sheet", sheet_state)
+        cell_group = SheetCellGroup(Size(len(VALUES), 2))
+        for row, value in enumerate(VALUES):
+            cell_group.add_cell(Cell(row, 0, None, value, 20.5, 15))
+            cell_group.add_cell(Cell(row, 1, "style0", value, 20.5, 30))
+        sheet.write_cell_group(cell_group)
+    buf = io.BytesIO()
+    writer.save(buf)
+    return load_workbook(io.BytesIO(buf.getvalue()))
+
+
+@pytest.mark.parametrize("mode", ["stream", "native"])
+def test_cell_values(mode):
+    sheet_states = ["hidden", "visible"]
+    valid_wb = _render("default", sheet_states)
+    wb = _render(mode, sheet_states)
+    assert wb.sheetnames == valid_wb.sheetnames == ["Sheet", "Sheet1"]
+    assert [ws.sheet_state for ws in wb] == sheet_states
+    for ws, valid_ws in zip(wb, valid_wb):
+        for row, valid_row in zip(ws.iter_rows(), valid_ws.iter_rows()):
+            for cell, valid_cell in zip(row, valid_row):
+                assert cell.value == valid_cell.value
+                assert cell.style == valid_cell.style
+                assert cell.number_format == valid_cell.number_format
+                assert cell.font.b == valid_cell.font.b
+        assert ws.column_dimensions["B"].width == valid_ws.column_dimensions["B"].width
+        assert ws.row_dimensions[2].height == valid_ws.row_dimensions[2].height == 20.5
+
+
+def _render_overlapping(mode):
+    style = NamedStyle("style0")
+    style.font = Font(bold=True)
+    writer = writers.get_writer(mode, [style])
+    sheet = writer.create_sheet("Sheet", "visible")
+    cell_group = SheetCellGroup(Size(2, 3))
+    # Cells at the same position in the order of the final layout
+    for row, col, style_name, value in [
+        (0, 0, None, 92),
+        (0, 0, None, None),
+        (0, 1, "style0", "a"),
+        (0, 1, None, None),
+        (0, 2, None, None),
+        (0, 2, "style0", "b"),
+        (1, 0, "style0", "c"),
+        (1, 0, None, "d"),
+        (1, 1, None, None),
+        (1, 1, None, None),
+    ]:
+        cell_group.add_cell(Cell(row, col, style_name, value, None, None))
+    sheet.write_cell_group(cell_group)
+    buf = io.BytesIO()
+    writer.save(buf)
+    ws = load_workbook(io.BytesIO(buf.getvalue())).active
+    return [
+        [(cell.value, cell.style) for cell in row]
+        for row in ws.iter_rows(min_row=1, max_row=2, max_col=3)
+    ]
+
+
+@pytest.mark.parametrize("mode", ["stream", "native"])
+def test_overlapping_cells(mode):
+    valid_cells = _render_overlapping("default")
+    assert valid_cells == [
+        [(92, "Normal"), ("a", "style0"), ("b", "style0")],
+        [("d", "style0"), (None, "Normal"), (None, "Normal")],
+    ]
+    assert _render_overlapping(mode) == valid_cells
+
+
+def _render_merges(mode):
+    writer = writers.get_writer(mode, [])
+    sheet = writer.create_sheet("Sheet", "visible")
+    cell_group = SheetCellGroup(Size(8, 4))
+    cell_group.add_cell(Cell(0, 0, None, "a", None, None))
+    for row, col, rows, cols in [
+        (2, 2, 2, 2),
+        # Inside C3:D4
+        (2, 3, 1, 1),
+        (3, 2, 1, 2),
+        (0, 0, 1, 1),
+        # Contains the earlier A1
+        (0, 0, 1, 2),
+        (5, 0, 1, 1),
+        (6, 0, 2, 3),
+        (7, 1, 1, 2),
+    ]:
+        cell_group.add_merge(row, col, rows, cols)
+    sheet.write_cell_group(cell_group)
+    buf = io.BytesIO()
+    writer.save(buf)
+    ws = load_workbook(io.BytesIO(buf.getvalue())).active
+    return sorted(str(cell_range) for cell_range in ws.merged_cells)
+
+
+@pytest.mark.parametrize("mode", ["stream", "native"])
+def test_overlapping_merges(mode):
+    valid_merges = _render_merges("default")
+    assert valid_merges == ["A1", "A1:B1", "A6", "A7:C8", "C3:D4"]
+    assert _render_merges(mode) == valid_merges
@@ -1 +1,5 @@
+__version__ = "0.1.0"
+
 from .template import Template
+from .environment import Environment
+from .file_system_loader import FileSystemLoader
@@ -1,7 +1,10 @@
+import functools
 import io
+import operator
 from collections import defaultdict
 
-from xlsx_template import nodes
+from xlsx_template import nodes, optimizer
+from xlsx_template.consts import LoopDirection
 
 
 class Symbols:
@@ -30,13 +33,183 @@ class Symbols:
             return name
 
 
+NOT_STATIC = object()
+
+# Loop attributes, which are only available when all items are known, see
+# StreamingLoopContext
+LENGTH_ATTRIBUTES = ("length", "revindex", "revindex0")
+
+
+def get_static_value(node):
+    """
+    Return the value of an expression, which does not depend on the context,
+    or NOT_STATIC.
+    """
+    if node is None:
+        return None
+    if type(node) is nodes.Const:
+        return node.value
+    if type(node) is nodes.Value:
+        values = [get_static_value(child) for child in node.body]
+        if any(value is NOT_STATIC for value in values):
+            return NOT_STATIC
+        return functools.reduce(operator.add, values)
+    return NOT_STATIC
+
+
+def get_static_cell(cell_output):
+    """
+    Return `cg.Cell` and `cg.Merge` arguments of a cell without expressions
+    or None. Merge arguments are None for cells without merge.
+    """
+    if type(cell_output) is not nodes.CellOutput:
+        return None
+    values = [
+        get_static_value(node)
+        for node in (cell_output.value, cell_output.row_height, cell_output.col_width)
+    ]
+    if any(value is NOT_STATIC for value in values):
+        return None
+    value, row_height, col_width = values
+    row, col = cell_output.base_cell
+    merge = None
+    if cell_output.merge:
+        rows = get_static_value(cell_output.merge.rows) or 1
+        cols = get_static_value(cell_output.merge.cols) or 1
+        if rows is NOT_STATIC or cols is NOT_STATIC:
+            return None
+        merge = (row, col, rows, cols)
+    return (row, col, cell_output.style, value, row_height, col_width), merge
+
+
+def iter_nodes(node):
+    yield node
+    for attr_name in node.attributes:
+        value = getattr(node, attr_name)
+        for child in value if isinstance(value, list) else [value]:
+            if isinstance(child, nodes.Node):
+                yield from iter_nodes(child)
+
+
+def is_static_cell_group(cell_group):
+    if type(cell_group) is nodes.Remove:
+        return True
+    if type(cell_group) is not nodes.CellGroup:
+        return False
+    return all(
+        get_static_cell(node) is not None or is_static_cell_group(node)
+        for node in cell_group.body
+    )
+
+
+def iter_cell_outputs(body, row=0, col=0):
+    """
+    Yield cell outputs of a body at `row`, `col` with their positions.
+    """
+    for node in body or ():
+        node_row, node_col = row + node.base_cell[0], col + node.base_cell[1]
+        if isinstance(node, nodes.CellOutput):
+            yield node, node_row, node_col
+            continue
+        yield from iter_cell_outputs(node.body, node_row, node_col)
+        if type(node) is nodes.If:
+            yield from iter_cell_outputs(node.else_block, node_row, node_col)
+
+
+def get_stream_layout(sheet):
+    """
+    Return the loop of a sheet, which can be written row by row, see
+    `StreamingSheetCellGroup`, and positions of header and loop cells, which
+    formulas of the footer refer to, or None.
+    """
+    loops = [node for node in sheet.body if type(node) is nodes.CellLoop]
+    if len(loops) != 1 or loops[0].direction != LoopDirection.DOWN:
+        return None
+    loop = loops[0]
+    if any(
+        type(node) is nodes.CellLoop and node.direction != LoopDirection.DOWN
+        for node in iter_nodes(loop)
+    ):
+        return None
+    top, left = loop.base_cell
+    bottom, right = loop.last_cell
+
+    # Nothing but the loop is in its rows, columns covered by cell groups
+    # have cells, so no column moves
+    header_cols = set()
+    sheet_cols = set()
+    cell_groups = []
+    for node in sheet.body:
+        if isinstance(node, nodes.CellOutput):
+            first_row = last_row = node.base_cell[0]
+            sheet_cols.add(node.base_cell[1])
+            if first_row < top:
+                header_cols.add(node.base_cell[1])
+        else:
+            first_row, last_row = node.base_cell[0], node.last_cell[0]
+            cell_groups.append(node)
+        if node is not loop and first_row <= bottom and last_row >= top:
+            return None
+    for node in cell_groups:
+        cols = range(node.base_cell[1], node.last_cell[1] + 1)
+        if node.base_cell[0] < top:
+            if not header_cols.issuperset(cols):
+                return None
+        elif not sheet_cols.issuperset(cols):
+            return None
+
+    # Formulas of the header and the loop refer to their own cells
+    arg_keys = set()
+    for node, row, col in iter_cell_outputs(sheet.body):
+        if not isinstance(node, nodes.FuncCellOutput):
+            continue
+        for arg in node.args:
+            for arg_row, arg_col in arg.cells:
+                arg_row, arg_col = row + arg_row, col + arg_col
+                if row < top:
+                    if arg_row >= top:
+                        return None
+                elif row <= bottom:
+                    if not (top <= arg_row <= bottom and left <= arg_col <= right):
+                        return None
+                elif arg_row <= bottom:
+                    arg_keys.add((arg_row, arg_col))
+    return loop, sorted(arg_keys)
+
+
 class CodeGenerator:
-    def __init__(self):
+    """
+    With `inline_get_attr` and `inline_get_item` attribute and item access
+    in cell values is compiled to plain getattr and [], which is only valid
+    for the strict strategies, see Environment.get_compile_options.
+    With `optimize` the tree is optimized first, see `optimizer`.
+    With `stream_layout` sheets of a header, a loop and a footer write their
+    rows while the loop runs, see `get_stream_layout`.
+    """
+
+    def __init__(
+        self,
+        inline_get_attr=False,
+        inline_get_item=False,
+        optimize=False,
+        stream_layout=False,
+    ):
+        self.inline_get_attr = inline_get_attr
+        self.inline_get_item = inline_get_item
+        self.optimize = optimize
+        self.stream_layout = stream_layout
+        self.inline = False
         self.indent_count = 0
         self.stream = None
         self.symbols = None
         self.cell_group_level = 0
         self.is_new_line = True
+        self.static_data = None
+        self.layouts = None
+        self.context_names = None
+        self.filter_names = None
+        self.loop_refs = None
+        self.stream_loop = None
 
     def generate(self, root_node):
         self.indent_count = 0
@@ -44,6 +217,13 @@ class CodeGenerator:
         self.symbols = Symbols()
         self.is_new_line = True
         self.cell_group_level = 0
+        self.static_data = []
+        self.layouts = {}
+        self.context_names = {}
+        self.filter_names = {}
+        self.loop_refs = {}
+        if self.optimize:
+            root_node = optimizer.optimize(root_node)
         self.generate_for(root_node)
         return self.stream.getvalue()
 
@@ -72,71 +252,72 @@ class CodeGenerator:
         return getattr(self, method_name)(node)
 
     def generate_for_sheet(self, sheet_node):
-        self.write("sheet = wb.create_sheet(")
+        self.write("sheet = writer.create_sheet(")
         self.generate_for(sheet_node.name)
-        self.write(")")
-        self.newline()
-        self.write("sheet.sheet_state = ")
+        self.write(", ")
         self.generate_for(sheet_node.sheet_state)
+        self.write(")")
         self.newline()
         size = "cg.Size({}, {})".format(
             sheet_node.last_cell[0] + 1, sheet_node.last_cell[1] + 1
         )
-        self.write_line("cell_group_0 = cg.SheetCellGroup({})".format(size))
+        stream_layout = get_stream_layout(sheet_node) if self.stream_layout else None
+        self.stream_loop = None
+        if stream_layout is None:
+            self.write_line("cell_group_0 = cg.SheetCellGroup({})".format(size))
+        else:
+            self.stream_loop, arg_keys = stream_layout
+            self.write_line(
+                "cell_group_0 = cg.StreamingSheetCellGroup({}, sheet, {})".format(
+                    size, self.format_tuple(arg_keys)
+                )
+            )
         self.newline()
-        for child in sheet_node.body:
-            self.generate_for(child)
+        self.generate_for_body(sheet_node.body)
         self.newline()
-        self.write_line("for f_cell in cell_group_0.get_final_cells():")
-        self.indent()
-        self.write_line("cell = sheet.cell(f_cell.row, f_cell.col, f_cell.value)")
-        self.write_line("if f_cell.style is not None:")
-        self.indent()
-        self.write_line("cell.style = f_cell.style")
-        self.unindent()
-        self.write_line("sheet.row_dimensions[f_cell.row].height = f_cell.row_height")
-        self.write_line(
-            "sheet.column_dimensions[utils.col_int_to_str(f_cell.col)].width = f_cell.col_width"
-        )
-        self.unindent()
-        self.write_line("for m in cell_group_0.get_final_merges():")
-        self.indent()
-        self.write_line(
-            "sheet.merge_cells(start_row=m.row, start_column=m.col, end_row=m.row+m.rows-1, end_column=m.col+m.cols-1)"
-        )
-        self.unindent()
+        self.write_line("sheet.write_cell_group(cell_group_0)")
 
     def generate_for_sheetloop(self, sheet_loop):
         loop_ref = self.symbols.declare_ref("loop")
         if sheet_loop.name:
             self.symbols.add_ref("{}_loop".format(sheet_loop.name), loop_ref)
-        self.write("{} = LoopContext(".format(loop_ref))
-        self.generate_for(sheet_loop.items)
-        self.write_line(")")
+        stream = self.start_loop_context(loop_ref, sheet_loop.items)
         target_ref = self.symbols.declare_ref(sheet_loop.target)
         self.write_line("for {} in {}:".format(target_ref, loop_ref))
         self.indent()
         self.generate_for_sheet(sheet_loop.sheet)
         self.unindent()
+        self.end_loop_context(loop_ref, stream)
         self.symbols.undeclare_ref("loop")
         self.symbols.undeclare_ref(sheet_loop.target)
 
     def generate_for_remove(self, remove):
-        size = "cg.Size({}, {})".format(remove.height, remove.width)
-        self.write_line(
-            "cell_group_{} = cg.CellGroup(initial_size={})".format(
-                self.cell_group_level + 1, size
-            )
-        )
+        self.write_static_cell_group(remove)
+
+    def write_static_cell_group(self, cell_group):
         self.write_line(
-            "cell_group_{}.add_cell_group({}, {}, cell_group_{})".format(
+            "cell_group_{}.add_cell_group({}, {}, cg.StaticCellGroup({}))".format(
                 self.cell_group_level,
-                remove.base_cell[0],
-                remove.base_cell[1],
-                self.cell_group_level + 1,
+                cell_group.base_cell[0],
+                cell_group.base_cell[1],
+                self.get_layout(cell_group),
             )
         )
 
+    def write_cell_group_init(self, size, layout):
+        if layout is not None:
+            self.write_line(
+                "cell_group_{} = cg.FixedCellGroup({})".format(
+                    self.cell_group_level, layout
+                )
+            )
+        else:
+            self.write_line(
+                "cell_group_{} = cg.CellGroup(initial_size={})".format(
+                    self.cell_group_level, size
+                )
+            )
+
     def generate_for_if(self, if_d):
         self.cell_group_level += 1
         size = "cg.Size({}, {})".format(if_d.height, if_d.width)
@@ -149,14 +330,12 @@ class CodeGenerator:
         self.generate_for(if_d.condition)
         self.write_line(":")
         self.indent()
-        for node in if_d.body:
-            self.generate_for(node)
+        self.generate_for_body(if_d.body)
         self.unindent()
         if if_d.else_block:
             self.write_line("else:")
             self.indent()
-            for node in if_d.else_block:
-                self.generate_for(node)
+            self.generate_for_body(if_d.else_block)
             self.unindent()
         self.write_line(
             "cell_group_{}.add_cell_group({}, {}, cell_group_{})".format(
@@ -169,15 +348,13 @@ class CodeGenerator:
         self.cell_group_level -= 1
 
     def generate_for_cellgroup(self, cell_group):
+        if is_static_cell_group(cell_group):
+            self.write_static_cell_group(cell_group)
+            return
         self.cell_group_level += 1
         size = "cg.Size({}, {})".format(cell_group.height, cell_group.width)
-        self.write_line(
-            "cell_group_{} = cg.CellGroup(initial_size={})".format(
-                self.cell_group_level, size
-            )
-        )
-        for node in cell_group.body:
-            self.generate_for(node)
+        self.write_cell_group_init(size, self.get_layout(cell_group))
+        self.generate_for_body(cell_group.body)
         self.write_line(
             "cell_group_{}.add_cell_group({}, {}, cell_group_{})".format(
                 self.cell_group_level - 1,
@@ -191,28 +368,38 @@ class CodeGenerator:
     def generate_for_cellloop(self, cell_loop):
         self.cell_group_level += 1
         size = "cg.Size({}, {})".format(cell_loop.height, cell_loop.width)
-        self.write_line(
-            "cell_group_{} = cg.LoopCellGroup(initial_size={}, direction={})".format(
-                self.cell_group_level, size, cell_loop.direction
+        if cell_loop is self.stream_loop:
+            self.write_line(
+                "cell_group_{} = cell_group_{}.start_loop({}, {}, {})".format(
+                    self.cell_group_level,
+                    self.cell_group_level - 1,
+                    cell_loop.base_cell[0],
+                    cell_loop.base_cell[1],
+                    size,
+                )
+            )
+        else:
+            self.write_line(
+                "cell_group_{} = cg.LoopCellGroup("
+                "initial_size={}, direction={})".format(
+                    self.cell_group_level, size, cell_loop.direction
+                )
             )
-        )
         loop_ref = self.symbols.declare_ref("loop")
         if cell_loop.name:
             self.symbols.add_ref("{}_loop".format(cell_loop.name), loop_ref)
-        self.write("{} = LoopContext(".format(loop_ref))
-        self.generate_for(cell_loop.items)
-        self.write_line(")")
+        stream = self.start_loop_context(loop_ref, cell_loop.items)
+        self.write_assigns(cell_loop.hoisted)
         target_ref = self.symbols.declare_ref(cell_loop.target)
         self.write_line("for {} in {}:".format(target_ref, loop_ref))
         self.indent()
         self.cell_group_level += 1
-        self.write_line(
-            "cell_group_{} = cg.CellGroup(initial_size={})".format(
-                self.cell_group_level, size
-            )
+        self.write_cell_group_init(
+            size,
+            self.add_fixed_layout(cell_loop.height, cell_loop.width, cell_loop.body),
         )
-        for node in cell_loop.body:
-            self.generate_for(node)
+        self.write_assigns(cell_loop.bindings)
+        self.generate_for_body(cell_loop.body)
         self.write_line(
             "cell_group_{}.add_cell_group(cell_group_{})".format(
                 self.cell_group_level - 1, self.cell_group_level
@@ -229,9 +416,185 @@ class CodeGenerator:
             )
         )
         self.cell_group_level -= 1
+        self.end_loop_context(loop_ref, stream)
         self.symbols.undeclare_ref("loop")
         self.symbols.undeclare_ref(cell_loop.target)
 
+    def start_loop_context(self, loop_ref, items):
+        """
+        Start the loop context assignment. The rest of the loop is generated
+        into a new stream, because the class of the loop context depends on
+        the attributes of the loop, which are used, see end_loop_context.
+        Return the original stream.
+        """
+        self.write("{} = ".format(loop_ref))
+        stream, self.stream = self.stream, io.StringIO()
+        self.loop_refs[loop_ref] = False
+        self.write("(")
+        self.generate_for(items)
+        self.write_line(")")
+        return stream
+
+    def end_loop_context(self, loop_ref, stream):
+        loop_source, self.stream = self.stream.getvalue(), stream
+        if self.loop_refs.pop(loop_ref):
+            self.stream.write("LoopContext")
+        else:
+            self.stream.write("StreamingLoopContext")
+        self.stream.write(loop_source)
+
+    def write_assigns(self, assigns):
+        # Failed bindings are MISSING, every Ref evaluates its expression
+        # again then, so the error is raised where it is used, if at all
+        for assign in assigns or ():
+            self.write_line("try:")
+            self.indent()
+            self.write("{} = ".format(assign.name))
+            self.inline = True
+            self.generate_for(assign.value)
+            self.inline = False
+            self.newline()
+            self.unindent()
+            self.write_line("except Exception:")
+            self.indent()
+            self.write_line("{} = MISSING".format(assign.name))
+            self.unindent()
+
+    def generate_for_body(self, body):
+        # Runs of cells without expressions are added from prebuilt tuples.
+        # Any other cell ends the run to keep the order of cells and merges,
+        # a streamed loop ends it to add the header before the loop starts.
+        static_cells = []
+        static_merges = []
+        for node in body:
+            static_cell = get_static_cell(node)
+            if static_cell is not None:
+                cell, merge = static_cell
+                static_cells.append(cell)
+                if merge is not None:
+                    static_merges.append(merge)
+                continue
+            if isinstance(node, nodes.CellOutput) or node is self.stream_loop:
+                self.write_static_cells(static_cells, static_merges)
+                static_cells, static_merges = [], []
+            self.generate_for(node)
+        self.write_static_cells(static_cells, static_merges)
+
+    def write_static_cells(self, cells, merges):
+        if not cells:
+            return
+        cells_ref = self.add_static_data("STATIC_CELLS", self.format_tuple(cells))
+        if merges:
+            merges_ref = self.add_static_data(
+                "STATIC_MERGES", self.format_tuple(merges)
+            )
+            self.write_line(
+                "cell_group_{}.add_static_cells({}, {})".format(
+                    self.cell_group_level, cells_ref, merges_ref
+                )
+            )
+        else:
+            self.write_line(
+                "cell_group_{}.add_static_cells({})".format(
+                    self.cell_group_level, cells_ref
+                )
+            )
+
+    def get_layout(self, cell_group):
+        """
+        Return the name of a static or fixed layout of a cell group, whose
+        layout does not depend on the context, or None.
+        """
+        key = id(cell_group)
+        if key not in self.layouts:
+            if is_static_cell_group(cell_group):
+                layout = self.add_static_layout(cell_group)
+            elif type(cell_group) is nodes.CellGroup:
+                layout = self.add_fixed_layout(
+                    cell_group.height, cell_group.width, cell_group.body
+                )
+            else:
+                layout = None
+            self.layouts[key] = layout
+        return self.layouts[key]
+
+    def add_fixed_layout(self, height, width, body):
+        # Cells are always added, whatever their values are, so only nested
+        # cell groups can make the layout depend on the context
+        cells = []
+        cell_groups = []
+        for node in body:
+            if isinstance(node, nodes.CellOutput):
+                cells.append(node.base_cell)
+                continue
+            layout = self.get_layout(node)
+            if layout is None:
+                return None
+            cell_groups.append(
+                "({}, {}, {})".format(node.base_cell[0], node.base_cell[1], layout)
+            )
+        return self.add_static_data(
+            "FIXED_LAYOUT",
+            "cg.FixedLayout(\n"
+            "    cg.Size({}, {}),\n"
+            "    cells={},\n"
+            "    cell_groups={},\n"
+            ")".format(
+                height,
+                width,
+                self.format_tuple(cells, indent=1),
+                self.format_tuple(cell_groups, indent=1, format_item=str),
+            ),
+        )
+
+    def add_static_layout(self, cell_group):
+        cells = []
+        merges = []
+        cell_groups = []
+        # Remove blocks have no body
+        for node in cell_group.body or ():
+            static_cell = get_static_cell(node)
+            if static_cell is not None:
+                cell, merge = static_cell
+                cells.append(cell)
+                if merge is not None:
+                    merges.append(merge)
+            else:
+                cell_groups.append(
+                    "({}, {}, {})".format(
+                        node.base_cell[0], node.base_cell[1], self.get_layout(node)
+                    )
+                )
+        return self.add_static_data(
+            "STATIC_LAYOUT",
+            "cg.StaticLayout(\n"
+            "    cg.Size({}, {}),\n"
+            "    cells={},\n"
+            "    merges={},\n"
+            "    cell_groups={},\n"
+            ")".format(
+                cell_group.height,
+                cell_group.width,
+                self.format_tuple(cells, indent=1),
+                self.format_tuple(merges, indent=1),
+                self.format_tuple(cell_groups, indent=1, format_item=str),
+            ),
+        )
+
+    def format_tuple(self, items, indent=0, format_item=repr):
+        if not items:
+            return "()"
+        prefix = "    " * (indent + 1)
+        lines = ["("]
+        lines.extend("{}{},".format(prefix, format_item(item)) for item in items)
+        lines.append("{})".format("    " * indent))
+        return "\n".join(lines)
+
+    def add_static_data(self, prefix, value):
+        name = "{}_{}".format(prefix, len(self.static_data))
+        self.static_data.append("{} = {}".format(name, value))
+        return name
+
     def generate_for_funccelloutput(self, func_cell_output):
         self.write_line("fargs = [")
         self.indent()
@@ -301,11 +664,29 @@ class CodeGenerator:
         self.write_line(")")
 
     def generate_for_getattr(self, get_attr):
-        self.write("env.get_attr(")
-        self.generate_for(get_attr.obj)
+        if self.inline and self.inline_get_attr:
+            self.write("getattr(")
+        else:
+            self.write("env.get_attr(")
+        ref = None
+        if type(get_attr.obj) is nodes.Var:
+            ref = self.symbols.find_ref(get_attr.obj.name)
+        if ref in self.loop_refs:
+            # Other attributes of the loop are available without its length
+            if get_attr.attr_name in LENGTH_ATTRIBUTES:
+                self.loop_refs[ref] = True
+            self.write(ref)
+        else:
+            self.generate_for(get_attr.obj)
         self.write(', "{}")'.format(get_attr.attr_name))
 
     def generate_for_getitem(self, get_item):
+        if self.inline and self.inline_get_item:
+            self.generate_for(get_item.obj)
+            self.write("[")
+            self.generate_for(get_item.key)
+            self.write("]")
+            return
         self.write("env.get_item(")
         self.generate_for(get_item.obj)
         self.write(", ")
@@ -320,12 +701,17 @@ class CodeGenerator:
         self.write("col_width = ")
         self.generate_for(cell_output.col_width)
         self.newline()
+        inline = cell_output.value and self.can_inline(cell_output.value)
+        if inline:
+            self.write_inline_value(cell_output.value)
         self.write(
             "cell = cg.Cell({}, {}, {}, ".format(
                 cell_output.base_cell[0], cell_output.base_cell[1], style
             )
         )
-        if cell_output.value:
+        if inline:
+            self.write("value")
+        elif cell_output.value:
             self.generate_for(cell_output.value)
         else:
             self.write("None")
@@ -335,6 +721,36 @@ class CodeGenerator:
         if cell_output.merge:
             self.generate_for_merge(cell_output)
 
+    def can_inline(self, node):
+        # Expressions are evaluated again through the strategies when the
+        # inline version fails, so calls and filters are never inlined
+        can_inline = False
+        for child in iter_nodes(node):
+            if isinstance(child, (nodes.Call, nodes.Filter)):
+                return False
+            if isinstance(child, nodes.GetAttr) and self.inline_get_attr:
+                can_inline = True
+            elif isinstance(child, nodes.GetItem) and self.inline_get_item:
+                can_inline = True
+        return can_inline
+
+    def write_inline_value(self, node):
+        # The fallback raises the same exception, as the strategies would
+        self.write_line("try:")
+        self.indent()
+        self.write("value = ")
+        self.inline = True
+        self.generate_for(node)
+        self.inline = False
+        self.newline()
+        self.unindent()
+        self.write_line("except Exception:")
+        self.indent()
+        self.write("value = ")
+        self.generate_for(node)
+        self.newline()
+        self.unindent()
+
     def generate_for_call(self, call_node):
         self.generate_for(call_node.obj)
         self.write("(")
@@ -359,7 +775,12 @@ class CodeGenerator:
         self.write(const.value)
 
     def generate_for_filter(self, filter_):
-        self.write('env.filters["{}"]'.format(filter_.name))
+        # Filters are looked up once in root(), but a missing filter still
+        # raises KeyError where it is used
+        ref = self.filter_names.setdefault(
+            filter_.name, "filter_{}".format(filter_.name)
+        )
+        self.write('({} or env.filters["{}"])'.format(ref, filter_.name))
         self.write("(")
         self.generate_for(filter_.obj)
         self.write(", ")
@@ -372,6 +793,11 @@ class CodeGenerator:
         self.write("{}=".format(kwarg.name))
         self.generate_for(kwarg.value)
 
+    def generate_for_ref(self, ref):
+        self.write("({0} if {0} is not MISSING else ".format(ref.name))
+        self.generate_for(ref.value)
+        self.write(")")
+
     def generate_for_tostr(self, to_str):
         self.write("str(")
         self.generate_for(to_str.value)
@@ -380,41 +806,51 @@ class CodeGenerator:
     def generate_for_var(self, var):
         ref = self.symbols.find_ref(var.name)
         if ref is not None:
+            if ref in self.loop_refs:
+                # The loop may be used in any way
+                self.loop_refs[ref] = True
             res = ref
         else:
-            res = 'ctx.resolve("{}")'.format(var.name)
+            # Context variables are resolved once in root(). Unresolved ones
+            # are resolved again where they are used to raise the error there
+            ref = self.context_names.setdefault(var.name, "ctx_{}".format(var.name))
+            res = '({0} if {0} is not MISSING else ctx.resolve("{1}"))'.format(
+                ref, var.name
+            )
         self.write(res)
 
     def generate_for_template(self, template_node):
-        self.write_line("import io")
         self.write_line("import datetime")
         self.newline()
-        self.write_line("import openpyxl")
-        self.newline()
+        self.write_line("from xlsx_template.runtime import cell_groups as cg, MISSING")
         self.write_line(
-            "from xlsx_template.runtime import cell_groups as cg, LoopContext"
+            "from xlsx_template.runtime import LoopContext, StreamingLoopContext"
         )
         self.write_line(
             "from xlsx_template.consts import LoopDirection, FuncArgDirection"
         )
-        self.write_line("from xlsx_template import utils")
         self.newline()
         self.newline()
-        self.write_line("def root(context, styles, env):")
+        self.write_line("def root(context, writer, env):")
         self.indent()
         self.write_line("ctx = context")
-        self.write_line("wb = openpyxl.Workbook()")
-        self.write_line("del wb['Sheet']")
-        self.write_line("for style in styles:")
-        self.indent()
-        self.write_line("wb.add_named_style(style)")
-        self.unindent()
-        self.newline()
+        stream = self.stream
+        self.stream = io.StringIO()
         for child_node in template_node.body:
             self.generate_for(child_node)
             self.newline()
-        self.write_line("buf = io.BytesIO()")
-        self.write_line("wb.save(buf)")
-        self.write_line("return buf.getvalue()")
+        body, self.stream = self.stream.getvalue(), stream
+        for name, ref in self.context_names.items():
+            self.write_line('{} = ctx.resolve_or_missing("{}")'.format(ref, name))
+        for name, ref in self.filter_names.items():
+            self.write_line('{} = env.filters.get("{}")'.format(ref, name))
+        self.newline()
+        self.stream.write(body)
         self.unindent()
         self.write_line("")
+        if self.static_data:
+            # Cells and cell groups without expressions, see generate_for_body
+            self.newline()
+            for data in self.static_data:
+                self.write_line(data)
+                self.newline()
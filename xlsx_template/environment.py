@@ -1,5 +1,8 @@
-from .exceptions import TemplateRuntimeException
+import time
+
+from .exceptions import TemplateRuntimeException, Unresolved
 from . import filters
+from . import utils
 from .parser import Parser
 
 
@@ -21,19 +24,46 @@ class StrictGetAttrStrategy:
 
 
 class SoftGetAttrStrategy:
+    def __init__(self):
+        # (type, attr_name) pairs, for which getattr always fails, so items
+        # are got directly without raising AttributeError first
+        self.item_accessors = set()
+
     def get_attr(self, obj, attr_name):
+        if (type(obj), attr_name) in self.item_accessors:
+            try:
+                return obj[attr_name]
+            except Exception:
+                pass
         exc = None
         try:
             return getattr(obj, attr_name)
         except AttributeError as e:
             exc = e
         try:
-            return obj[attr_name]
+            value = obj[attr_name]
         except Exception as e:
             exc = exc or e
             raise TemplateRuntimeException(
                 "Can not get attrib {} from obj {}".format(attr_name, obj), exc
             )
+        if not has_instance_attrs(type(obj), attr_name):
+            self.item_accessors.add((type(obj), attr_name))
+        return value
+
+
+def has_instance_attrs(cls, attr_name):
+    """
+    Return False if getattr fails for every instance of `cls`: the class has
+    no such attribute, its instances have no __dict__ and attribute lookup
+    is not customized in Python code.
+    """
+    return (
+        hasattr(cls, attr_name)
+        or hasattr(cls, "__getattr__")
+        or any("__dict__" in vars(base) for base in cls.__mro__)
+        or type(cls.__getattribute__) is not type(object.__getattribute__)
+    )
 
 
 class StrictGetItemStrategy:
@@ -51,7 +81,17 @@ class Environment:
     filters = {"default_if_none": filters.default_if_none, "yes_no": filters.yes_no}
 
     def __init__(
-        self, resolve_strategy=None, get_attr_strategy=None, get_item_strategy=None
+        self,
+        resolve_strategy=None,
+        get_attr_strategy=None,
+        get_item_strategy=None,
+        template_cache=None,
+        loader=None,
+        cache_size=400,
+        auto_reload=True,
+        auto_reload_interval=0,
+        optimize=True,
+        stream_layout=True,
     ):
         if resolve_strategy is None:
             resolve_strategy = StrictResolveStrategy()
@@ -65,6 +105,30 @@ class Environment:
         self.resolve_strategy = resolve_strategy
         self.get_attr_strategy = get_attr_strategy
         self.get_item_strategy = get_item_strategy
+        self.template_cache = template_cache
+        self.loader = loader
+        self.auto_reload = auto_reload
+        self.auto_reload_interval = auto_reload_interval
+        self.optimize = optimize
+        self.stream_layout = stream_layout
+        self.cache = utils.LRUCache(cache_size)
+        self.reloads = 0
+
+    def get_compile_options(self):
+        """
+        Return options of the code generator, which depend on the strategies.
+        Attribute and item access of the strict strategies is compiled inline.
+        Templates, which call functions with side effects, should be compiled
+        with `optimize=False`, see `optimizer`. With `stream_layout` sheets of
+        a header, a loop down and a footer are written row by row by writers,
+        which support it, see `StreamingSheetCellGroup`.
+        """
+        return {
+            "inline_get_attr": type(self.get_attr_strategy) is StrictGetAttrStrategy,
+            "inline_get_item": type(self.get_item_strategy) is StrictGetItemStrategy,
+            "optimize": self.optimize,
+            "stream_layout": self.stream_layout,
+        }
 
     def resolve(self, obj, name, found):
         return self.resolve_strategy.resolve(obj, name, found)
@@ -74,3 +138,53 @@ class Environment:
 
     def get_item(self, obj, key):
         return self.get_item_strategy.get_item(obj, key)
+
+    def get_template(self, name):
+        """
+        Load a template by name from the loader. Compiled templates are kept
+        in a LRU cache of `cache_size` items. With `auto_reload` the source
+        file is checked for changes, at most once per `auto_reload_interval`
+        seconds for each template.
+        """
+        if self.loader is None:
+            raise TypeError("No loader for this environment specified")
+        entry = self.cache.get(name)
+        if entry is not None:
+            if not self.auto_reload:
+                return entry.template
+            now = time.monotonic()
+            if now - entry.checked_at < self.auto_reload_interval:
+                return entry.template
+            if entry.uptodate():
+                entry.checked_at = now
+                return entry.template
+            self.cache.discard(name)
+            self.reloads += 1
+        return self._load_template(name)
+
+    def _load_template(self, name):
+        from .template import Template
+
+        source, filename, uptodate = self.loader.get_source(name)
+        template = Template(source, env=self)
+        template.name = name
+        template.filename = filename
+        self.cache.set(name, _CacheEntry(template, uptodate, time.monotonic()))
+        return template
+
+    def get_cache_stats(self):
+        return {
+            "size": len(self.cache),
+            "capacity": self.cache.capacity,
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "evictions": self.cache.evictions,
+            "reloads": self.reloads,
+        }
+
+
+class _CacheEntry:
+    def __init__(self, template, uptodate, checked_at):
+        self.template = template
+        self.uptodate = uptodate
+        self.checked_at = checked_at
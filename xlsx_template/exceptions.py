@@ -9,3 +9,13 @@ class TemplateRuntimeException(RuntimeError):
     def __init__(self, msg, orig_exception=None):
         super().__init__(msg)
         self.orig_exception = orig_exception
+
+
+class Unresolved(TemplateRuntimeException):
+    pass
+
+
+class TemplateNotFound(LookupError):
+    def __init__(self, name):
+        super().__init__("Template '{}' not found".format(name))
+        self.name = name
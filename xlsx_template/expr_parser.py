@@ -0,0 +1,248 @@
+"""
+Hand-written parser for expressions, cells and function arguments.
+
+It accepts the same language as the pyparsing grammar in `grammar` and
+builds the same nodes, but is much faster. Whatever it can not parse is
+passed to the pyparsing grammar, which either handles it or raises the
+usual pyparsing exception.
+"""
+
+import re
+
+from . import grammar, nodes, utils
+
+WHITESPACE = " \t\n\r"
+
+REAL_RE = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+)")
+HEX_RE = re.compile(r"0[xX][0-9a-fA-F]+")
+INT_RE = re.compile(r"[0-9]+")
+NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Quoted strings are matched in two steps, like pyparsing does, which does
+# not backtrack into the body when the closing quote is missing
+STRING_BODY_RES = {
+    '"': re.compile(r'"(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*'),
+    "'": re.compile(r"'(?:[^'\n\r\\]|(?:'')|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*"),
+}
+PUNCTUATION = ".[]()=,|"
+BOOLEANS = {"true": True, "True": True, "false": False, "False": False}
+
+UPPERCASE = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+DIGITS = frozenset("0123456789")
+
+# Token types
+REAL, HEX, INT, STRING, NAME, PUNCT, END = range(7)
+
+
+class NotHandled(Exception):
+    pass
+
+
+def tokenize(s):
+    tokens = []
+    pos = 0
+    length = len(s)
+    while True:
+        while pos < length and s[pos] in WHITESPACE:
+            pos += 1
+        if pos == length:
+            tokens.append((END, None))
+            return tokens
+        char = s[pos]
+        if char in STRING_BODY_RES:
+            match = STRING_BODY_RES[char].match(s, pos)
+            end = match.end()
+            if end == length or s[end] != char:
+                raise NotHandled()
+            tokens.append((STRING, s[pos : end + 1]))
+            pos = end + 1
+            continue
+        match = REAL_RE.match(s, pos)
+        if match is not None:
+            tokens.append((REAL, match.group()))
+            pos = match.end()
+            continue
+        if char in PUNCTUATION:
+            tokens.append((PUNCT, char))
+            pos += 1
+            continue
+        for token_type, regex in ((HEX, HEX_RE), (INT, INT_RE), (NAME, NAME_RE)):
+            match = regex.match(s, pos)
+            if match is not None:
+                tokens.append((token_type, match.group()))
+                pos = match.end()
+                break
+        else:
+            raise NotHandled()
+
+
+class ExprParser:
+    def __init__(self, s):
+        self.tokens = tokenize(s)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def is_punct(self, char, offset=0):
+        return self.tokens[self.pos + offset] == (PUNCT, char)
+
+    def expect_punct(self, char):
+        if self.next() != (PUNCT, char):
+            raise NotHandled()
+
+    def expect_name(self):
+        token_type, value = self.next()
+        if token_type != NAME:
+            raise NotHandled()
+        return value
+
+    def parse_expr_with_filter(self):
+        obj = self.parse_expr()
+        while self.is_punct("|"):
+            self.pos += 1
+            name = self.expect_name()
+            args = []
+            if self.is_punct("("):
+                args = self.parse_call_args()
+            obj = nodes.Filter(name=name, args=args, obj=obj)
+        if self.next()[0] != END:
+            raise NotHandled()
+        return obj
+
+    def parse_expr(self):
+        token_type, value = self.next()
+        if token_type == REAL:
+            obj = nodes.Const(value=float(value))
+        elif token_type == HEX:
+            obj = nodes.Const(value=int(value[2:], 16))
+        elif token_type == INT:
+            obj = nodes.Const(value=int(value))
+        elif token_type == STRING:
+            obj = nodes.StrConst(value=value)
+        elif token_type == NAME:
+            if value in BOOLEANS:
+                obj = nodes.Const(value=BOOLEANS[value])
+            else:
+                obj = nodes.Var(name=value)
+        else:
+            raise NotHandled()
+        while True:
+            if self.is_punct("."):
+                self.pos += 1
+                obj = nodes.GetAttr(attr_name=self.expect_name(), obj=obj)
+            elif self.is_punct("["):
+                self.pos += 1
+                key = self.parse_expr()
+                self.expect_punct("]")
+                obj = nodes.GetItem(key=key, obj=obj)
+            elif self.is_punct("("):
+                obj = nodes.Call(args=self.parse_call_args(), obj=obj)
+            else:
+                return obj
+
+    def parse_call_args(self):
+        self.expect_punct("(")
+        args = []
+        if self.is_punct(")"):
+            self.pos += 1
+            return args
+        while True:
+            if self.peek()[0] == NAME and self.is_punct("=", 1):
+                name = self.next()[1]
+                self.pos += 1
+                args.append(nodes.Kwarg(name=name, value=self.parse_expr()))
+            else:
+                args.append(nodes.Arg(value=self.parse_expr()))
+            token = self.next()
+            if token == (PUNCT, ")"):
+                return args
+            if token != (PUNCT, ","):
+                raise NotHandled()
+
+
+def _parse_expr_with_filter(s):
+    if "\t" in s:
+        # pyparsing expands tabs before parsing, which changes strings
+        raise NotHandled()
+    return ExprParser(s).parse_expr_with_filter()
+
+
+def parse_expr_with_filter(s):
+    try:
+        return _parse_expr_with_filter(s)
+    except NotHandled:
+        return grammar.parse_expr_with_filter(s)
+
+
+def _match_cell(s, pos):
+    length = len(s)
+    col_end = pos
+    while col_end < length and s[col_end] in UPPERCASE:
+        col_end += 1
+    row_end = col_end
+    while row_end < length and s[row_end] in DIGITS:
+        row_end += 1
+    if col_end == pos or row_end == col_end:
+        return None
+    return row_end, (int(s[col_end:row_end]), utils.col_str_to_int(s[pos:col_end]))
+
+
+def _match_func_args(s, pos):
+    """
+    Match consecutive cells and cell ranges starting at `pos`.
+    """
+    cells = []
+    while True:
+        match = _match_cell(s, pos)
+        if match is None:
+            return pos, cells
+        pos, cell = match
+        cells.append(cell)
+        if pos < len(s) and s[pos] == ":":
+            match = _match_cell(s, pos + 1)
+            if match is not None:
+                pos, cell = match
+                cells.append(cell)
+
+
+def _parse_func_args(s):
+    if any(char in s for char in WHITESPACE):
+        # pyparsing skips whitespace between the parts of cells and ranges
+        raise NotHandled()
+    res = []
+    pos = 0
+    while pos <= len(s):
+        end, cells = _match_func_args(s, pos)
+        if end > pos:
+            res.append(((pos, end), cells))
+            pos = end
+        else:
+            pos += 1
+    return res
+
+
+def parse_func_args(s):
+    try:
+        return _parse_func_args(s)
+    except NotHandled:
+        return grammar.parse_func_args(s)
+
+
+def _parse_cell(s):
+    s = s.strip(WHITESPACE)
+    match = _match_cell(s, 0)
+    if match is None or match[0] != len(s):
+        raise NotHandled()
+    return match[1]
+
+
+def parse_cell(s):
+    try:
+        return _parse_cell(s)
+    except NotHandled:
+        return grammar.cell.parseString(s, True)[0]
@@ -0,0 +1,61 @@
+import os
+
+from .exceptions import TemplateNotFound
+
+
+class FileSystemLoader:
+    """
+    Loads templates from one or more directories. Directories are searched
+    in order, the first file found wins.
+    """
+
+    def __init__(self, searchpath):
+        if isinstance(searchpath, (str, os.PathLike)):
+            searchpath = [searchpath]
+        self.searchpath = [os.fspath(p) for p in searchpath]
+
+    def get_source(self, name):
+        """
+        Return a tuple (source, filename, uptodate), where `uptodate` is a
+        callable returning False once the file was changed on disk.
+        """
+        pieces = split_template_path(name)
+        for searchpath in self.searchpath:
+            filename = os.path.join(searchpath, *pieces)
+            try:
+                with open(filename, "rb") as f:
+                    stat = os.fstat(f.fileno())
+                    source = f.read()
+            except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+
+            def uptodate(filename=filename, signature=signature):
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    return False
+                return (stat.st_mtime_ns, stat.st_size) == signature
+
+            return source, filename, uptodate
+        raise TemplateNotFound(name)
+
+
+def split_template_path(name):
+    """
+    Split a "/" separated template name into path segments, refusing
+    names which point outside of the search path.
+    """
+    pieces = []
+    for piece in name.split("/"):
+        if (
+            os.path.sep in piece
+            or (os.path.altsep and os.path.altsep in piece)
+            or piece == os.path.pardir
+        ):
+            raise TemplateNotFound(name)
+        elif piece and piece != ".":
+            pieces.append(piece)
+    if not pieces:
+        raise TemplateNotFound(name)
+    return pieces
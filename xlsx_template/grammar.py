@@ -5,7 +5,6 @@ from pyparsing import pyparsing_common as ppc
 
 from . import nodes, utils
 
-
 LPAR, RPAR, LBRACK, RBRACK, DOT, EQ, COMMA, COLON = [pp.Suppress(_) for _ in "()[].=,:"]
 
 
@@ -136,7 +135,7 @@ filter_expr = name("name") + pp.Optional(
 
 
 def filter_expr_pa(r):
-    return nodes.Filter(name=r.name, args=r.args)
+    return nodes.Filter(name=r.name, args=list(r.args))
 
 
 filter_expr.setParseAction(filter_expr_pa)
@@ -9,7 +9,10 @@ class NodeMetaclass(type):
             {
                 key: value
                 for key, value in attrs.items()
-                if not key.startswith("_") and key != "attributes"
+                if not key.startswith("_")
+                and key != "attributes"
+                and not callable(value)
+                and not isinstance(value, property)
             }
         )
         attrs["attributes"] = attributes
@@ -25,6 +28,26 @@ class Node(metaclass=NodeMetaclass):
                 raise RuntimeError("Invalid attribute {}".format(attr_name))
             setattr(self, attr_name, value)
 
+    def clone(self):
+        """
+        Return a deep copy of the node. Later passes mutate nodes in place,
+        so a node must not be shared between several places of the tree.
+        """
+        node = self.__class__.__new__(self.__class__)
+        for attr_name in self.attributes:
+            setattr(node, attr_name, _clone_value(getattr(self, attr_name)))
+        return node
+
+
+def _clone_value(value):
+    if isinstance(value, Node):
+        return value.clone()
+    if isinstance(value, list):
+        return [_clone_value(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_clone_value(item) for item in value)
+    return value
+
 
 class Const(Node):
     value = None
@@ -76,6 +99,21 @@ class Filter(BaseObjNode):
     args = None
 
 
+class Ref(Node):
+    """
+    Local bound by the optimizer. `value` is the original expression, which
+    is evaluated when the binding failed.
+    """
+
+    name = None
+    value = None
+
+
+class Assign(Node):
+    name = None
+    value = None
+
+
 class Template(Node):
     body = None
 
@@ -144,6 +182,9 @@ class CellLoop(CellGroup):
     name = None
     body = None
     direction = None
+    # Assign nodes evaluated before the loop and on every iteration
+    hoisted = None
+    bindings = None
 
 
 class SheetLoop(CellGroup):
@@ -0,0 +1,217 @@
+"""
+Optimization of the template tree, which runs before code generation.
+
+Chains of attribute and item access inside a cell loop are bound to
+locals. Chains, which do not depend on the loop, are evaluated once before
+the loop, other chains used more than once are evaluated once at the start
+of every iteration. Bindings never raise: a failed one is MISSING and the
+original expression is evaluated again where it is used, so errors are the
+same. Calls and filters are never bound, but their objects and arguments
+may be, so templates with side-effecting calls should disable the
+optimizer, see `Environment(optimize=False)`.
+"""
+
+from collections import defaultdict
+
+from . import nodes
+
+# Expression nodes, whose children are expressions too
+EXPRESSION_TYPES = (
+    nodes.Const,
+    nodes.Var,
+    nodes.Value,
+    nodes.ToStr,
+    nodes.BaseObjNode,
+    nodes.Arg,
+    nodes.Kwarg,
+    nodes.Ref,
+)
+
+
+def optimize(root_node):
+    """
+    Return an optimized copy of the tree.
+    """
+    root_node = root_node.clone()
+    Optimizer().visit(root_node)
+    return root_node
+
+
+def get_key(node):
+    """
+    Return a hashable key of a chain of attribute and item access, which
+    is equal for equal chains, or None for any other expression.
+    """
+    if type(node) is nodes.Var:
+        return ("Var", node.name)
+    if type(node) in (nodes.Const, nodes.StrConst):
+        return (type(node).__name__, type(node.value), node.value)
+    if type(node) is nodes.GetAttr:
+        obj = get_key(node.obj)
+        return None if obj is None else ("GetAttr", obj, node.attr_name)
+    if type(node) is nodes.GetItem:
+        obj = get_key(node.obj)
+        key = get_key(node.key)
+        return None if obj is None or key is None else ("GetItem", obj, key)
+    return None
+
+
+def get_names(key):
+    if key[0] == "Var":
+        return {key[1]}
+    if key[0] == "GetAttr":
+        return get_names(key[1])
+    if key[0] == "GetItem":
+        return get_names(key[1]) | get_names(key[2])
+    return set()
+
+
+def get_size(key):
+    if key[0] == "GetAttr":
+        return get_size(key[1]) + 1
+    if key[0] == "GetItem":
+        return get_size(key[1]) + get_size(key[2]) + 1
+    return 1
+
+
+def iter_child_attributes(node):
+    for attr_name in node.attributes:
+        value = getattr(node, attr_name)
+        if isinstance(value, (nodes.Node, list)):
+            yield attr_name, value
+
+
+def replace_children(node, func):
+    for attr_name, value in iter_child_attributes(node):
+        if isinstance(value, list):
+            setattr(
+                node,
+                attr_name,
+                [
+                    func(item) if isinstance(item, nodes.Node) else item
+                    for item in value
+                ],
+            )
+        else:
+            setattr(node, attr_name, func(value))
+
+
+class Optimizer:
+    def __init__(self):
+        self.ref_count = 0
+
+    def visit(self, node):
+        # Inner loops are optimized first, so their hoisted bindings may be
+        # hoisted further by outer loops
+        for attr_name, value in iter_child_attributes(node):
+            for child in value if isinstance(value, list) else [value]:
+                if isinstance(child, nodes.Node) and not isinstance(
+                    child, EXPRESSION_TYPES
+                ):
+                    self.visit(child)
+        if isinstance(node, nodes.CellLoop):
+            self.optimize_loop(node)
+
+    def walk_scope(self, node, func):
+        """
+        Replace every expression, which is evaluated on each iteration of the
+        loop, which body contains `node`, with `func(expression)`.
+        """
+        if isinstance(node, nodes.CellLoop):
+            node.items = func(node.items)
+            node.hoisted = [
+                self.walk_scope_item(item, func) for item in node.hoisted or []
+            ]
+            return
+        replace_children(node, lambda child: self.walk_scope_item(child, func))
+
+    def walk_scope_item(self, node, func):
+        if isinstance(node, EXPRESSION_TYPES):
+            return func(node)
+        if isinstance(node, nodes.Assign):
+            node.value = func(node.value)
+            return node
+        self.walk_scope(node, func)
+        return node
+
+    def optimize_loop(self, cell_loop):
+        loop_names = {cell_loop.target, "loop"}
+        if cell_loop.name:
+            loop_names.add("{}_loop".format(cell_loop.name))
+
+        # Every occurrence of a chain with keys of its enclosing chains
+        occurrences = defaultdict(list)
+
+        def collect(node, ancestors=()):
+            key = get_key(node)
+            if key is not None and key[0] in ("GetAttr", "GetItem"):
+                occurrences[key].append(ancestors)
+                ancestors = ancestors + (key,)
+            if not isinstance(node, nodes.Ref):
+                for attr_name, value in iter_child_attributes(node):
+                    for child in value if isinstance(value, list) else [value]:
+                        if isinstance(child, nodes.Node):
+                            collect(child, ancestors)
+            return node
+
+        for node in cell_loop.body:
+            self.walk_scope_item(node, collect)
+
+        # Enclosing chains are decided first. An occurrence inside a bound
+        # chain is evaluated once with it.
+        hoisted = {}
+        bindings = {}
+        for key in sorted(occurrences, key=get_size, reverse=True):
+            # Count evaluations on every iteration
+            evaluations = 0
+            bound_ancestors = set()
+            for ancestors in occurrences[key]:
+                for ancestor in reversed(ancestors):
+                    if ancestor in hoisted or ancestor in bindings:
+                        bound_ancestors.add(ancestor)
+                        break
+                else:
+                    evaluations += 1
+            evaluations += len(bound_ancestors - set(hoisted))
+            if not get_names(key) & loop_names:
+                if evaluations:
+                    hoisted[key] = self.get_ref_name()
+            elif evaluations > 1:
+                bindings[key] = self.get_ref_name()
+
+        if not hoisted and not bindings:
+            cell_loop.hoisted = cell_loop.hoisted or []
+            cell_loop.bindings = cell_loop.bindings or []
+            return
+
+        refs = dict(hoisted)
+        refs.update(bindings)
+        values = {}
+
+        def replace(node):
+            if not isinstance(node, nodes.Ref):
+                replace_children(node, replace)
+            key = get_key(node)
+            if key in refs:
+                values.setdefault(key, node.clone())
+                return nodes.Ref(name=refs[key], value=node)
+            return node
+
+        for node in cell_loop.body:
+            self.walk_scope_item(node, replace)
+
+        def make_assigns(keys):
+            # Shorter chains first, longer ones use their refs
+            return [
+                nodes.Assign(name=refs[key], value=values[key])
+                for key in sorted(keys, key=get_size)
+            ]
+
+        cell_loop.hoisted = (cell_loop.hoisted or []) + make_assigns(hoisted)
+        cell_loop.bindings = (cell_loop.bindings or []) + make_assigns(bindings)
+
+    def get_ref_name(self):
+        # Symbols refs always end with "_<number>", so these never clash
+        name = "opt{}".format(self.ref_count)
+        self.ref_count += 1
+        return name
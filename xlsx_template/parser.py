@@ -1,10 +1,13 @@
+import bisect
 import copy
 import io
+import operator
+from collections import defaultdict
 
 import pyparsing
 from openpyxl import load_workbook, styles
 
-from . import grammar, nodes, utils
+from . import expr_parser, grammar, nodes, utils
 from .consts import LoopDirection, FuncArgDirection
 from .exceptions import ParseError
 
@@ -13,10 +16,15 @@ class Parser:
     def __init__(self, source, filename=None):
         self.wb = load_workbook(io.BytesIO(source))
         self.source_hint = ["filename:{}".format(filename)] if filename else []
+        # Templates repeat the same placeholders many times, so parsed
+        # expressions are cached by their source and cloned on every use
+        self.expression_cache = {}
+        self.expression_cache_hits = 0
 
     def parse(self):
         template = nodes.Template(body=[])
         self.styles = {}
+        self.style_names = {}
         for sheet_name in self.wb.sheetnames:
             self.source_hint.append("sheet:{}".format(sheet_name))
             ws = self.wb[sheet_name]
@@ -29,16 +37,28 @@ class Parser:
                     cr.max_row - cr.min_row + 1,
                     cr.max_col - cr.min_col + 1,
                 )
-            for row in range(1, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
-                    self.source_hint.append(
-                        "cell:{}".format(utils.cell_int_to_str(row, col))
-                    )
-                    node = self.parse_cell(ws, row, col)
-                    self.source_hint.pop()
-                    self.cells[(row, col)] = node
+            self.ws = ws
+            self.max_row, self.max_col = ws.max_row, ws.max_column
+            self.row_heights, self.col_widths = self._get_dimensions(ws)
+            self.explicit_rows = [
+                row for row, height in enumerate(self.row_heights) if height is not None
+            ]
+            self.explicit_cols = [
+                col for col, width in enumerate(self.col_widths) if width is not None
+            ]
+            # Blank cells are only parsed when the layout needs them,
+            # see _get_blank_cells
+            for (row, col), cell in sorted(ws._cells.items()):
+                if cell.value is None and not cell.has_style:
+                    continue
+                self.cells[(row, col)] = self._parse_cell_with_hint(ws, row, col)
             directives = self.get_directives(ws)
             self.directives = self.parse_directives(directives)
+            for row, col in self._get_required_cells():
+                if (row, col) not in self.cells:
+                    self.cells[(row, col)] = self._parse_cell_with_hint(ws, row, col)
+            self._build_position_index()
+            self.consumed = []
             body = self._process_cell_group(1, 1, ws.max_row, ws.max_column)
             self.source_hint.append("sheet name")
             sheet_name_node = self.parse_value(sheet_name)
@@ -46,8 +66,8 @@ class Parser:
             self.source_hint.pop()
             if isinstance(body[0], nodes.SheetLoop):
                 root_node = body[0]
-                root_node.sheet.name=nodes.ToStr(value=sheet_name_node)
-                root_node.sheet.sheet_state=nodes.ToStr(value=sheet_state_node)
+                root_node.sheet.name = nodes.ToStr(value=sheet_name_node)
+                root_node.sheet.sheet_state = nodes.ToStr(value=sheet_state_node)
             else:
                 root_node = nodes.Sheet(
                     name=nodes.ToStr(value=sheet_name_node),
@@ -88,35 +108,222 @@ class Parser:
             template.body.append(root_node)
             del self.post_remove
             del self.original_cell_groups
+            del self.ws
+            del self.consumed
         return template, list(self.styles.values())
 
+    def _parse_cell_with_hint(self, ws, row, col):
+        self.source_hint.append("cell:{}".format(utils.cell_int_to_str(row, col)))
+        node = self.parse_cell(ws, row, col)
+        self.source_hint.pop()
+        return node
+
+    def _get_dimensions(self, ws):
+        """
+        Return row heights and column widths of the sheet as lists indexed
+        by row and column number. A column dimension applies to all columns
+        from its `min` to its `max`.
+        """
+        row_heights = [None] * (ws.max_row + 1)
+        for row, dim in ws.row_dimensions.items():
+            if row <= ws.max_row:
+                row_heights[row] = dim.height
+        col_widths = [None] * (ws.max_column + 1)
+        for key, dim in sorted(
+            ws.column_dimensions.items(), key=lambda item: item[1].min or 0
+        ):
+            min_col = dim.min or utils.col_str_to_int(key)
+            max_col = min(dim.max or min_col, ws.max_column)
+            for col in range(min_col, max_col + 1):
+                col_widths[col] = dim.width or None
+        return row_heights, col_widths
+
+    def _get_required_cells(self):
+        """
+        Blank cells which are referenced by directives, merges or function
+        arguments.
+        """
+        required = set(self.directives)
+        required.update(self.merged_cells)
+        for node in self.cells.values():
+            if isinstance(node, nodes.FuncCellOutput):
+                for arg in node.args:
+                    required.update(arg.cells)
+        return sorted(
+            (row, col)
+            for row, col in required
+            if 1 <= row <= self.max_row and 1 <= col <= self.max_col
+        )
+
+    def _build_position_index(self):
+        positions = defaultdict(list)
+        for row, col in sorted(set(self.cells).union(self.directives)):
+            positions[row].append(col)
+        self.position_rows = sorted(positions)
+        self.position_cols = positions
+
+    def _iter_positions(self, start_row, start_col, end_row, end_col):
+        """
+        Yield positions of parsed cells and directives inside the range in
+        row-major order.
+        """
+        rows = self.position_rows
+        for row_index in range(
+            bisect.bisect_left(rows, start_row), bisect.bisect_right(rows, end_row)
+        ):
+            row = rows[row_index]
+            cols = self.position_cols[row]
+            for col_index in range(
+                bisect.bisect_left(cols, start_col), bisect.bisect_right(cols, end_col)
+            ):
+                yield row, cols[col_index]
+
     def _process_cell_group(self, start_row, start_col, end_row, end_col):
+        self.consumed.append((start_row, start_col, end_row, end_col))
+        items = []
+        # Ranges consumed by child directives, together with the position
+        # which was being processed at that moment
+        consumed = []
+        for row, col in self._iter_positions(start_row, start_col, end_row, end_col):
+            if (row, col) in self.directives and self.directives[(row, col)]:
+                cur_directives = self.directives[(row, col)]
+                cur_directive = cur_directives.pop(0)
+                if isinstance(cur_directive, nodes.SheetLoop):
+                    cur_directive.last_cell = (end_row, end_col)
+                if not cur_directives:
+                    del self.directives[(row, col)]
+                method = getattr(
+                    self,
+                    "_process_{}".format(cur_directive.__class__.__name__.lower()),
+                )
+                consumed_count = len(self.consumed)
+                cur_directive = method(cur_directive)
+                consumed.extend(
+                    ((row, col), cell_range)
+                    for cell_range in self.consumed[consumed_count:]
+                )
+                if cur_directive is not None:
+                    if isinstance(cur_directive, nodes.CellGroup):
+                        self.original_cell_groups[(row, col)] = cur_directive
+                    items.append(((row, col, 0), cur_directive))
+            if (row, col) in self.cells:
+                items.append(((row, col, 1), self.cells.pop((row, col))))
+        cell_positions = [key[:2] for key, node in items if key[2] == 1]
+        for row, col in self._get_blank_cells(
+            start_row, start_col, end_row, end_col, consumed, cell_positions
+        ):
+            items.append(((row, col, 1), self._parse_cell_with_hint(self.ws, row, col)))
+        items.sort(key=operator.itemgetter(0))
         body = []
-        for row in range(start_row, end_row + 1):
-            for col in range(start_col, end_col + 1):
-                if (row, col) in self.directives and self.directives[(row, col)]:
-                    cur_directives = self.directives[(row, col)]
-                    cur_directive = cur_directives.pop(0)
-                    if isinstance(cur_directive, nodes.SheetLoop):
-                        cur_directive.last_cell = (end_row, end_col)
-                    if not cur_directives:
-                        del self.directives[(row, col)]
-                    method = getattr(
-                        self,
-                        "_process_{}".format(cur_directive.__class__.__name__.lower()),
-                    )
-                    cur_directive = method(cur_directive)
-                    if cur_directive is not None:
-                        if isinstance(cur_directive, nodes.CellGroup):
-                            self.original_cell_groups[(row, col)] = cur_directive
-                        cur_directive.adjust(-start_row, -start_col)
-                        body.append(cur_directive)
-                if (row, col) in self.cells:
-                    cell = self.cells.pop((row, col))
-                    cell.adjust(-start_row, -start_col)
-                    body.append(cell)
+        for key, node in items:
+            node.adjust(-start_row, -start_col)
+            body.append(node)
         return body
 
+    def _get_blank_cells(
+        self, start_row, start_col, end_row, end_col, consumed, cell_positions
+    ):
+        """
+        Return positions of blank cells, which must be kept in the body of a
+        cell group.
+
+        Every position of a group, which is not taken by a child group, holds
+        a cell. Most of them are blank and only a few ones matter: a cell
+        keeps its row (column) from collapsing when a child group shrinks,
+        the last row and column define the group size and cells pass row
+        heights and column widths to the output. One blank cell per such
+        row and column is enough.
+        """
+        # Ranges of directives may go beyond the sheet, there are no cells
+        end_row, end_col = min(end_row, self.max_row), min(end_col, self.max_col)
+        consumed = [
+            (
+                position,
+                (
+                    max(min_row, start_row),
+                    max(min_col, start_col),
+                    min(max_row, end_row),
+                    min(max_col, end_col),
+                ),
+            )
+            for position, (min_row, min_col, max_row, max_col) in consumed
+            if min_row <= end_row
+            and max_row >= start_row
+            and min_col <= end_col
+            and max_col >= start_col
+        ]
+        cell_rows = {row for row, col in cell_positions}
+        cell_cols = {col for row, col in cell_positions}
+        rows = set(
+            self.explicit_rows[
+                bisect.bisect_left(self.explicit_rows, start_row) : bisect.bisect_right(
+                    self.explicit_rows, end_row
+                )
+            ]
+        )
+        cols = set(
+            self.explicit_cols[
+                bisect.bisect_left(self.explicit_cols, start_col) : bisect.bisect_right(
+                    self.explicit_cols, end_col
+                )
+            ]
+        )
+        for position, (min_row, min_col, max_row, max_col) in consumed:
+            rows.update(range(min_row, max_row + 1))
+            cols.update(range(min_col, max_col + 1))
+        last_row = max(cell_rows, default=start_row - 1)
+        for row in range(end_row, last_row, -1):
+            if self._find_free_col(row, start_col, end_col, consumed) is not None:
+                rows.add(row)
+                break
+        last_col = max(cell_cols, default=start_col - 1)
+        for col in range(end_col, last_col, -1):
+            if self._find_free_row(col, start_row, end_row, consumed) is not None:
+                cols.add(col)
+                break
+
+        res = set()
+        for row in rows - cell_rows:
+            col = self._find_free_col(row, start_col, end_col, consumed)
+            if col is not None:
+                res.add((row, col))
+                cell_cols.add(col)
+        for col in cols - cell_cols:
+            row = self._find_free_row(col, start_row, end_row, consumed)
+            if row is not None:
+                res.add((row, col))
+        return res
+
+    def _find_free_col(self, row, start_col, end_col, consumed):
+        # A range consumes only the positions, which were not visited before
+        # the directive at `position` was processed
+        ranges = []
+        for position, (min_row, min_col, max_row, max_col) in consumed:
+            if min_row <= row <= max_row and row >= position[0]:
+                if row == position[0]:
+                    min_col = max(min_col, position[1])
+                ranges.append((min_col, max_col))
+        return self._find_free_index(start_col, end_col, ranges)
+
+    def _find_free_row(self, col, start_row, end_row, consumed):
+        ranges = []
+        for position, (min_row, min_col, max_row, max_col) in consumed:
+            if min_col <= col <= max_col:
+                if col >= position[1]:
+                    min_row = max(min_row, position[0])
+                else:
+                    min_row = max(min_row, position[0] + 1)
+                ranges.append((min_row, max_row))
+        return self._find_free_index(start_row, end_row, ranges)
+
+    def _find_free_index(self, start, end, ranges):
+        index = start
+        for range_start, range_end in sorted(ranges):
+            if range_start > index:
+                break
+            index = max(index, range_end + 1)
+        return index if index <= end else None
+
     def _process_cellloop(self, cell_loop):
         cell_loop.body = self._process_cell_group(
             cell_loop.base_cell[0],
@@ -174,7 +381,8 @@ class Parser:
         return self._parse_pp(grammar.parse_remove, directive_def)
 
     def _process_remove(self, remove):
-        for cell in remove.get_cell_range():
+        self.consumed.append(remove.base_cell + remove.last_cell)
+        for cell in list(self._iter_positions(*remove.base_cell, *remove.last_cell)):
             self.directives.pop(cell, None)
             self.cells.pop(cell, None)
         return remove
@@ -269,20 +477,18 @@ class Parser:
 
     def get_directives(self, ws):
         directives = {}
-        for row in range(1, ws.max_row + 1):
-            for col in range(1, ws.max_column + 1):
-                cell = ws.cell(row, col)
-                if cell.comment and cell.comment.text:
-                    lines = [line.strip() for line in cell.comment.text.splitlines()]
-                    lines = [line for line in lines if line]
-                    if lines[0].lower() == "synt-v2":
-                        v2_directives = self.get_directives_synt_v2(lines[1:])
-                        for (row, col), cell_directives in v2_directives.items():
-                            if (row, col) not in directives:
-                                directives[(row, col)] = []
-                            directives[(row, col)].extend(cell_directives)
-                    else:
-                        directives[(row, col)] = lines
+        for (row, col), cell in sorted(ws._cells.items()):
+            if cell.comment and cell.comment.text:
+                lines = [line.strip() for line in cell.comment.text.splitlines()]
+                lines = [line for line in lines if line]
+                if lines[0].lower() == "synt-v2":
+                    v2_directives = self.get_directives_synt_v2(lines[1:])
+                    for (row, col), cell_directives in v2_directives.items():
+                        if (row, col) not in directives:
+                            directives[(row, col)] = []
+                        directives[(row, col)].extend(cell_directives)
+                else:
+                    directives[(row, col)] = lines
         return directives
 
     def get_directives_synt_v2(self, lines):
@@ -291,7 +497,7 @@ class Parser:
         res_directives = {}
         for line in lines:
             if state == 0:
-                current_cell = grammar.cell.parseString(line, True)[0]
+                current_cell = expr_parser.parse_cell(line)
                 state = 1
             else:
                 if all(c == "=" for c in line):
@@ -310,8 +516,24 @@ class Parser:
             raise ParseError(msg, self.source_hint, e)
 
     def parse_expression(self, expr):
-        node = self._parse_pp(grammar.parse_expr_with_filter, expr)
-        return node
+        node = self.expression_cache.get(expr)
+        if node is None:
+            node = self._parse_pp(expr_parser.parse_expr_with_filter, expr)
+            self.expression_cache[expr] = node
+        else:
+            self.expression_cache_hits += 1
+        return node.clone()
+
+    def get_expression_cache_stats(self):
+        misses = len(self.expression_cache)
+        hits = self.expression_cache_hits
+        total = hits + misses
+        return {
+            "size": misses,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
 
     def parse_value(self, value):
         if not isinstance(value, str) or "{{" not in value:
@@ -343,9 +565,11 @@ class Parser:
                     index = start_var_index
             if len(body) != 1:
                 body = [
-                    nodes.ToStr(value=child)
-                    if not isinstance(child, nodes.Const)
-                    else child
+                    (
+                        nodes.ToStr(value=child)
+                        if not isinstance(child, nodes.Const)
+                        else child
+                    )
                     for child in body
                 ]
             return nodes.Value(body=body)
@@ -354,39 +578,12 @@ class Parser:
         cell = ws.cell(row, col)
         style_name = None
         if cell.has_style:
-            style_key = (
-                copy.copy(cell.font),
-                copy.copy(cell.fill),
-                copy.copy(cell.border),
-                copy.copy(cell.alignment),
-                copy.copy(cell.number_format),
-                copy.copy(cell.protection),
-            )
-            if style_key not in self.styles:
-                new_style_name = "style{}".format(len(self.styles))
-                new_style = styles.NamedStyle(new_style_name)
-                new_style.font = style_key[0]
-                new_style.fill = style_key[1]
-                new_style.border = style_key[2]
-                new_style.alignment = style_key[3]
-                new_style.number_format = style_key[4]
-                new_style.protection = style_key[5]
-                self.styles[style_key] = new_style
-                style_name = new_style_name
-            else:
-                style_name = self.styles[style_key].name
-        col_letter = utils.col_int_to_str(col)
-        col_width = ws.column_dimensions[col_letter].width
-        col_index = col
-        while not col_width:
-            col_letter = utils.col_int_to_str(col_index)
-            col_width = ws.column_dimensions[col_letter].width
-            col_index -= 1
+            style_name = self.get_style_name(cell)
         node_kwargs = {
             "base_cell": (row, col),
             "style": style_name,
-            "row_height": nodes.Const(value=ws.row_dimensions[row].height),
-            "col_width": nodes.Const(value=col_width),
+            "row_height": nodes.Const(value=self.row_heights[row]),
+            "col_width": nodes.Const(value=self.col_widths[col]),
         }
         node_class = nodes.CellOutput
         if cell.value:
@@ -407,11 +604,39 @@ class Parser:
         cell_output = node_class(**node_kwargs)
         return cell_output
 
+    def get_style_name(self, cell):
+        # Cells of a workbook share style ids, so style objects are copied
+        # only once for each distinct style id. Different ids with equal
+        # styles still map to the same named style.
+        style_id = tuple(cell._style)
+        style_name = self.style_names.get(style_id)
+        if style_name is None:
+            style_key = (
+                copy.copy(cell.font),
+                copy.copy(cell.fill),
+                copy.copy(cell.border),
+                copy.copy(cell.alignment),
+                copy.copy(cell.number_format),
+                copy.copy(cell.protection),
+            )
+            if style_key not in self.styles:
+                new_style = styles.NamedStyle("style{}".format(len(self.styles)))
+                new_style.font = style_key[0]
+                new_style.fill = style_key[1]
+                new_style.border = style_key[2]
+                new_style.alignment = style_key[3]
+                new_style.number_format = style_key[4]
+                new_style.protection = style_key[5]
+                self.styles[style_key] = new_style
+            style_name = self.styles[style_key].name
+            self.style_names[style_id] = style_name
+        return style_name
+
     def parse_func_args(self, s):
         res = []
-        for (start_index, end_index), cell_def in grammar.parse_func_args(s):
+        for (start_index, end_index), cell_def in expr_parser.parse_func_args(s):
             if len(cell_def) == 1:
-                cells = cell_def
+                cells = list(cell_def)
             else:
                 cells = [
                     (row, col)
@@ -1 +1,2 @@
-from .loop_context import LoopContext
+from .loop_context import LoopContext, StreamingLoopContext
+from .context import MISSING
@@ -6,11 +6,14 @@ from cached_property import cached_property
 
 from .. import utils, consts
 
-
 Size = namedtuple("Size", "height,width")
 
 
 class Cell:
+    # Sheets keep every rendered cell until they are written, slots make
+    # them several times smaller
+    __slots__ = ("row", "col", "value", "style", "row_height", "col_width")
+
     def __init__(self, row, col, style, value, row_height, col_width):
         self.row = row
         self.col = col
@@ -39,6 +42,8 @@ class Cell:
 
 
 class Merge:
+    __slots__ = ("row", "col", "rows", "cols")
+
     def __init__(self, row, col, rows, cols):
         self.row, self.col = row, col
         self.rows, self.cols = rows, cols
@@ -51,35 +56,97 @@ class Merge:
         self.col += col
 
 
+class ArgCells:
+    """
+    Final cells of one template cell in a cell group, which function
+    arguments refer to, with indexes by row and column built on first use.
+    """
+
+    __slots__ = ("cells", "rows", "cols")
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.rows = None
+        self.cols = None
+
+    def in_row(self, row):
+        if self.rows is None:
+            self.rows = defaultdict(list)
+            for cell in self.cells:
+                self.rows[cell.row].append(cell)
+        return self.rows.get(row, ())
+
+    def in_col(self, col):
+        if self.cols is None:
+            self.cols = defaultdict(list)
+            for cell in self.cells:
+                self.cols[cell.col].append(cell)
+        return self.cols.get(col, ())
+
+
 class FuncArg:
+    __slots__ = (
+        "start_index",
+        "end_index",
+        "cells",
+        "final_cells",
+        "direction",
+        "bounds",
+    )
+
     def __init__(self, start_index, end_index, cells, direction=None):
         self.start_index = start_index
         self.end_index = end_index
         self.cells = cells
         self.final_cells = []
         self.direction = direction
+        # Top, left, bottom and right of final cells
+        self.bounds = None
 
-    def finalize_cells(self, current_row, current_col, initial_cell, final_cells):
+    def finalize_cells(self, current_row, current_col, initial_cell, arg_cells):
         self.cells.remove(initial_cell)
-        if self.direction is not None:
-            if self.direction == consts.FuncArgDirection.HORIZONTAL:
-                cells = [
-                    (cell.row, cell.col)
-                    for cell in final_cells
-                    if cell.row == current_row
-                ]
-            elif self.direction == consts.FuncArgDirection.VERTICAL:
-                cells = [
-                    (cell.row, cell.col)
-                    for cell in final_cells
-                    if cell.col == current_col
-                ]
+        if self.direction == consts.FuncArgDirection.HORIZONTAL:
+            cells = arg_cells.in_row(current_row)
+        elif self.direction == consts.FuncArgDirection.VERTICAL:
+            cells = arg_cells.in_col(current_col)
         else:
-            cells = [(cell.row, cell.col) for cell in final_cells]
-        self.final_cells.extend(cells)
+            cells = arg_cells.cells
+        if not cells:
+            return
+        rows = [cell.row for cell in cells]
+        cols = [cell.col for cell in cells]
+        bounds = (min(rows), min(cols), max(rows), max(cols))
+        if self.bounds is not None:
+            bounds = (
+                min(bounds[0], self.bounds[0]),
+                min(bounds[1], self.bounds[1]),
+                max(bounds[2], self.bounds[2]),
+                max(bounds[3], self.bounds[3]),
+            )
+        self.bounds = bounds
+        self.final_cells.extend(zip(rows, cols))
+
+    def is_rectangle(self):
+        """
+        Return True, when final cells fill their bounds.
+        """
+        top, left, bottom, right = self.bounds
+        return len(self.final_cells) == (bottom - top + 1) * (right - left + 1)
 
 
 class FuncCell:
+    __slots__ = (
+        "row",
+        "col",
+        "style",
+        "initial_value",
+        "row_height",
+        "col_width",
+        "default_value",
+        "args",
+        "final_args",
+    )
+
     def __init__(
         self,
         row,
@@ -102,16 +169,13 @@ class FuncCell:
         self.final_args = []
 
     def move(self, row, col):
+        # Arguments are finalized after the cell is moved to its final place
         self.row += row
         self.col += col
-        for arg in self.final_args:
-            arg.final_cells = [
-                (arg_row + row, arg_col + col) for arg_row, arg_col in arg.final_cells
-            ]
 
-    def finalize_arg(self, arg_key, initial_cell, final_cells):
+    def finalize_arg(self, arg_key, initial_cell, arg_cells):
         arg = self.args[arg_key]
-        arg.finalize_cells(self.row, self.col, initial_cell, final_cells)
+        arg.finalize_cells(self.row, self.col, initial_cell, arg_cells)
         if not arg.cells:
             arg = self.args.pop(arg_key)
             self.final_args.append(arg)
@@ -121,21 +185,18 @@ class FuncCell:
         if not self.final_args:
             return self.default_value
         for arg in self.final_args:
-            cells = list(sorted(arg.final_cells))
-            if not cells:
+            if not arg.final_cells:
                 return self.default_value
-            rectangle_cell_count = (cells[-1][0] - cells[0][0] + 1) * (
-                cells[-1][1] - cells[0][1] + 1
-            )
-            if len(cells) > 1 and len(cells) == rectangle_cell_count:
-                start_cell = cells[0]
-                start_cell = utils.cell_int_to_str(start_cell[0], start_cell[1])
-                end_cell = cells[-1]
-                end_cell = utils.cell_int_to_str(end_cell[0], end_cell[1])
-                str_value = "{}:{}".format(start_cell, end_cell)
+            if len(arg.final_cells) > 1 and arg.is_rectangle():
+                top, left, bottom, right = arg.bounds
+                str_value = "{}:{}".format(
+                    utils.cell_int_to_str(top, left),
+                    utils.cell_int_to_str(bottom, right),
+                )
             else:
                 str_value = ",".join(
-                    utils.cell_int_to_str(cell[0], cell[1]) for cell in cells
+                    utils.range_int_to_str(*range_)
+                    for range_ in utils.cells_to_ranges(sorted(set(arg.final_cells)))
                 )
             str_args.append((arg.start_index, arg.end_index, str_value))
         value = self.initial_value
@@ -164,6 +225,12 @@ class CellGroupFinalResult:
 
 
 class BaseCellGroup:
+    """
+    Cell groups compute their final size bottom-up from the sizes of their
+    children without touching cells. Then the root places every cell once
+    at its final position, see `place`.
+    """
+
     def add_cell(self, row, col, cell):  # pragma: no cover
         raise NotImplementedError()
 
@@ -174,11 +241,44 @@ class BaseCellGroup:
     def final_result(self):
         return self.get_final_result()
 
-    def get_final_result(self):  # pragma: no cover
-        raise NotImplementedError()
+    def get_final_result(self):
+        result = CellGroupFinalResult(
+            cells=defaultdict(list),
+            func_cells=defaultdict(list),
+            merges=[],
+            size=self.get_final_size(),
+        )
+        self.place(0, 0, 0, 0, result)
+        return result
+
+    # Cached by `get_final_size`, which is called for every child by every
+    # parent, a plain attribute is cheaper than `cached_property`
+    _final_size = None
+
+    @property
+    def final_size(self):
+        return self.get_final_size()
 
     def get_final_size(self):
-        return self.final_result.size
+        if self._final_size is None:
+            self._final_size = self.calc_final_size()
+        return self._final_size
+
+    def calc_final_size(self):  # pragma: no cover
+        raise NotImplementedError()
+
+    def place(self, origin_row, origin_col, key_row, key_col, result):
+        """
+        Move cells and merges of the group to the final position at
+        `origin_row`, `origin_col` and add them to `result`. Cells are keyed
+        by their position in the template of the root group, the group is at
+        `key_row`, `key_col` there. Return (func cell, key row, key col) of
+        function cells with unresolved arguments.
+
+        A group is placed once, it hands its content over to `result` and
+        drops it, so placed children are freed while the rest is placed.
+        """
+        raise NotImplementedError()  # pragma: no cover
 
     def get_final_cells(self):
         return self.final_result.cells
@@ -189,12 +289,20 @@ class BaseCellGroup:
     def get_final_merges(self):
         return self.final_result.merges
 
-    def calc_last_cell(self, final_cells, final_func_cells):
-        last_cell = (-1, -1)
-        for cells in itertools.chain(final_cells.values(), final_func_cells.values()):
-            for cell in cells:
-                last_cell = (max(last_cell[0], cell.row), max(last_cell[1], cell.col))
-        return last_cell
+
+def find_placed_cells(cells, top, left, bottom, right):
+    """
+    Return cells of a group, which was just placed, from the list `cells` of
+    the result. They are at its end and inside the final rectangle of the
+    group, other cells of the list belong to other groups.
+    """
+    index = len(cells)
+    while index > 0:
+        cell = cells[index - 1]
+        if not (top <= cell.row < bottom and left <= cell.col < right):
+            break
+        index -= 1
+    return cells[index:]
 
 
 class CellGroup(BaseCellGroup):
@@ -204,161 +312,315 @@ class CellGroup(BaseCellGroup):
         self.func_cells = []
         self.cell_groups = {}
         self.merges = []
+        self.final_offsets = None
+        # Last row and column of cells and function cells in the template,
+        # kept as they are added
+        self.last_cell_row = -1
+        self.last_cell_col = -1
 
     def add_merge(self, row, col, rows, cols):
         self.merges.append(Merge(row, col, rows, cols))
 
     def add_cell(self, cell):
         self.cells.append(cell)
+        if cell.row > self.last_cell_row:
+            self.last_cell_row = cell.row
+        if cell.col > self.last_cell_col:
+            self.last_cell_col = cell.col
+
+    def add_static_cells(self, cells, merges=()):
+        """
+        Add cells and merges given as tuples of `Cell` and `Merge` arguments.
+        """
+        self.cells.extend([Cell(*args) for args in cells])
+        self.merges.extend([Merge(*args) for args in merges])
+        if cells:
+            self.last_cell_row = max(self.last_cell_row, max(args[0] for args in cells))
+            self.last_cell_col = max(self.last_cell_col, max(args[1] for args in cells))
 
     def add_func_cell(self, cell):
         self.func_cells.append(cell)
+        if cell.row > self.last_cell_row:
+            self.last_cell_row = cell.row
+        if cell.col > self.last_cell_col:
+            self.last_cell_col = cell.col
 
     def add_cell_group(self, row, col, cell_group):
         self.cell_groups[(row, col)] = cell_group
 
-    def get_final_result(self):
-        row_offsets = [
-            [None] * self.initial_size.width
-            for _ in range(self.initial_size.height + 1)
-        ]
-        col_offsets = [
-            [None] * self.initial_size.height
-            for _ in range(self.initial_size.width + 1)
-        ]
+    def get_offsets(self):
+        """
+        Return accumulated row and column offsets, which move the content of
+        the group to its final position.
+        """
+        if not self.cell_groups:
+            # Only children move cells
+            return (
+                [0] * (self.initial_size.height + 1),
+                [0] * (self.initial_size.width + 1),
+            )
+        # Offsets of a row are set per column and the other way round, only
+        # positions of children and cells are stored
+        row_entries = {}
+        col_entries = {}
         for (row, col), cell_group in self.cell_groups.items():
             final_size = cell_group.get_final_size()
-            if final_size.width > cell_group.initial_size.width:
-                for i in range(cell_group.initial_size.width):
-                    col_offsets[col + i][row] = 0
-                col_offsets[col + 1][row] = (
-                    final_size.width - cell_group.initial_size.width
-                )
+            initial_size = cell_group.initial_size
+            if final_size.width > initial_size.width:
+                for i in range(initial_size.width):
+                    col_entries[(col + i, row)] = 0
+                col_entries[(col + 1, row)] = final_size.width - initial_size.width
             else:
                 for i in range(col, col + final_size.width):
-                    col_offsets[i][row] = max(col_offsets[i][row] or 0, 0)
-                for i in range(
-                    col + final_size.width, col + cell_group.initial_size.width
-                ):
-                    col_offsets[i][row] = -1
-
-            if final_size.height > cell_group.initial_size.height:
-                for i in range(cell_group.initial_size.height):
-                    row_offsets[row + i][col] = 0
-                row_offsets[row + 1][col] = (
-                    final_size.height - cell_group.initial_size.height
-                )
+                    col_entries[(i, row)] = max(col_entries.get((i, row), 0), 0)
+                for i in range(col + final_size.width, col + initial_size.width):
+                    col_entries[(i, row)] = -1
+
+            if final_size.height > initial_size.height:
+                for i in range(initial_size.height):
+                    row_entries[(row + i, col)] = 0
+                row_entries[(row + 1, col)] = final_size.height - initial_size.height
             else:
                 for i in range(row, row + final_size.height):
-                    row_offsets[i][col] = max(row_offsets[i][col] or 0, 0)
-                for i in range(
-                    row + final_size.height, row + cell_group.initial_size.height
-                ):
-                    row_offsets[i][col] = -1
-
-        for cell in itertools.chain(self.cells, self.func_cells):
-            row_offsets[cell.row][cell.col] = max(
-                row_offsets[cell.row][cell.col] or 0, 0
-            )
-            col_offsets[cell.col][cell.row] = max(
-                col_offsets[cell.col][cell.row] or 0, 0
+                    row_entries[(i, col)] = max(row_entries.get((i, col), 0), 0)
+                for i in range(row + final_size.height, row + initial_size.height):
+                    row_entries[(i, col)] = -1
+
+        # A cell only makes the offset of its row and column at least 0
+        cell_rows, cell_cols = self.get_cell_indexes()
+        row_offsets = self.reduce_offsets(
+            row_entries, cell_rows, self.initial_size.height + 1
+        )
+        col_offsets = self.reduce_offsets(
+            col_entries, cell_cols, self.initial_size.width + 1
+        )
+        return row_offsets, col_offsets
+
+    def get_cell_indexes(self):
+        """
+        Return sets of rows and columns, which have cells.
+        """
+        cells = list(itertools.chain(self.cells, self.func_cells))
+        return {cell.row for cell in cells}, {cell.col for cell in cells}
+
+    @staticmethod
+    def reduce_offsets(entries, cell_indexes, count):
+        """
+        Return accumulated offsets of `count` rows or columns. The offset of
+        one is the maximum of its entries and 0 if it has cells, or 0.
+        """
+        offsets = dict.fromkeys(cell_indexes, 0)
+        for (index, _), offset in entries.items():
+            if index not in offsets or offset > offsets[index]:
+                offsets[index] = offset
+        return list(itertools.accumulate(offsets.get(i, 0) for i in range(count)))
+
+    def calc_final_size(self):
+        # Offsets are kept until the group is placed
+        self.final_offsets = row_offsets, col_offsets = self.get_offsets()
+        # Offsets never decrease by more than one per row or column, so the
+        # final order of rows and columns is the initial one and the last
+        # cell row and column stay the last ones
+        last_row, last_col = -1, -1
+        if self.last_cell_row >= 0:
+            last_row = self.last_cell_row + row_offsets[self.last_cell_row]
+            last_col = self.last_cell_col + col_offsets[self.last_cell_col]
+        for (row, col), cell_group in self.cell_groups.items():
+            size = cell_group.get_final_size()
+            if size.height:
+                last_row = max(last_row, row + row_offsets[row] + size.height - 1)
+                last_col = max(last_col, col + col_offsets[col] + size.width - 1)
+        return Size(width=last_col + 1, height=last_row + 1)
+
+    def place(self, origin_row, origin_col, key_row, key_col, result):
+        size = self.get_final_size()
+        row_offsets, col_offsets = self.final_offsets or self.get_offsets()
+        self.final_offsets = None
+        cell_groups, self.cell_groups = self.cell_groups, {}
+        cells, self.cells = self.cells, []
+        func_cells, self.func_cells = self.func_cells, []
+        merges, self.merges = self.merges, []
+        pending = []
+        for (row, col), cell_group in cell_groups.items():
+            pending.extend(
+                cell_group.place(
+                    origin_row + row + row_offsets[row],
+                    origin_col + col + col_offsets[col],
+                    key_row + row,
+                    key_col + col,
+                    result,
+                )
             )
 
-        row_offsets = [
-            [offset for offset in row if offset is not None] for row in row_offsets
-        ]
-        row_offsets = [max(row) if row else 0 for row in row_offsets]
-        row_offsets = list(itertools.accumulate(row_offsets))
-
-        col_offsets = [
-            [offset for offset in col if offset is not None] for col in col_offsets
-        ]
-        col_offsets = [max(col) if col else 0 for col in col_offsets]
-        col_offsets = list(itertools.accumulate(col_offsets))
-
-        final_cells = defaultdict(list)
-        final_func_cells = defaultdict(list)
-        final_merges = []
-
-        for (cg_row, cg_col), cell_group in self.cell_groups.items():
-            for (c_row, c_col), cells in cell_group.get_final_cells().items():
-                for cell in cells:
-                    cell.move(
-                        cg_row + row_offsets[cg_row], cg_col + col_offsets[cg_col]
-                    )
-                    final_cells[(cg_row + c_row, cg_col + c_col)].append(cell)
-            for (c_row, c_col), cells in cell_group.get_final_func_cells().items():
-                for cell in cells:
-                    cell.move(
-                        cg_row + row_offsets[cg_row], cg_col + col_offsets[cg_col]
-                    )
-                    final_func_cells[(cg_row + c_row, cg_col + c_col)].append(cell)
-            for merge in cell_group.get_final_merges():
-                merge.move(cg_row + row_offsets[cg_row], cg_col + col_offsets[cg_col])
-                final_merges.append(merge)
-
-        for cell in self.cells:
+        for cell in cells:
             row, col = cell.row, cell.col
-            cell.move(row_offsets[row], col_offsets[col])
-            final_cells[(row, col)].append(cell)
+            cell.move(origin_row + row_offsets[row], origin_col + col_offsets[col])
+            result.cells[(key_row + row, key_col + col)].append(cell)
 
-        for cell in self.func_cells:
+        for cell in func_cells:
             row, col = cell.row, cell.col
-            cell.move(row_offsets[row], col_offsets[col])
-            final_func_cells[(row, col)].append(cell)
+            cell.move(origin_row + row_offsets[row], origin_col + col_offsets[col])
+            result.func_cells[(key_row + row, key_col + col)].append(cell)
+            if cell.args:
+                pending.append((cell, key_row + row, key_col + col))
 
-        for merge in self.merges:
+        for merge in merges:
             row, col = merge.row, merge.col
-            merge.move(row_offsets[row], col_offsets[col])
-            final_merges.append(merge)
-
-        for (row, col), cells in final_func_cells.items():
-            finalized_args = []
-            for arg_key, arg in cells[0].args.items():
-                for cell in arg.cells:
-                    final_row = row + cell[0]
-                    final_col = col + cell[1]
+            merge.move(origin_row + row_offsets[row], origin_col + col_offsets[col])
+            result.merges.append(merge)
+
+        if not pending:
+            return pending
+        # Arguments, which refer to cells inside of the group, are finalized
+        # with all cells, which its template cell produced
+        bounds = (
+            origin_row,
+            origin_col,
+            origin_row + size.height,
+            origin_col + size.width,
+        )
+        # Many function cells may refer to the same template cell
+        lookups = {}
+        for cell, row, col in pending:
+            for arg_key, arg in list(cell.args.items()):
+                for initial_cell in list(arg.cells):
+                    arg_row = row + initial_cell[0]
+                    arg_col = col + initial_cell[1]
                     if (
-                        final_row >= 0
-                        and final_row < self.initial_size.height
-                        and final_col >= 0
-                        and final_col < self.initial_size.width
+                        0 <= arg_row - key_row < self.initial_size.height
+                        and 0 <= arg_col - key_col < self.initial_size.width
                     ):
-                        finalized_args.append((arg_key, cell))
-            for arg_key, initial_cell in finalized_args:
-                for cell in cells:
-                    final_row = initial_cell[0] + row
-                    final_col = initial_cell[1] + col
-                    cell.finalize_arg(
-                        arg_key,
-                        initial_cell,
-                        itertools.chain(
-                            final_cells.get((final_row, final_col), []),
-                            final_func_cells.get((final_row, final_col), []),
-                        ),
-                    )
+                        arg_cells = lookups.get((arg_row, arg_col))
+                        if arg_cells is None:
+                            arg_cells = lookups[(arg_row, arg_col)] = ArgCells(
+                                find_placed_cells(
+                                    result.cells.get((arg_row, arg_col), []), *bounds
+                                )
+                                + find_placed_cells(
+                                    result.func_cells.get((arg_row, arg_col), []),
+                                    *bounds,
+                                )
+                            )
+                        cell.finalize_arg(arg_key, initial_cell, arg_cells)
+        return [item for item in pending if item[0].args]
+
+
+class FixedLayout:
+    """
+    Layout of a cell group, whose children are only cells and cell groups
+    with fixed layouts, so it does not depend on the context. `cells` are
+    (row, col) positions of its cells and function cells, `cell_groups` are
+    (row, col, layout) tuples, where layout is a `FixedLayout` or a
+    `StaticLayout`. Offsets and the final size are computed on first use.
+    """
+
+    def __init__(self, initial_size, cells=(), cell_groups=()):
+        self.initial_size = initial_size
+        self.cells = cells
+        self.cell_groups = cell_groups
 
-        last_cell = self.calc_last_cell(final_cells, final_func_cells)
+    @cached_property
+    def solution(self):
+        cell_group = CellGroup(self.initial_size)
+        for row, col in self.cells:
+            cell_group.add_cell(Cell(row, col, None, None, None, None))
+        for row, col, layout in self.cell_groups:
+            cell_group.add_cell_group(row, col, SizedCellGroup(layout))
+        row_offsets, col_offsets = cell_group.get_offsets()
+        return row_offsets, col_offsets, cell_group.get_final_size()
 
-        return CellGroupFinalResult(
-            cells=final_cells,
-            size=Size(width=last_cell[1] + 1, height=last_cell[0] + 1),
-            func_cells=final_func_cells,
-            merges=final_merges,
-        )
+    @property
+    def final_size(self):
+        return self.solution[2]
+
+
+class SizedCellGroup(BaseCellGroup):
+    """
+    Stand-in for a cell group with a known layout, which only has the same
+    initial and final size.
+    """
+
+    def __init__(self, layout):
+        self.initial_size = layout.initial_size
+        self.layout = layout
+
+    def calc_final_size(self):
+        return self.layout.final_size
+
+
+class FixedCellGroup(CellGroup):
+    """
+    Cell group with a `FixedLayout`, which skips solving offsets.
+    """
+
+    def __init__(self, layout):
+        super().__init__(layout.initial_size)
+        self.layout = layout
+
+    def get_offsets(self):
+        row_offsets, col_offsets, size = self.layout.solution
+        return row_offsets, col_offsets
+
+    def calc_final_size(self):
+        return self.layout.final_size
 
 
 class SheetCellGroup(CellGroup):
+    def calc_final_size(self):
+        size = super().calc_final_size()
+        return Size(size.height + 1, size.width + 1)
+
     def get_final_result(self):
-        result = super().get_final_result()
-        cells = [cell for _cells in result.cells.values() for cell in _cells]
-        func_cells = [cell for _cells in result.func_cells.values() for cell in _cells]
-        merges = result.merges
+        result = CellGroupFinalResult(
+            cells=defaultdict(list),
+            func_cells=defaultdict(list),
+            merges=[],
+            size=self.get_final_size(),
+        )
+        # Rows and columns of sheets start from 1
+        self.place(1, 1, 0, 0, result)
+        return CellGroupFinalResult(
+            cells=flatten_cells(result),
+            func_cells=[],
+            merges=result.merges,
+            size=result.size,
+        )
 
-        for cell in itertools.chain(cells, func_cells, merges):
-            cell.move(1, 1)
 
-        func_cells = [
+def get_row_cells(cells):
+    """
+    Return a dict of final cells of one row by column. Cells at the same
+    position are written over each other like openpyxl's `sheet.cell` does:
+    a blank value or style of a later cell does not replace an earlier one.
+    """
+    row_cells = {}
+    for cell in cells:
+        col = cell.col
+        prev = row_cells.get(col)
+        if prev is not None:
+            cell = Cell(
+                cell.row,
+                col,
+                prev.style if cell.style is None else cell.style,
+                prev.value if cell.value is None else cell.value,
+                cell.row_height,
+                cell.col_width,
+            )
+        row_cells[col] = cell
+    return row_cells
+
+
+def flatten_cells(result):
+    """
+    Return a list of final cells of a placed result, function cells are
+    replaced with cells of their final values. Lists of the result are
+    dropped as they are copied.
+    """
+    cells = []
+    for key in list(result.cells):
+        cells.extend(result.cells.pop(key))
+    for key in list(result.func_cells):
+        cells.extend(
             Cell(
                 cell.row,
                 cell.col,
@@ -367,15 +629,204 @@ class SheetCellGroup(CellGroup):
                 cell.row_height,
                 cell.col_width,
             )
-            for cell in func_cells
-        ]
+            for cell in result.func_cells.pop(key)
+        )
+    return cells
+
+
+Position = namedtuple("Position", "row,col")
+
 
+class PlacedCellGroup(BaseCellGroup):
+    """
+    Stand-in for a cell group, which is already placed or is placed
+    elsewhere, with its initial and final size.
+    """
+
+    def __init__(self, initial_size, final_size):
+        self.initial_size = initial_size
+        self._final_size = final_size
+
+    def place(self, origin_row, origin_col, key_row, key_col, result):
+        return []
+
+
+class StreamingSheetCellGroup(SheetCellGroup):
+    """
+    Sheet of a header, a single loop down and a footer, whose rows are
+    written to `sheet` while the loop runs, if the sheet writer supports
+    `write_rows`. The header is placed when the loop starts and every
+    iteration when it is added, the footer is placed at the end.
+
+    The code generator only uses it, when the header and iterations do not
+    depend on later rows: nothing but the loop is in its rows, its formulas
+    refer to its own cells and every column covered by a cell group has a
+    cell of the sheet, so columns never move. Function cells of the footer
+    may refer to the header and the loop, positions of cells at `arg_keys`
+    are kept for them.
+    """
+
+    def __init__(self, initial_size, sheet, arg_keys=()):
+        super().__init__(initial_size)
+        self.write_rows = getattr(sheet, "write_rows", None)
+        self.arg_keys = arg_keys
+        self.arg_positions = defaultdict(list)
+        self.written_merges = []
+        self.header_rows = set()
+        self.header_cols = set()
+        self.streaming = False
+
+    def start_loop(self, row, col, initial_size):
+        """
+        Place and write the header, which is everything added so far, and
+        return the cell group of the loop at `row`, `col`.
+        """
+        if self.write_rows is None or (row - 1, col) in self.cell_groups:
+            # The loop overwrites the growth of a group right above it,
+            # when the loop grows too, which is known only at the end
+            return LoopCellGroup(initial_size, consts.LoopDirection.DOWN)
+        self.streaming = True
+        # The header has the offsets of the sheet: columns never move and
+        # rows up to the first one of the loop only depend on the header
+        # and on that the loop has rows, when anything of it is placed
+        header = CellGroup(Size(row + initial_size.height, self.initial_size.width))
+        header.cells, self.cells = self.cells, []
+        header.func_cells, self.func_cells = self.func_cells, []
+        header.merges, self.merges = self.merges, []
+        header.cell_groups = dict(self.cell_groups)
+        header.cell_groups[(row, col)] = PlacedCellGroup(initial_size, initial_size)
+        header.last_cell_row = self.last_cell_row
+        header.last_cell_col = self.last_cell_col
+        # The sheet keeps what its offsets need from the header
+        self.header_rows, self.header_cols = header.get_cell_indexes()
+        self.cell_groups = {
+            key: PlacedCellGroup(cell_group.initial_size, cell_group.get_final_size())
+            for key, cell_group in self.cell_groups.items()
+        }
+        row_offsets, col_offsets = header.get_offsets()
+        result = self.new_result()
+        header.place(1, 1, 0, 0, result)
+        self.flush(result)
+        return StreamingLoopCellGroup(
+            self, initial_size, 1 + row + row_offsets[row], 1 + col, row, col
+        )
+
+    def new_result(self):
+        return CellGroupFinalResult(
+            cells=defaultdict(list), func_cells=defaultdict(list), merges=[], size=None
+        )
+
+    def flush(self, result):
+        """
+        Keep positions of cells at `arg_keys` and write final cells of a
+        placed part of the sheet.
+        """
+        for key in self.arg_keys:
+            for cell in itertools.chain(
+                result.cells.get(key, ()), result.func_cells.get(key, ())
+            ):
+                self.arg_positions[key].append(Position(cell.row, cell.col))
+        self.written_merges.extend(result.merges)
+        self.write_rows(flatten_cells(result))
+
+    def get_cell_indexes(self):
+        cell_rows, cell_cols = super().get_cell_indexes()
+        return cell_rows | self.header_rows, cell_cols | self.header_cols
+
+    def get_final_result(self):
+        if not self.streaming:
+            return super().get_final_result()
+        result = self.new_result()
+        result.size = self.get_final_size()
+        # Positions go first, placed cells of the footer are appended
+        for key, positions in self.arg_positions.items():
+            result.cells[key].extend(positions)
+        self.place(1, 1, 0, 0, result)
+        for key, positions in self.arg_positions.items():
+            del result.cells[key][: len(positions)]
+        self.arg_positions = None
         return CellGroupFinalResult(
-            cells=cells + func_cells,
+            cells=flatten_cells(result),
             func_cells=[],
-            merges=merges,
-            size=Size(result.size.height + 1, result.size.width + 1),
+            merges=self.written_merges + result.merges,
+            size=result.size,
+        )
+
+
+class StaticLayout:
+    """
+    Content of a cell group, which has no expressions: cells and merges as
+    tuples of `Cell` and `Merge` arguments and nested static cell groups as
+    (row, col, layout) tuples. The final layout is computed on first use and
+    shared by all `StaticCellGroup` built from it.
+    """
+
+    def __init__(self, initial_size, cells=(), merges=(), cell_groups=()):
+        self.initial_size = initial_size
+        self.cells = cells
+        self.merges = merges
+        self.cell_groups = cell_groups
+
+    @cached_property
+    def final_result(self):
+        cell_group = CellGroup(self.initial_size)
+        cell_group.add_static_cells(self.cells, self.merges)
+        for row, col, layout in self.cell_groups:
+            cell_group.add_cell_group(row, col, StaticCellGroup(layout))
+        result = cell_group.get_final_result()
+        cells = tuple(
+            (
+                key,
+                tuple(
+                    (
+                        cell.row,
+                        cell.col,
+                        cell.style,
+                        cell.value,
+                        cell.row_height,
+                        cell.col_width,
+                    )
+                    for cell in cells
+                ),
+            )
+            for key, cells in result.cells.items()
         )
+        merges = tuple(
+            (merge.row, merge.col, merge.rows, merge.cols) for merge in result.merges
+        )
+        return result.size, cells, merges
+
+    @property
+    def final_size(self):
+        return self.final_result[0]
+
+
+class StaticCellGroup(BaseCellGroup):
+    """
+    Cell group built from a precomputed `StaticLayout`, which only needs to
+    create fresh cells.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.initial_size = layout.initial_size
+
+    def calc_final_size(self):
+        return self.layout.final_size
+
+    def place(self, origin_row, origin_col, key_row, key_col, result):
+        size, cells, merges = self.layout.final_result
+        for (row, col), _cells in cells:
+            final_cells = result.cells[(key_row + row, key_col + col)]
+            for args in _cells:
+                cell = Cell(*args)
+                cell.move(origin_row, origin_col)
+                final_cells.append(cell)
+        for args in merges:
+            merge = Merge(*args)
+            merge.move(origin_row, origin_col)
+            result.merges.append(merge)
+        return []
 
 
 class LoopCellGroup(BaseCellGroup):
@@ -387,43 +838,82 @@ class LoopCellGroup(BaseCellGroup):
     def add_cell_group(self, cell_group):
         self.cell_groups.append(cell_group)
 
-    def get_final_result(self):
-        row_offsets = [0]
-        col_offsets = [0]
-        if self.direction == consts.LoopDirection.DOWN:
-            for cell_group in self.cell_groups:
-                final_size = cell_group.get_final_size()
-                row_offsets.append(final_size.height)
-            col_offsets = [0] * len(row_offsets)
-        else:
-            for cell_group in self.cell_groups:
-                final_size = cell_group.get_final_size()
-                col_offsets.append(final_size.width)
-            row_offsets = [0] * len(col_offsets)
-
-        row_offsets = list(itertools.accumulate(row_offsets))
-        col_offsets = list(itertools.accumulate(col_offsets))
-        final_cells = defaultdict(list)
-        final_func_cells = defaultdict(list)
-        final_merges = []
-        for index, cell_group in enumerate(self.cell_groups):
-            for (row, col), cells in cell_group.get_final_cells().items():
-                for cell in cells:
-                    cell.move(row_offsets[index], col_offsets[index])
-                    final_cells[(row, col)].append(cell)
-            for (row, col), cells in cell_group.get_final_func_cells().items():
-                for cell in cells:
-                    cell.move(row_offsets[index], col_offsets[index])
-                    final_func_cells[(row, col)].append(cell)
-            for merge in cell_group.get_final_merges():
-                merge.move(row_offsets[index], col_offsets[index])
-                final_merges.append(merge)
-
-        last_cell = self.calc_last_cell(final_cells, final_func_cells)
+    def calc_final_size(self):
+        last_row, last_col = -1, -1
+        offset = 0
+        for cell_group in self.cell_groups:
+            size = cell_group.get_final_size()
+            if self.direction == consts.LoopDirection.DOWN:
+                if size.height:
+                    last_row = max(last_row, offset + size.height - 1)
+                    last_col = max(last_col, size.width - 1)
+                offset += size.height
+            else:
+                if size.height:
+                    last_row = max(last_row, size.height - 1)
+                    last_col = max(last_col, offset + size.width - 1)
+                offset += size.width
+        return Size(width=last_col + 1, height=last_row + 1)
+
+    def place(self, origin_row, origin_col, key_row, key_col, result):
+        # Iterations share the template of the loop, so they have its key.
+        # Each one is dropped as soon as it is placed.
+        cell_groups, self.cell_groups = self.cell_groups, []
+        cell_groups.reverse()
+        pending = []
+        while cell_groups:
+            cell_group = cell_groups.pop()
+            pending.extend(
+                cell_group.place(origin_row, origin_col, key_row, key_col, result)
+            )
+            size = cell_group.get_final_size()
+            if self.direction == consts.LoopDirection.DOWN:
+                origin_row += size.height
+            else:
+                origin_col += size.width
+        return pending
 
-        return CellGroupFinalResult(
-            cells=final_cells,
-            size=Size(width=last_cell[1] + 1, height=last_cell[0] + 1),
-            func_cells=final_func_cells,
-            merges=final_merges,
+
+class StreamingLoopCellGroup(LoopCellGroup):
+    """
+    Loop of a `StreamingSheetCellGroup`, which places and writes every
+    iteration as soon as it is added. The loop is at `key_row`, `key_col`
+    in the template of the sheet and starts at `origin_row`, `origin_col`.
+    """
+
+    def __init__(
+        self, sheet_cell_group, initial_size, origin_row, origin_col, key_row, key_col
+    ):
+        super().__init__(initial_size, consts.LoopDirection.DOWN)
+        self.sheet_cell_group = sheet_cell_group
+        self.origin_row = origin_row
+        self.origin_col = origin_col
+        self.key_row = key_row
+        self.key_col = key_col
+        # Extent of placed iterations, see LoopCellGroup.calc_final_size
+        self.offset = 0
+        self.last_row = -1
+        self.last_col = -1
+
+    def add_cell_group(self, cell_group):
+        size = cell_group.get_final_size()
+        if size.height:
+            self.last_row = self.offset + size.height - 1
+            self.last_col = max(self.last_col, size.width - 1)
+        result = self.sheet_cell_group.new_result()
+        cell_group.place(
+            self.origin_row + self.offset,
+            self.origin_col,
+            self.key_row,
+            self.key_col,
+            result,
         )
+        self.offset += size.height
+        self.sheet_cell_group.flush(result)
+
+    def calc_final_size(self):
+        return Size(width=self.last_col + 1, height=self.last_row + 1)
+
+    def place(self, origin_row, origin_col, key_row, key_col, result):
+        # Iterations are placed as they are added
+        return []
@@ -0,0 +1,113 @@
+"""
+Store of final cells, which are read back in row order and spill to a
+temporary file, when there are more of them than a budget allows.
+"""
+
+import heapq
+import pickle
+import tempfile
+from operator import attrgetter
+
+from .cell_groups import Cell
+
+ROW_ORDER = attrgetter("row", "col")
+# Spilled cells are pickled in chunks of this many cells, runs are read
+# back a chunk at a time
+CHUNK_SIZE = 4096
+
+
+class SpillStats:
+    """
+    Cells, runs and bytes spilled to disk by the cell stores of a render.
+    """
+
+    def __init__(self):
+        self.cells = 0
+        self.runs = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return "SpillStats(cells={}, runs={}, bytes={})".format(
+            self.cells, self.runs, self.bytes
+        )
+
+
+class CellStore:
+    """
+    Keeps at most `budget` cells in memory. When more are added, they are
+    sorted into row order and spilled to a temporary file as a run, runs are
+    merged when cells are read, see `iter_cells`. Without a budget nothing
+    is spilled.
+    """
+
+    def __init__(self, budget=None, stats=None):
+        if budget is not None and budget < 1:
+            raise ValueError("Cell budget must be positive")
+        self.budget = budget
+        self.stats = SpillStats() if stats is None else stats
+        self.cells = []
+        self.file = None
+        # Offsets of pickled chunks of every run
+        self.runs = []
+
+    def extend(self, cells):
+        self.cells.extend(cells)
+        if self.budget is not None and len(self.cells) > self.budget:
+            self.spill()
+
+    def spill(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+        cells, self.cells = sorted(self.cells, key=ROW_ORDER), []
+        f = self.file
+        f.seek(0, 2)
+        start = f.tell()
+        offsets = []
+        for index in range(0, len(cells), CHUNK_SIZE):
+            offsets.append(f.tell())
+            pickle.dump(
+                [
+                    (
+                        cell.row,
+                        cell.col,
+                        cell.style,
+                        cell.value,
+                        cell.row_height,
+                        cell.col_width,
+                    )
+                    for cell in cells[index : index + CHUNK_SIZE]
+                ],
+                f,
+                pickle.HIGHEST_PROTOCOL,
+            )
+        self.runs.append(offsets)
+        self.stats.cells += len(cells)
+        self.stats.runs += 1
+        self.stats.bytes += f.tell() - start
+
+    def iter_run(self, offsets):
+        for offset in offsets:
+            self.file.seek(offset)
+            chunk = pickle.load(self.file)
+            for args in chunk:
+                yield Cell(*args)
+
+    def iter_cells(self):
+        """
+        Yield every cell in row order, cells at the same position in the
+        order they were added, and empty the store.
+        """
+        cells, self.cells = sorted(self.cells, key=ROW_ORDER), []
+        runs, self.runs = self.runs, []
+        if runs:
+            # Earlier runs go first, heapq.merge keeps their order for ties
+            cells = heapq.merge(
+                *[self.iter_run(offsets) for offsets in runs], cells, key=ROW_ORDER
+            )
+        yield from cells
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -1,3 +1,6 @@
+MISSING = object()
+
+
 class Context:
     def __init__(self, context_data, env):
         self.context_data = context_data
@@ -8,3 +11,12 @@ class Context:
             return self.env.resolve(self.context_data[name], name, True)
         else:
             return self.env.resolve(None, name, False)
+
+    def resolve_or_missing(self, name):
+        """
+        Resolve a variable or return MISSING, if it can not be resolved.
+        """
+        try:
+            return self.resolve(name)
+        except Exception:
+            return MISSING
@@ -30,3 +30,38 @@ class LoopContext:
     @property
     def last(self):
         return self.index0 == self.length - 1
+
+
+class StreamingLoopContext:
+    """
+    Loop context, which does not materialize items. It is used when the
+    template does not need the length of the loop, `last` looks one item
+    ahead.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.index0 = -1
+        self.last = False
+
+    def __iter__(self):
+        items = iter(self.items)
+        for item in items:
+            break
+        else:
+            return
+        for next_item in items:
+            self.index0 += 1
+            yield item
+            item = next_item
+        self.index0 += 1
+        self.last = True
+        yield item
+
+    @property
+    def index(self):
+        return self.index0 + 1
+
+    @property
+    def first(self):
+        return self.index0 == 0
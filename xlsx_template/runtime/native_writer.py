@@ -0,0 +1,434 @@
+"""
+Output backend that serializes rendered sheets straight to SpreadsheetML.
+
+Cells are never turned into openpyxl objects: every sheet is written as XML
+into a temporary file while it is rendered, and the zip container is
+assembled on save. openpyxl is only used once per writer to build
+styles.xml from the template named styles.
+"""
+
+import datetime
+import itertools
+import math
+import shutil
+import tempfile
+import zipfile
+from collections import defaultdict
+from copy import copy
+from operator import attrgetter
+from xml.sax.saxutils import escape, quoteattr
+
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.compat.numbers import NUMERIC_TYPES
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import (
+    BUILTIN_FORMATS_MAX_SIZE,
+    BUILTIN_FORMATS_REVERSE,
+    FORMAT_DATE_DATETIME,
+    FORMAT_DATE_TIME6,
+    FORMAT_DATE_TIMEDELTA,
+    FORMAT_DATE_YYYYMMDD2,
+)
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.utils.datetime import to_excel
+from openpyxl.utils.exceptions import IllegalCharacterError
+from openpyxl.workbook.child import INVALID_TITLE_REGEX, avoid_duplicate_name
+from openpyxl.xml.functions import tostring
+
+from .. import utils
+from .cell_groups import get_row_cells
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+SHEET_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+CT_PREFIX = "application/vnd.openxmlformats-officedocument.spreadsheetml."
+
+TIME_FORMATS = {
+    datetime.datetime: FORMAT_DATE_DATETIME,
+    datetime.date: FORMAT_DATE_YYYYMMDD2,
+    datetime.time: FORMAT_DATE_TIME6,
+    datetime.timedelta: FORMAT_DATE_TIMEDELTA,
+}
+
+# Rows are collected into chunks of this size before being written to the
+# temporary sheet file
+ROW_CHUNK_SIZE = 1000
+
+
+def _check_string(value):
+    value = value[:32767]
+    if ILLEGAL_CHARACTERS_RE.search(value):
+        raise IllegalCharacterError("{} cannot be used in worksheets.".format(value))
+    return value
+
+
+def _text_element(value):
+    if value != value.strip():
+        return '<t xml:space="preserve">{}</t>'.format(escape(value))
+    return "<t>{}</t>".format(escape(value))
+
+
+def _format_number(value):
+    # Like openpyxl's safe_string, NaN and infinity are written as no value
+    try:
+        if math.isnan(value) or math.isinf(value):
+            return ""
+        return "%.16g" % value
+    except (OverflowError, ValueError):
+        return ""
+
+
+def _unique_merges(merges):
+    """
+    Return merges without the ones inside an earlier kept merge, like
+    openpyxl's MultiCellRange.add drops them.
+    """
+    kept = []
+    # Kept merges by every row they cover
+    rows = defaultdict(list)
+    for m in merges:
+        bottom = m.row + m.rows - 1
+        right = m.col + m.cols - 1
+        if any(
+            k.col <= m.col
+            and bottom <= k.row + k.rows - 1
+            and right <= k.col + k.cols - 1
+            for k in rows.get(m.row, ())
+        ):
+            continue
+        kept.append(m)
+        for row in range(m.row, bottom + 1):
+            rows[row].append(m)
+    return kept
+
+
+def _merge_ref(m):
+    ref = utils.cell_int_to_str(m.row, m.col)
+    if m.rows == 1 and m.cols == 1:
+        return ref
+    return "{}:{}".format(
+        ref, utils.cell_int_to_str(m.row + m.rows - 1, m.col + m.cols - 1)
+    )
+
+
+class StyleTable:
+    """
+    Maps named styles to cell format (xf) indexes, the same way openpyxl does
+    when `cell.style` is assigned.
+    """
+
+    def __init__(self, styles):
+        self.wb = openpyxl.Workbook()
+        for style in styles:
+            self.wb.add_named_style(style)
+        self.style_ids = {}
+
+    def get_style_id(self, style, number_format=None):
+        key = (style, number_format)
+        style_id = self.style_ids.get(key)
+        if style_id is None:
+            if style is None:
+                style_array = StyleArray()
+            else:
+                style_array = copy(self.wb._named_styles[style].as_tuple())
+            if number_format is not None:
+                if number_format in BUILTIN_FORMATS_REVERSE:
+                    style_array.numFmtId = BUILTIN_FORMATS_REVERSE[number_format]
+                else:
+                    style_array.numFmtId = (
+                        self.wb._number_formats.add(number_format)
+                        + BUILTIN_FORMATS_MAX_SIZE
+                    )
+            style_id = self.wb._cell_styles.add(style_array)
+            self.style_ids[key] = style_id
+        return style_id
+
+    def get_date_style_id(self, style, value_type):
+        # The default writer assigns the named style after the value, so
+        # a styled cell keeps the number format of its named style
+        if style is None:
+            return self.get_style_id(None, TIME_FORMATS[value_type])
+        return self.get_style_id(style)
+
+    def to_xml(self):
+        return tostring(write_stylesheet(self.wb))
+
+
+class SharedStrings:
+    def __init__(self):
+        self.indexes = {}
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        index = self.indexes.get(value)
+        if index is None:
+            index = self.indexes[value] = len(self.indexes)
+        return index
+
+    def to_xml(self):
+        parts = [
+            XML_HEADER,
+            '<sst xmlns="{}" count="{}" uniqueCount="{}">'.format(
+                SHEET_MAIN_NS, self.count, len(self.indexes)
+            ),
+        ]
+        parts.extend("<si>{}</si>".format(_text_element(s)) for s in self.indexes)
+        parts.append("</sst>")
+        return "".join(parts)
+
+
+class NativeSheetWriter:
+    """
+    Rows are written to a temporary file as they come, see `write_rows`,
+    the worksheet parts before and after them are written on save.
+    """
+
+    def __init__(self, writer, name, sheet_state):
+        self.writer = writer
+        self.name = name
+        self.sheet_state = sheet_state
+        self.file = tempfile.TemporaryFile()
+        self.col_widths = {}
+        self.merges = []
+
+    def write_rows(self, cells):
+        """
+        Write final cells of whole rows, which all follow the rows written
+        before.
+        """
+        row_heights = {}
+        col_widths = self.col_widths
+        for f_cell in cells:
+            row_heights[f_cell.row] = f_cell.row_height
+            if f_cell.col_width is not None:
+                col_widths[f_cell.col] = f_cell.col_width
+        cells = sorted(cells, key=attrgetter("row", "col"))
+        write = self.file.write
+        parts = []
+        for row, row_cells in itertools.groupby(cells, key=attrgetter("row")):
+            parts.append(self._row_xml(row, row_heights[row], row_cells))
+            if len(parts) == ROW_CHUNK_SIZE:
+                write("".join(parts).encode())
+                parts = []
+        write("".join(parts).encode())
+
+    def write_cell_group(self, cell_group):
+        self.write_rows(cell_group.get_final_cells())
+        self.merges = _unique_merges(cell_group.get_final_merges())
+
+    def write_to(self, f):
+        f.write(
+            '{}<worksheet xmlns="{}" xmlns:r="{}"><sheetViews>'
+            '<sheetView workbookViewId="0"/></sheetViews>'
+            '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'.format(
+                XML_HEADER, SHEET_MAIN_NS, REL_NS
+            ).encode()
+        )
+        cols = [
+            '<col min="{0}" max="{0}" width="{1}" customWidth="1"/>'.format(col, width)
+            for col, width in sorted(self.col_widths.items())
+        ]
+        if cols:
+            f.write("<cols>{}</cols>".format("".join(cols)).encode())
+        f.write(b"<sheetData>")
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, f)
+        self.file.close()
+        f.write(b"</sheetData>")
+        merges = ['<mergeCell ref="{}"/>'.format(_merge_ref(m)) for m in self.merges]
+        if merges:
+            f.write(
+                '<mergeCells count="{}">{}</mergeCells>'.format(
+                    len(merges), "".join(merges)
+                ).encode()
+            )
+        f.write(
+            b'<pageMargins left="0.75" right="0.75" top="1" bottom="1" '
+            b'header="0.5" footer="0.5"/></worksheet>'
+        )
+
+    def _row_xml(self, row, row_height, row_cells):
+        # Cells at the same position are resolved like openpyxl does
+        row_cells = get_row_cells(row_cells)
+        row_str = str(row)
+        if row_height is None:
+            parts = ['<row r="{}">'.format(row_str)]
+        else:
+            parts = [
+                '<row r="{}" ht="{}" customHeight="1">'.format(row_str, row_height)
+            ]
+        for col, f_cell in row_cells.items():
+            cell_xml = self.writer.cell_xml(
+                self.writer.get_col_letter(col) + row_str, f_cell.value, f_cell.style
+            )
+            if cell_xml is not None:
+                parts.append(cell_xml)
+        parts.append("</row>")
+        return "".join(parts)
+
+
+class NativeWriter:
+    def __init__(self, styles):
+        self.style_table = StyleTable(styles)
+        self.shared_strings = SharedStrings()
+        self.sheets = []
+        self.col_letters = {}
+
+    def create_sheet(self, name, sheet_state):
+        match = INVALID_TITLE_REGEX.search(name)
+        if match:
+            raise ValueError(
+                "Invalid character {} found in sheet title".format(match.group(0))
+            )
+        name = avoid_duplicate_name([sheet.name for sheet in self.sheets], name)
+        sheet = NativeSheetWriter(self, name, sheet_state)
+        self.sheets.append(sheet)
+        return sheet
+
+    def get_col_letter(self, col):
+        letter = self.col_letters.get(col)
+        if letter is None:
+            letter = self.col_letters[col] = utils.col_int_to_str(col)
+        return letter
+
+    def cell_xml(self, ref, value, style):
+        value_type = type(value)
+        if value is None:
+            if style is None:
+                return None
+            return '<c r="{}" s="{}"/>'.format(
+                ref, self.style_table.get_style_id(style)
+            )
+        if style is None:
+            style_attr = ""
+        else:
+            style_attr = ' s="{}"'.format(self.style_table.get_style_id(style))
+        if value_type is bool:
+            return '<c r="{}"{} t="b"><v>{}</v></c>'.format(ref, style_attr, int(value))
+        if value_type in (int, float) or isinstance(value, NUMERIC_TYPES):
+            return '<c r="{}"{} t="n"><v>{}</v></c>'.format(
+                ref, style_attr, _format_number(value)
+            )
+        if isinstance(value, str):
+            value = _check_string(value)
+            if not value:
+                return '<c r="{}"{}/>'.format(ref, style_attr)
+            if len(value) > 1 and value.startswith("="):
+                return '<c r="{}"{}><f>{}</f><v></v></c>'.format(
+                    ref, style_attr, escape(value[1:])
+                )
+            if value in ERROR_CODES:
+                return '<c r="{}"{} t="e"><v>{}</v></c>'.format(ref, style_attr, value)
+            return '<c r="{}"{} t="s"><v>{}</v></c>'.format(
+                ref, style_attr, self.shared_strings.add(value)
+            )
+        for time_type in TIME_FORMATS:
+            if isinstance(value, time_type):
+                if getattr(value, "tzinfo", None) is not None:
+                    raise TypeError(
+                        "Excel does not support timezones in datetimes. "
+                        "The tzinfo in the datetime/time object must be set to None."
+                    )
+                style_id = self.style_table.get_date_style_id(style, time_type)
+                return '<c r="{}" s="{}" t="n"><v>{}</v></c>'.format(
+                    ref, style_id, _format_number(to_excel(value))
+                )
+        raise ValueError("Cannot convert {!r} to Excel".format(value))
+
+    def save(self, fileobj):
+        with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as archive:
+            for index, sheet in enumerate(self.sheets, 1):
+                with archive.open("xl/worksheets/sheet{}.xml".format(index), "w") as f:
+                    sheet.write_to(f)
+            archive.writestr("xl/sharedStrings.xml", self.shared_strings.to_xml())
+            archive.writestr("xl/styles.xml", self.style_table.to_xml())
+            archive.writestr("xl/workbook.xml", self._workbook_xml())
+            archive.writestr("xl/_rels/workbook.xml.rels", self._workbook_rels_xml())
+            archive.writestr("_rels/.rels", self._root_rels_xml())
+            archive.writestr("[Content_Types].xml", self._content_types_xml())
+
+    def _workbook_xml(self):
+        active_tab = next(
+            (
+                index
+                for index, sheet in enumerate(self.sheets)
+                if sheet.sheet_state == "visible"
+            ),
+            0,
+        )
+        sheets = []
+        for index, sheet in enumerate(self.sheets, 1):
+            state = (
+                ""
+                if sheet.sheet_state == "visible"
+                else ' state="{}"'.format(sheet.sheet_state)
+            )
+            sheets.append(
+                '<sheet name={} sheetId="{}"{} r:id="rId{}"/>'.format(
+                    quoteattr(sheet.name), index, state, index
+                )
+            )
+        return (
+            '{}<workbook xmlns="{}" xmlns:r="{}"><bookViews>'
+            '<workbookView activeTab="{}"/></bookViews>'
+            "<sheets>{}</sheets></workbook>".format(
+                XML_HEADER, SHEET_MAIN_NS, REL_NS, active_tab, "".join(sheets)
+            )
+        )
+
+    def _workbook_rels_xml(self):
+        rels = [
+            (
+                "{}/worksheet".format(REL_NS),
+                "worksheets/sheet{}.xml".format(index),
+            )
+            for index in range(1, len(self.sheets) + 1)
+        ]
+        rels.append(("{}/styles".format(REL_NS), "styles.xml"))
+        rels.append(("{}/sharedStrings".format(REL_NS), "sharedStrings.xml"))
+        return '{}<Relationships xmlns="{}">{}</Relationships>'.format(
+            XML_HEADER,
+            PKG_REL_NS,
+            "".join(
+                '<Relationship Id="rId{}" Type="{}" Target="{}"/>'.format(
+                    index, rel_type, target
+                )
+                for index, (rel_type, target) in enumerate(rels, 1)
+            ),
+        )
+
+    def _root_rels_xml(self):
+        return (
+            '{}<Relationships xmlns="{}"><Relationship Id="rId1" '
+            'Type="{}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>".format(XML_HEADER, PKG_REL_NS, REL_NS)
+        )
+
+    def _content_types_xml(self):
+        overrides = [("/xl/workbook.xml", "sheet.main+xml")]
+        overrides.extend(
+            ("/xl/worksheets/sheet{}.xml".format(index), "worksheet+xml")
+            for index in range(1, len(self.sheets) + 1)
+        )
+        overrides.append(("/xl/styles.xml", "styles+xml"))
+        overrides.append(("/xl/sharedStrings.xml", "sharedStrings+xml"))
+        return (
+            '{}<Types xmlns="{}">'
+            '<Default Extension="rels" '
+            'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            "{}</Types>".format(
+                XML_HEADER,
+                CT_NS,
+                "".join(
+                    '<Override PartName="{}" ContentType="{}{}"/>'.format(
+                        part_name, CT_PREFIX, content_type
+                    )
+                    for part_name, content_type in overrides
+                ),
+            )
+        )
@@ -0,0 +1,242 @@
+import itertools
+import queue
+import threading
+from operator import attrgetter
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.cell_range import CellRange
+
+from .. import utils
+from .cell_groups import get_row_cells
+from .cell_store import CellStore, SpillStats
+from .native_writer import NativeWriter
+
+
+class OpenpyxlSheetWriter:
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def write_cell_group(self, cell_group):
+        sheet = self.sheet
+        for f_cell in cell_group.get_final_cells():
+            cell = sheet.cell(f_cell.row, f_cell.col, f_cell.value)
+            if f_cell.style is not None:
+                cell.style = f_cell.style
+            sheet.row_dimensions[f_cell.row].height = f_cell.row_height
+            if f_cell.col_width is not None:
+                sheet.column_dimensions[utils.col_int_to_str(f_cell.col)].width = (
+                    f_cell.col_width
+                )
+        for m in cell_group.get_final_merges():
+            sheet.merge_cells(
+                start_row=m.row,
+                start_column=m.col,
+                end_row=m.row + m.rows - 1,
+                end_column=m.col + m.cols - 1,
+            )
+
+
+class OpenpyxlStreamSheetWriter:
+    """
+    Writes rows through a write-only worksheet, so openpyxl never keeps
+    a Cell object per rendered cell. Write-only worksheets require column
+    dimensions to be set before the first row is appended, so rows written
+    before the sheet is complete, see `write_rows`, are kept in `store`.
+    """
+
+    def __init__(self, sheet, store):
+        self.sheet = sheet
+        self.store = store
+        self.row_heights = {}
+        self.col_widths = {}
+
+    def write_rows(self, cells):
+        # Dimensions are taken from the last cell in final order, exactly as
+        # the default writer does, before cells are sorted into row order
+        row_heights = self.row_heights
+        col_widths = self.col_widths
+        for f_cell in cells:
+            row_heights[f_cell.row] = f_cell.row_height
+            if f_cell.col_width is not None:
+                col_widths[f_cell.col] = f_cell.col_width
+        self.store.extend(cells)
+
+    def write_cell_group(self, cell_group):
+        sheet = self.sheet
+        self.write_rows(cell_group.get_final_cells())
+        row_heights = self.row_heights
+        for col, width in self.col_widths.items():
+            sheet.column_dimensions[utils.col_int_to_str(col)].width = width
+        for m in cell_group.get_final_merges():
+            sheet.merged_cells.add(
+                CellRange(
+                    min_row=m.row,
+                    min_col=m.col,
+                    max_row=m.row + m.rows - 1,
+                    max_col=m.col + m.cols - 1,
+                )
+            )
+        current_row = 1
+        for row, row_cells in itertools.groupby(
+            self.store.iter_cells(), key=attrgetter("row")
+        ):
+            while current_row < row:
+                sheet.append([])
+                current_row += 1
+            sheet.row_dimensions[row].height = row_heights[row]
+            values = {}
+            for col, f_cell in get_row_cells(row_cells).items():
+                if f_cell.style is not None:
+                    value = WriteOnlyCell(sheet, f_cell.value)
+                    value.style = f_cell.style
+                else:
+                    value = f_cell.value
+                values[col] = value
+            sheet.append([values.get(col) for col in range(1, max(values) + 1)])
+            current_row += 1
+
+
+class OpenpyxlWriter:
+    write_only = False
+    sheet_writer_class = OpenpyxlSheetWriter
+
+    def __init__(self, styles):
+        self.wb = openpyxl.Workbook(write_only=self.write_only)
+        if not self.write_only:
+            del self.wb["Sheet"]
+        for style in styles:
+            self.wb.add_named_style(style)
+
+    def create_sheet(self, name, sheet_state):
+        sheet = self.wb.create_sheet(name)
+        sheet.sheet_state = sheet_state
+        return self.sheet_writer_class(sheet)
+
+    def save(self, fileobj):
+        self.wb.save(fileobj)
+
+
+class OpenpyxlStreamWriter(OpenpyxlWriter):
+    """
+    With `cell_budget` at most that many cells of a sheet are kept in memory
+    until it is complete, the rest is spilled to disk, see `CellStore`, and
+    counted in `spill_stats`.
+    """
+
+    write_only = True
+
+    def __init__(self, styles, cell_budget=None, spill_stats=None):
+        super().__init__(styles)
+        self.cell_budget = cell_budget
+        self.spill_stats = SpillStats() if spill_stats is None else spill_stats
+
+    def create_sheet(self, name, sheet_state):
+        sheet = self.wb.create_sheet(name)
+        sheet.sheet_state = sheet_state
+        return OpenpyxlStreamSheetWriter(
+            sheet, CellStore(self.cell_budget, self.spill_stats)
+        )
+
+
+WRITERS = {
+    "default": OpenpyxlWriter,
+    "stream": OpenpyxlStreamWriter,
+    "native": NativeWriter,
+}
+
+
+def get_writer(mode, styles, cell_budget=None, spill_stats=None):
+    if mode not in WRITERS:
+        raise ValueError("Unknown render mode '{}'".format(mode))
+    if cell_budget is None:
+        return WRITERS[mode](styles)
+    if WRITERS[mode] is not OpenpyxlStreamWriter:
+        raise ValueError("Render mode '{}' does not spill cells".format(mode))
+    return WRITERS[mode](styles, cell_budget=cell_budget, spill_stats=spill_stats)
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class ChunkedStream:
+    """
+    Non-seekable file object, which sends written data to a queue in chunks
+    of `chunk_size` bytes.
+    """
+
+    def __init__(self, chunks, chunk_size, cancelled):
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.cancelled = cancelled
+        self.aborted = False
+        self.buf = bytearray()
+
+    def write(self, data):
+        if self.aborted:
+            # Cleanup code (e.g. ZipFile finalizer) may still write after
+            # the render has been aborted
+            return len(data)
+        self.buf += data
+        if len(self.buf) >= self.chunk_size:
+            self._put(bytes(self.buf))
+            self.buf = bytearray()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.buf:
+            self._put(bytes(self.buf))
+            self.buf = bytearray()
+
+    def _put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                self.aborted = True
+                raise RenderCancelled()
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+def iter_chunks(write, chunk_size, max_pending_chunks=16):
+    """
+    Call `write(fileobj)` in a background thread and yield everything it
+    writes as chunks of bytes. Exceptions are re-raised in the consumer.
+    """
+    chunks = queue.Queue(maxsize=max_pending_chunks)
+    cancelled = threading.Event()
+    stream = ChunkedStream(chunks, chunk_size, cancelled)
+    done = object()
+
+    def produce():
+        try:
+            write(stream)
+            stream.close()
+            stream._put(done)
+        except RenderCancelled:
+            pass
+        except BaseException as e:
+            try:
+                stream._put(e)
+            except RenderCancelled:
+                pass
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
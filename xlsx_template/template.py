@@ -1,3 +1,4 @@
+import io
 import tempfile
 import os
 
@@ -5,19 +6,42 @@ from xlsx_template.parser import Parser
 from xlsx_template.code_generator import CodeGenerator
 from xlsx_template.environment import Environment
 from xlsx_template.runtime.context import Context
+from xlsx_template.runtime import writers
 
 
 class Template:
+    name = None
+    filename = None
+
     def __init__(self, source, env=None, debug=False):
         if env is None:
             env = Environment()
         self.env = env
         if hasattr(source, "read"):
             source = source.read()
+        # Debug mode needs the generated source, so it always compiles
+        cache = None if debug else env.template_cache
+        cached = None
+        compile_options = env.get_compile_options()
+        if cache is not None:
+            cache_key = cache.get_key(source, sorted(compile_options.items()))
+            cached = cache.load(cache_key)
+        if cached is not None:
+            self.root_node = None
+            code, self.styles = cached
+        else:
+            code = self._compile(source, compile_options, debug)
+            if cache is not None:
+                cache.dump(cache_key, code, self.styles)
+        self.namespace = {}
+        exec(code, self.namespace)
+
+    def _compile(self, source, compile_options, debug):
         parser = Parser(source)
         self.root_node, self.styles = parser.parse()
-        code_source = CodeGenerator().generate(self.root_node)
+        code_source = CodeGenerator(**compile_options).generate(self.root_node)
         if debug:
+            self.expression_cache_stats = parser.get_expression_cache_stats()
             fd, self.debug_file_name = tempfile.mkstemp(suffix=".py")
             filename = self.debug_file_name
             with open(fd, "w") as f:
@@ -25,11 +49,75 @@ class Template:
             self.code_source = code_source
         else:
             filename = "<template>"
-        source = compile(code_source, filename, "exec")
-        self.namespace = {}
-        exec(source, self.namespace)
+        return compile(code_source, filename, "exec")
+
+    def render(self, context_data, mode="default", cell_budget=None, spill_stats=None):
+        """
+        Render template and return the content of the xlsx file.
+
+        `mode` selects how the workbook is written: "default" builds a regular
+        openpyxl workbook, "stream" sorts the final cells of every sheet into
+        row order and appends them to a write-only workbook, so openpyxl does
+        not keep a Cell object per rendered cell, "native" serializes sheets
+        directly without creating openpyxl cells at all.
+
+        `cell_budget` is only supported by the "stream" mode. It is the number
+        of rendered cells of a sheet, which are kept in memory until the
+        sheet is written, the rest is spilled to a temporary file and read
+        back in row order. Spilled cells are counted in `spill_stats`, a
+        `SpillStats` from `xlsx_template.runtime.cell_store`, if it is given.
+        """
+        buf = io.BytesIO()
+        self.render_to(
+            context_data,
+            buf,
+            mode=mode,
+            cell_budget=cell_budget,
+            spill_stats=spill_stats,
+        )
+        return buf.getvalue()
+
+    def render_to(
+        self,
+        context_data,
+        fileobj,
+        mode="default",
+        cell_budget=None,
+        spill_stats=None,
+    ):
+        """
+        Render template into a file path or a writable binary file object.
+        The file object does not need to be seekable.
+        """
+        writer = writers.get_writer(mode, self.styles, cell_budget, spill_stats)
+        self.namespace["root"](Context(context_data, self.env), writer, self.env)
+        if isinstance(fileobj, (str, os.PathLike)):
+            with open(fileobj, "wb") as f:
+                writer.save(f)
+        else:
+            writer.save(fileobj)
+
+    def render_iter(
+        self,
+        context_data,
+        mode="default",
+        chunk_size=64 * 1024,
+        cell_budget=None,
+        spill_stats=None,
+    ):
+        """
+        Render template and yield the xlsx file as chunks of bytes.
 
-    def render(self, context_data):
-        return self.namespace["root"](
-            Context(context_data, self.env), self.styles, self.env
+        Rendering runs in a background thread, so the first chunks are
+        available before the whole archive is written.
+        """
+        return writers.iter_chunks(
+            lambda fileobj: self.render_to(
+                context_data,
+                fileobj,
+                mode=mode,
+                cell_budget=cell_budget,
+                spill_stats=spill_stats,
+            ),
+            chunk_size,
         )
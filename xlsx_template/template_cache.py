@@ -0,0 +1,126 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import pickle
+import stat
+import sys
+import tempfile
+
+import xlsx_template
+
+
+class FileSystemTemplateCache:
+    """
+    Stores compiled templates on disk, so that a new process can skip parsing
+    and code generation for a template it has already seen.
+
+    Cache entries are keyed by a hash of the template bytes, the library
+    version and the Python bytecode version. Entries written by another
+    version are never loaded; unreadable entries are treated as a miss and
+    removed.
+
+    Loaded entries are executed, so the directory must only be writable by
+    the current user. Without `directory` a per-user directory in the
+    temporary directory is used, see `get_default_directory`.
+    """
+
+    MAGIC = b"xlsx_template-cache-1\n"
+
+    def __init__(self, directory=None, pattern="__xlsx_template_{}.cache"):
+        if directory is None:
+            directory = self.get_default_directory()
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pattern = pattern
+
+    @staticmethod
+    def get_default_directory():
+        """
+        Return the directory `xlsx_template-cache-<uid>` in the temporary
+        directory, which is created with mode 0o700. Raise RuntimeError, if
+        it is not a directory owned by the current user or is accessible by
+        other users, since anyone, who can write there, could run code in
+        the rendering process.
+        """
+        if sys.platform == "win32":
+            # Windows has per-user temporary directories
+            directory = os.path.join(tempfile.gettempdir(), "xlsx_template-cache")
+            os.makedirs(directory, exist_ok=True)
+            return directory
+        directory = os.path.join(
+            tempfile.gettempdir(), "xlsx_template-cache-{}".format(os.getuid())
+        )
+        try:
+            os.mkdir(directory, stat.S_IRWXU)
+        except FileExistsError:
+            pass
+        error = RuntimeError(
+            "The template cache directory '{}' is not safe to use".format(directory)
+        )
+        actual = os.lstat(directory)
+        if not stat.S_ISDIR(actual.st_mode) or actual.st_uid != os.getuid():
+            raise error
+        if stat.S_IMODE(actual.st_mode) != stat.S_IRWXU:
+            os.chmod(directory, stat.S_IRWXU)
+            actual = os.lstat(directory)
+            if stat.S_IMODE(actual.st_mode) != stat.S_IRWXU:  # pragma: no cover
+                raise error
+        return directory
+
+    def get_key(self, source, options=()):
+        h = hashlib.sha256()
+        h.update(xlsx_template.__version__.encode())
+        h.update(importlib.util.MAGIC_NUMBER)
+        h.update(repr(options).encode())
+        h.update(source)
+        return h.hexdigest()
+
+    def get_file_name(self, key):
+        return os.path.join(self.directory, self.pattern.format(key))
+
+    def load(self, key):
+        """
+        Return a tuple (code, styles) or None if there is no valid entry.
+        """
+        file_name = self.get_file_name(key)
+        try:
+            with open(file_name, "rb") as f:
+                if f.read(len(self.MAGIC)) != self.MAGIC:
+                    raise ValueError("Invalid cache file")
+                if pickle.load(f) != key:
+                    raise ValueError("Invalid cache file")
+                code = marshal.load(f)
+                styles = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._remove(file_name)
+            return None
+        return code, styles
+
+    def dump(self, key, code, styles):
+        fd, tmp_file_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with open(fd, "wb") as f:
+                f.write(self.MAGIC)
+                pickle.dump(key, f)
+                marshal.dump(code, f)
+                pickle.dump(styles, f)
+            os.replace(tmp_file_name, self.get_file_name(key))
+        except BaseException:
+            self._remove(tmp_file_name)
+            raise
+
+    def clear(self):
+        prefix, suffix = self.pattern.split("{}")
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(prefix) and file_name.endswith(suffix):
+                self._remove(os.path.join(self.directory, file_name))
+
+    def _remove(self, file_name):
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
@@ -1,5 +1,8 @@
 import string
 import collections
+import itertools
+import operator
+import threading
 
 
 def col_str_to_int(col):
@@ -29,6 +32,114 @@ def col_int_to_str(col):
     return res
 
 
+def range_int_to_str(top, left, bottom, right):
+    if top == bottom and left == right:
+        return cell_int_to_str(top, left)
+    return "{}:{}".format(cell_int_to_str(top, left), cell_int_to_str(bottom, right))
+
+
+def iter_runs(indexes):
+    """
+    Yield (start, end) of every run of consecutive numbers in sorted unique
+    `indexes`.
+    """
+    indexes = iter(indexes)
+    start = end = next(indexes)
+    for index in indexes:
+        if index != end + 1:
+            yield start, end
+            start = index
+        end = index
+    yield start, end
+
+
+def cells_to_ranges(cells):
+    """
+    Return a list of (top, left, bottom, right) rectangles, which cover
+    exactly the sorted unique (row, col) `cells`. Runs of cells in a row
+    are joined with the same runs of the rows above them, rectangles are
+    ordered by their top left cell.
+    """
+    if not cells:
+        return []
+    first_row, first_col = cells[0]
+    if all(col == first_col for _, col in cells):
+        return [
+            (top, first_col, bottom, first_col)
+            for top, bottom in iter_runs(row for row, _ in cells)
+        ]
+    if all(row == first_row for row, _ in cells):
+        return [
+            (first_row, left, first_row, right)
+            for left, right in iter_runs(col for _, col in cells)
+        ]
+    ranges = []
+    # Rectangles, which end in the previous row, by their columns
+    open_ranges = {}
+    for row, row_cells in itertools.groupby(cells, key=operator.itemgetter(0)):
+        row_ranges = {}
+        for left, right in iter_runs(col for _, col in row_cells):
+            range_ = open_ranges.get((left, right))
+            if range_ is not None and range_[2] == row - 1:
+                range_[2] = row
+            else:
+                range_ = [row, left, row, right]
+                ranges.append(range_)
+            row_ranges[(left, right)] = range_
+        open_ranges = row_ranges
+    return [tuple(range_) for range_ in ranges]
+
+
+class LRUCache:
+    """
+    Thread-safe mapping which keeps at most `capacity` items, dropping the
+    least recently used one first. Counts hits, misses and evictions.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._mapping = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._mapping[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._mapping.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if self.capacity <= 0:
+                return
+            self._mapping[key] = value
+            self._mapping.move_to_end(key)
+            while len(self._mapping) > self.capacity:
+                self._mapping.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._mapping.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._mapping.clear()
+
+    def __len__(self):
+        return len(self._mapping)
+
+    def __contains__(self, key):
+        return key in self._mapping
+
+
 # Cell = collections.namedtuple("Cell", "row,col")
 
 # class Cell: